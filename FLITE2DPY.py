@@ -2,15 +2,26 @@ import numpy as np
 import os
 import time
 import shutil
-from mesh_gen import mesh_gen
+import tempfile
+from contextlib import nullcontext
+from mesh_gen import mesh_gen, split_boundary, predict_mesh_size
 from save_mesh import save_mesh
 from run_prepro import run_prepro
 from run_solver import run_solver
 from import_FLITE_data import import_FLITE_data
+from render import check_render_policy, save_plot_data, render_in_background
+from mesh_cache import MeshCache, mesh_key
+from mesh_controls import resolve_controls
+from morph import morph_mesh
+from geometry import load_geometries, load_shared, boundary_edges
+from result_store import case_path, write_case
+from flite_io import read_forces
+from solver_monitor import forces_to_cl_cd
+from warm_start import WARM_START_FILE, nearest_solution, write_record
+from profiling import span, profile_run
 
-def move_results_files(coordinates_filename, mach, aoa):
+def move_results_files(coordinates_filename, mach, aoa, src_folder = r'./'):
     # Step 5: Move files to Dataset folder
-    src_folder = r'./'
     dataset_folder = r'./raw_data'
     airfoil_folder = os.path.join(dataset_folder, os.path.splitext(coordinates_filename)[0], mach, aoa)
 
@@ -25,6 +36,12 @@ def move_results_files(coordinates_filename, mach, aoa):
         'solverout.rsd'
     ]
 
+    # Files only some runs produce; a stale copy from an earlier run of the case is removed
+    if os.path.exists(os.path.join(src_folder, WARM_START_FILE)):
+        files_to_move.append(WARM_START_FILE)
+    elif os.path.exists(os.path.join(airfoil_folder, WARM_START_FILE)):
+        os.remove(os.path.join(airfoil_folder, WARM_START_FILE))
+
     # Move each file to the destination folder
     for file_name in files_to_move:
         src_path = os.path.join(src_folder, file_name)
@@ -32,94 +49,227 @@ def move_results_files(coordinates_filename, mach, aoa):
         shutil.move(src_path, dest_path)
 
     print(f"Files have been moved to {dest_path} successfully.")
+    return airfoil_folder
     
 def read_solver_output_and_compute_cl_cd(alpha, solverout_path = 'solverout.rsd'):
-    # Reading the solverout.rsd file
-    with open(solverout_path, 'r') as file:
-        lines = file.readlines()
-    
-    # Checking that there are at least two lines
-    if len(lines) < 2:
-        raise ValueError("The solverout.rsd file does not contain enough data lines.")
-    
-    # Get the second to last line (last line is empty)
-    second_last_line = lines[-1].strip()
-    if not second_last_line:
-        raise ValueError("The second last line is unexpectedly empty.")
-    
-    # Split the line into components and extract CY and CX
-    parts = second_last_line.split()
-    CY = float(parts[2])
-    CX = float(parts[3])
+    # Read CY and CX from the last line of solverout.rsd, without reading the rest of the file
+    CY, CX = read_forces(solverout_path)
     print(f"CY: {CY}, CX: {CX}")
     
-    # Compute CL and CD
-    # Convert angle of attack from degrees to radians
-    alpha_rad = np.radians(alpha)
-
-    # Calculate lift coefficient (CL) and drag coefficient (CD)
-    cl = (-CY * np.cos(alpha_rad)) - (CX * np.sin(alpha_rad))
-    cd = (-CY * np.sin(alpha_rad)) + (CX * np.cos(alpha_rad))
+    # Compute CL and CD from the angle of attack in degrees
+    cl, cd = forces_to_cl_cd(CY, CX, alpha)
     print(f"CL: {cl}, CD: {cd}")
     
     return cl, cd
     
-def FLITE2DPY(airfoil, mach, aoa, coordinates_path = os.path.join('.', 'data_geometry')):
-    # Paths to input data files
-    mach = f'{mach:.2f}'
-    aoa = f'{aoa:.2f}'
+def make_workdir(airfoil, mach, aoa, scratch_path = os.path.join('.', 'scratch')):
+    # Each case gets its own scratch directory, so several cases can run at once
+    os.makedirs(scratch_path, exist_ok=True)
+    return tempfile.mkdtemp(prefix=f'{int(airfoil)}_{mach}_{aoa}_', dir=scratch_path)
+
+def load_inputs(airfoil, coordinates_path = os.path.join('.', 'data_geometry')):
+    # Reads the geometry of one airfoil and the shared mesh inputs (flow_field, psource). The sections of
+    # the whole directory are loaded and cached at once (see geometry.py), and bound_data is derived from
+    # the number of points, so sections of any size can be meshed.
     coordinates_filename = f'{int(airfoil)}.txt'  # This is airfoil number file
-    coordinates_filepath = os.path.join(coordinates_path, coordinates_filename)
 
-    # Read coordinates data
-    coordinates = np.loadtxt(coordinates_filepath)
+    with span('load_inputs'):
+        # Read coordinates data
+        coordinates = load_geometries(coordinates_path, airfoil=airfoil).coordinates(airfoil)
 
-    # Read flow field data
-    flow_field = np.loadtxt('flow_field.txt')
+        # Read flow field data
+        flow_field = load_shared('flow_field.txt')
 
-    # Read bound data
-    bound_data = np.loadtxt('bound_data.txt').astype(int)
+        # Boundary edges of the airfoil and the far field
+        bound_data = boundary_edges(len(coordinates), len(flow_field))
 
-    # Read psource data
-    psource = np.loadtxt('psource.txt')
+        # Read psource data
+        psource = load_shared('psource.txt')
 
-    # Concatenate coordinates and flow field data
-    xy = np.vstack((coordinates, flow_field))
+    return {'airfoil': airfoil, 'coordinates_filename': coordinates_filename, 'coordinates': coordinates,
+            'flow_field': flow_field, 'bound_data': bound_data, 'psource': psource,
+            'xy': np.vstack((coordinates, flow_field)), 'alpha': 0.8, 'coordinates_path': coordinates_path}
 
-    # Generate the mesh
+def generate_mesh(inputs, mesh_dir, show=False):
+    # Generates the mesh from load_inputs and writes mesh.dat into mesh_dir (the Python part of prepare_mesh)
+    # With the morph control set, the mesh of a similar solved airfoil is morphed instead, and mesh_gen
+    # only runs when no morphed mesh passes the quality check (see morph.py). Donors are only tried when
+    # their size fits the element budget and the size mesh_gen would reach with the same controls
     start_m= time.time()
 
-    mesh = mesh_gen(xy, bound_data, alpha=0.8, psource=psource)
+    controls = resolve_controls(inputs.get('controls'))
+    mesh = None
+    if controls.morph is not None:
+        with span('morph'):
+            expected = predict_mesh_size(inputs['xy'], inputs['bound_data'], inputs['alpha'], inputs['psource'],
+                                         controls)
+            mesh = morph_mesh(inputs['airfoil'], inputs['coordinates'], inputs['xy'], inputs['bound_data'],
+                              method=controls.morph, coordinates_path=inputs['coordinates_path'],
+                              max_elements=controls.max_elements, expected_elements=expected,
+                              renumber=controls.renumber)
+        if mesh is None:
+            print('No morphed mesh accepted; generating the mesh from scratch')
+
+    if mesh is None:
+        with span('mesh_gen'):
+            mesh = mesh_gen(inputs['xy'], inputs['bound_data'], alpha=inputs['alpha'], psource=inputs['psource'],
+                            plot=show, controls=controls)
 
     end_m = time.time() 
     elapsed = end_m -start_m
     print(f'Time taken for mesh generation: {elapsed:.2f} seconds')
 
     if mesh is not None:
-        save_mesh(mesh, 'mesh.dat', bound_data)
+        with span('save_mesh'):
+            save_mesh(mesh, os.path.join(mesh_dir, 'mesh.dat'), inputs['bound_data'])
     else:
         print("Mesh generation failed; skipping save.")
-        
-    # Run preprocessor and Solver
-    run_prepro()
+    return mesh
+
+def input_key(inputs):
+    # Mesh cache key of the inputs from load_inputs; mesh controls are part of the key when they are given
+    options = {}
+    if inputs.get('controls') is not None:
+        options['controls'] = resolve_controls(inputs['controls'])
+    return mesh_key(inputs['coordinates'], inputs['flow_field'], inputs['bound_data'], inputs['psource'],
+                    inputs['alpha'], **options)
+
+def prepare_mesh(airfoil, coordinates_path = os.path.join('.', 'data_geometry'), show=False,
+                 scratch_path = os.path.join('.', 'scratch'), cache=None, controls=None):
+    # Generates and preprocesses the mesh of one airfoil. mesh.dat and mesh.sol do not depend on
+    # Mach or AoA, so the result can be shared by every flight condition (see solve_case).
+    # cache: optional MeshCache (or its directory); a cached mesh skips mesh_gen and PrePro.exe
+    # controls: optional mesh controls for mesh_gen, e.g. 'coarse' or {'target_elements': 15000}
+    inputs = load_inputs(airfoil, coordinates_path)
+    inputs['controls'] = controls
+    mesh_dir = make_workdir(airfoil, 'mesh', '', scratch_path)
+
+    def build():
+        mesh = generate_mesh(inputs, mesh_dir, show)
+
+        # Run preprocessor
+        with span('prepro'):
+            run_prepro(mesh_dir)
+        return mesh
+
+    if cache is None:
+        mesh = build()
+    else:
+        if isinstance(cache, str):
+            cache = MeshCache(cache)
+        key = input_key(inputs)
+        with span('mesh_cache') as node:
+            mesh, hit = cache.fetch_or_build(key, mesh_dir, build)
+            if node is not None:
+                node['counts']['hit'] = int(hit)
+        if hit:
+            print(f'Mesh for airfoil {int(airfoil)} loaded from cache ({key[:12]})')
+
+    return {'airfoil': airfoil, 'coordinates_filename': inputs['coordinates_filename'], 'xy': inputs['xy'],
+            'bound_data': inputs['bound_data'], 'mesh': mesh, 'mesh_dir': mesh_dir}
+
+def solve_case(prepared, mach, aoa, render='off', scratch_path = os.path.join('.', 'scratch'), solver_slot=None,
+               store=None, monitor=None, warm_start=False):
+    # Runs the solver for one flight condition against a mesh from prepare_mesh, in its own
+    # working directory, and moves the results to raw_data
+    # store: optional result_store root the case is also written to as memory-mappable .npy files
+    # monitor: optional ConvergenceMonitor options, to stop the solver once CL/CD are stable (see run_solver)
+    # warm_start: restart the solver from the nearest solved (Mach, AoA) case of this airfoil on the same
+    # mesh in raw_data, and record the iterations saved in warm_start.json next to the results
+    check_render_policy(render)
+
+    mach = f'{mach:.2f}'
+    aoa = f'{aoa:.2f}'
+
+    workdir = make_workdir(prepared['airfoil'], mach, aoa, scratch_path)
+    for file_name in ('mesh.dat', 'mesh.sol'):
+        shutil.copy(os.path.join(prepared['mesh_dir'], file_name), os.path.join(workdir, file_name))
+
+    source = None
+    if warm_start:
+        with span('warm_start'):
+            source = nearest_solution(prepared['airfoil'], float(mach), float(aoa),
+                                      mesh_sol=os.path.join(workdir, 'mesh.sol'))
+        if source is not None:
+            print(f'Warm start from M={source[0]:.2f}, AoA={source[1]:.2f}')
 
     start_s= time.time()
 
-    run_solver(mach, aoa)
+    with span('solver'):
+        run_solver(mach, aoa, workdir, slot=solver_slot, monitor=monitor,
+                   restart=None if source is None else os.path.join(source[2], 'solverout.res'))
 
     end_s = time.time() 
     elapsed = end_s -start_s
     print(f'Time taken by solver: {elapsed:.2f} seconds')
-    
+
+    if warm_start:
+        record = write_record(workdir, source)
+        print(f"Solver iterations: {record['iterations']} ({record['iterations_saved']} saved by the warm start)")
+
+    return collect_results(prepared, mach, aoa, workdir, render, store)
+
+def collect_results(prepared, mach, aoa, workdir, render='off', store=None):
+    # Reads the solver output in workdir, computes CL and CD, moves the results to raw_data and
+    # removes workdir (mach and aoa are the formatted strings used for the folder names)
+    show = render == 'show'
+    mesh = prepared['mesh']
+
     # Import results using import_FLITE_data function
-    results, residual = import_FLITE_data('solverout.rsd', 'solverout.res', mesh) 
+    with span('import'):
+        results, residual = import_FLITE_data(os.path.join(workdir, 'solverout.rsd'),
+                                              os.path.join(workdir, 'solverout.res'), mesh, plot=show)
     
     aoaf = float(aoa)
-    cl, cd = read_solver_output_and_compute_cl_cd(aoaf)
+    cl, cd = read_solver_output_and_compute_cl_cd(aoaf, os.path.join(workdir, 'solverout.rsd'))
     
-    move_results_files(coordinates_filename, mach, aoa) 
+    with span('move_results'):
+        results_folder = move_results_files(prepared['coordinates_filename'], mach, aoa, src_folder=workdir)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if store is not None:
+        with span('store'):
+            write_case(case_path(store, prepared['airfoil'], mach, aoa), mesh['xy'], mesh['connec'], results,
+                       residual, prepared['bound_data'])
+
+    if render in ('deferred', 'background'):
+        with span('render'):
+            outer_points, inner_points = split_boundary(prepared['xy'], prepared['bound_data'])
+            plot_data = save_plot_data(results_folder, mesh, np.vstack(inner_points), outer_points, results,
+                                       residual)
+            if render == 'background':
+                render_in_background(plot_data)
     
     return cl, cd
+
+def FLITE2DPY(airfoil, mach, aoa, coordinates_path = os.path.join('.', 'data_geometry'), render='show',
+              scratch_path = os.path.join('.', 'scratch'), solver_slot=None, cache=None, store=None, monitor=None,
+              warm_start=False, profile=None, cprofile=False, mesh_controls=None):
+    # render: 'show' (blocking plt.show), 'off', 'deferred' (save plot data next to the results)
+    # or 'background' (save plot data and render it to PNG in a separate process)
+    # scratch_path: parent of the per-case working directories the executables run in
+    # solver_slot: optional lock/semaphore held while Solver.exe runs (see scheduler.py)
+    # cache: optional MeshCache (or its directory) to reuse meshes across runs
+    # store: optional result_store root the results are also written to
+    # monitor: optional dict of ConvergenceMonitor options, e.g. {'tolerance': 1e-4}, to stop the solver
+    # early once CL/CD are stable and kill it if it diverges
+    # warm_start: restart the solver from the nearest solved flight condition in raw_data (see warm_start.py)
+    # profile: optional folder a JSON record of timed stages, counts and peak memory is written to
+    # (see profiling.py); cprofile also dumps cProfile stats of the run there
+    # mesh_controls: optional mesh controls, a preset ('coarse', 'medium', 'fine'), a dict such as
+    # {'target_elements': 15000, 'time_budget': 60} or MeshControls (see mesh_controls.py)
+    check_render_policy(render)
+
+    with profile_run('FLITE2DPY', profile, cprofile, airfoil=int(airfoil), mach=float(mach),
+                     aoa=float(aoa)) if profile else nullcontext():
+        with span('prepare_mesh'):
+            prepared = prepare_mesh(airfoil, coordinates_path, render == 'show', scratch_path, cache,
+                                    mesh_controls)
+        with span('solve_case'):
+            cl, cd = solve_case(prepared, mach, aoa, render, scratch_path, solver_slot, store, monitor, warm_start)
+        shutil.rmtree(prepared['mesh_dir'], ignore_errors=True)
+
+    return cl, cd
     
 #Example Implementation in console
 #from FLITE2DPY import FLITE2DPY
@@ -0,0 +1,291 @@
+import os
+import sys
+import time
+import shutil
+import asyncio
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+
+from run_prepro import prepro_exe, input_file as prepro_input_file
+from run_solver import FLITE_DIR, RESTART_FILE, write_solver_input, solver_inputs
+from FLITE2DPY import load_inputs, generate_mesh, input_key, make_workdir, collect_results
+from mesh_cache import MeshCache
+from sweep import write_table
+from profiling import profile_run, profile_task
+
+# Commands of the real executables, and of the fake_flite.py stand-in for machines that cannot run them
+PREPRO_COMMAND = (prepro_exe,)
+SOLVER_COMMAND = (os.path.join(FLITE_DIR, 'Solver.exe'),)
+FAKE_PREPRO_COMMAND = (sys.executable, os.path.join(FLITE_DIR, 'fake_flite.py'), 'prepro')
+FAKE_SOLVER_COMMAND = (sys.executable, os.path.join(FLITE_DIR, 'fake_flite.py'), 'solver')
+
+def read_inputs(path):
+    # Answers fed to an executable on stdin, one per line of its .inp file
+    with open(path, 'r') as f:
+        return ''.join(line.strip() + '\n' for line in f)
+
+async def run_command(command, inputs, workdir, outputs=(), timeout=None, retries=0, backoff=1.0,
+                      semaphore=None, name=None):
+    """
+    Runs an executable in workdir with its answers on stdin, without blocking the event loop.
+
+    A run fails when it times out (the process is killed), exits with a non-zero code or leaves any of
+    `outputs` missing. Failed runs are retried after backoff, 2 * backoff, 4 * backoff, ... seconds.
+    The semaphore is only held while the process runs, not during the backoff.
+
+    Parameters:
+    command (sequence): Executable and arguments.
+    inputs (str): Text written to stdin.
+    workdir (str): Working directory of the process.
+    outputs (tuple): File names the process must create in workdir.
+    timeout (float): Seconds before a run is killed; None waits indefinitely.
+    retries (int): Number of further attempts after a failed run.
+    backoff (float): Delay before the first retry, in seconds.
+    semaphore (asyncio.Semaphore): Caps how many executables run at once.
+    name (str): Name used in messages; defaults to the executable's file name.
+
+    Returns:
+    str: stdout of the successful run.
+    """
+    name = name or os.path.basename(command[0])
+    for attempt in range(retries + 1):
+        for file_name in outputs:
+            path = os.path.join(workdir, file_name)
+            if os.path.exists(path):
+                os.remove(path)
+
+        async with semaphore if semaphore is not None else nullcontext():
+            process = await asyncio.create_subprocess_exec(*command, cwd=workdir, stdin=asyncio.subprocess.PIPE,
+                                                           stdout=asyncio.subprocess.PIPE,
+                                                           stderr=asyncio.subprocess.PIPE)
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(inputs.encode()), timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                error = f'timed out after {timeout} s'
+            except asyncio.CancelledError:
+                process.kill()
+                await process.wait()
+                raise
+            else:
+                missing = [f for f in outputs if not os.path.exists(os.path.join(workdir, f))]
+                if process.returncode == 0 and not missing:
+                    return stdout.decode(errors='replace')
+                if process.returncode != 0:
+                    error = f'exit code {process.returncode}: {stderr.decode(errors="replace").strip()[-500:]}'
+                else:
+                    error = f'{", ".join(missing)} not written'
+
+        if attempt < retries:
+            delay = backoff * 2**attempt
+            print(f'{name} in {workdir} failed ({error}); retrying in {delay:.1f} seconds')
+            await asyncio.sleep(delay)
+
+    raise RuntimeError(f'{name} failed after {retries + 1} attempt(s): {error}')
+
+async def prepro_async(workdir, command=PREPRO_COMMAND, **options):
+    """
+    Runs the preprocessor on workdir/mesh.dat, see run_command for the options.
+    """
+    return await run_command(command, read_inputs(prepro_input_file), workdir, outputs=('mesh.sol',),
+                             name='PrePro', **options)
+
+async def solver_async(mach, aoa, workdir, command=SOLVER_COMMAND, restart=None, **options):
+    """
+    Writes workdir/solver.inp for mach and aoa and runs the solver, see run_command for the options.
+    restart is an optional solverout.res to start from instead of freestream (see run_solver).
+    """
+    write_solver_input(mach, aoa, workdir)
+    if restart is not None:
+        shutil.copy(restart, os.path.join(workdir, RESTART_FILE))
+    inputs = solver_inputs(RESTART_FILE if restart is not None else None)
+    return await run_command(command, inputs, workdir, outputs=('solverout.res', 'solverout.rsd'), name='Solver',
+                             **options)
+
+def _task_profile(settings, name, **meta):
+    # One profiling record per airfoil mesh and per case when run_pipeline has a profile folder
+    return profile_task(name, settings['profile'], **meta) if settings['profile'] else nullcontext()
+
+def _span(profiler, name):
+    return profiler.span(name) if profiler is not None else nullcontext()
+
+def _generate_mesh(inputs, mesh_dir, profiled):
+    # Runs in the process pool; the profiling record of the worker is returned to the event loop
+    if not profiled:
+        return generate_mesh(inputs, mesh_dir), None
+    with profile_run('generate_mesh', out_dir=None) as profiler:
+        mesh = generate_mesh(inputs, mesh_dir)
+    return mesh, profiler.result
+
+async def _build_mesh(airfoil, inputs, mesh_dir, pool, settings, profiler):
+    # Meshing is CPU-bound Python, so it runs in the process pool while other cases are being solved
+    loop = asyncio.get_running_loop()
+    with _span(profiler, 'generate_mesh'):
+        mesh, record = await loop.run_in_executor(pool, _generate_mesh, inputs, mesh_dir, profiler is not None)
+        if record is not None:
+            profiler.attach(record)
+    if mesh is None:
+        raise RuntimeError(f'Mesh generation failed for airfoil {int(airfoil)}')
+    with _span(profiler, 'prepro'):
+        await prepro_async(mesh_dir, settings['prepro_command'], timeout=settings['prepro_timeout'],
+                           **settings['run_options'])
+    return mesh
+
+async def _mesh_airfoil(airfoil, pool, cache, settings):
+    with _task_profile(settings, 'prepare_mesh', airfoil=int(airfoil)) as profiler:
+        return await _prepare_airfoil(airfoil, pool, cache, settings, profiler)
+
+async def _prepare_airfoil(airfoil, pool, cache, settings, profiler):
+    loop = asyncio.get_running_loop()
+    inputs = load_inputs(airfoil, settings['coordinates_path'])
+    inputs['controls'] = settings['mesh_controls']
+    mesh_dir = make_workdir(airfoil, 'mesh', '', settings['scratch_path'])
+
+    if cache is None:
+        mesh = await _build_mesh(airfoil, inputs, mesh_dir, pool, settings, profiler)
+    else:
+        # Hold the cache lock of the key while loading, or meshing, preprocessing and storing, as
+        # fetch_or_build does: another runner's evict() cannot remove the entry while it is copied, and a
+        # runner needing the same mesh waits for it instead of meshing it again. Taking the lock polls, so
+        # it runs in an executor thread; releasing it only removes the lock file.
+        key = input_key(inputs)
+        lock = cache.lock(key)
+        with _span(profiler, 'cache_lock'):
+            await loop.run_in_executor(None, lock.__enter__)
+        try:
+            with _span(profiler, 'cache_load'):
+                mesh = await loop.run_in_executor(None, cache.load, key, mesh_dir)
+            if mesh is not None:
+                print(f'Mesh for airfoil {int(airfoil)} loaded from cache ({key[:12]})')
+            else:
+                mesh = await _build_mesh(airfoil, inputs, mesh_dir, pool, settings, profiler)
+                with _span(profiler, 'cache_store'):
+                    await loop.run_in_executor(None, cache.store, key, mesh, mesh_dir)
+        finally:
+            lock.__exit__(None, None, None)
+
+    return {'airfoil': airfoil, 'coordinates_filename': inputs['coordinates_filename'], 'xy': inputs['xy'],
+            'bound_data': inputs['bound_data'], 'mesh': mesh, 'mesh_dir': mesh_dir}
+
+async def _solve_case(meshing, airfoil, mach, aoa, settings):
+    loop = asyncio.get_running_loop()
+    start = time.time()
+    record = {'airfoil': airfoil, 'mach': mach, 'aoa': aoa, 'cl': float('nan'), 'cd': float('nan'),
+              'elapsed': 0.0, 'error': None}
+    workdir = None
+    try:
+        with _task_profile(settings, 'solve_case', airfoil=int(airfoil), mach=float(mach),
+                           aoa=float(aoa)) as profiler:
+            with _span(profiler, 'wait_mesh'):
+                prepared = await meshing
+            mach_s, aoa_s = f'{mach:.2f}', f'{aoa:.2f}'
+            workdir = make_workdir(airfoil, mach_s, aoa_s, settings['scratch_path'])
+            for file_name in ('mesh.dat', 'mesh.sol'):
+                shutil.copy(os.path.join(prepared['mesh_dir'], file_name), os.path.join(workdir, file_name))
+
+            with _span(profiler, 'solver'):
+                await solver_async(mach_s, aoa_s, workdir, settings['solver_command'],
+                                   timeout=settings['solver_timeout'], **settings['run_options'])
+            with _span(profiler, 'collect_results'):
+                record['cl'], record['cd'] = await loop.run_in_executor(
+                    None, collect_results, prepared, mach_s, aoa_s, workdir, settings['render'], settings['store'])
+    except Exception as exc:
+        record['error'] = f'{type(exc).__name__}: {exc}'
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+    record['elapsed'] = time.time() - start
+    return record
+
+async def run_pipeline(cases, concurrency=4, mesh_workers=1, prepro_timeout=600.0, solver_timeout=3600.0,
+                       retries=2, backoff=5.0, render='off', coordinates_path=os.path.join('.', 'data_geometry'),
+                       scratch_path=os.path.join('.', 'scratch'), cache=None, store=None,
+                       prepro_command=PREPRO_COMMAND, solver_command=SOLVER_COMMAND, mesh_controls=None,
+                       profile=None):
+    """
+    Runs (airfoil, Mach, AoA) cases with the executables as asyncio subprocesses.
+
+    Each airfoil is meshed once in a process pool and preprocessed once; its cases are solved as soon as
+    the mesh is ready. Meshing of later airfoils therefore overlaps with the solver runs of earlier ones,
+    while at most `concurrency` PrePro/Solver processes run at any time.
+
+    Parameters:
+    cases (iterable): (airfoil, mach, aoa) tuples.
+    concurrency (int): Maximum number of executables running at once.
+    mesh_workers (int): Processes generating meshes.
+    prepro_timeout, solver_timeout (float): Seconds before a run is killed and retried.
+    retries (int): Retries per executable run.
+    backoff (float): Delay before the first retry in seconds, doubled for each further retry.
+    render (str): 'off', 'deferred' or 'background', see FLITE2DPY.
+    cache (MeshCache or str): Optional mesh cache (or its directory).
+    store (str): Optional result_store root every case is also written to.
+    prepro_command, solver_command (sequence): Commands to run, e.g. FAKE_PREPRO_COMMAND and
+        FAKE_SOLVER_COMMAND to test without the Windows executables.
+    mesh_controls (MeshControls, str or dict): Optional mesh controls for every airfoil (see
+        mesh_controls.py).
+    profile (str): Optional folder a profiling record is written to for the meshing of every airfoil and
+        for every case (see profiling.profile_task). The records of meshing include the mesh_gen spans
+        of the pool worker; summarise them with python profiling.py summary <folder>.
+
+    Returns:
+    list: One dict per case, in the order given, with airfoil, mach, aoa, cl, cd, elapsed and error
+        (None on success).
+    """
+    if render == 'show':
+        raise ValueError("render='show' blocks in plt.show(); use 'off', 'deferred' or 'background'")
+    if isinstance(cache, str):
+        cache = MeshCache(cache)
+
+    cases = [(int(airfoil), float(mach), float(aoa)) for airfoil, mach, aoa in cases]
+    settings = {'coordinates_path': coordinates_path, 'scratch_path': scratch_path, 'render': render,
+                'store': store, 'prepro_command': prepro_command, 'solver_command': solver_command,
+                'mesh_controls': mesh_controls, 'profile': profile,
+                'prepro_timeout': prepro_timeout, 'solver_timeout': solver_timeout,
+                'run_options': {'retries': retries, 'backoff': backoff,
+                                'semaphore': asyncio.Semaphore(max(int(concurrency), 1))}}
+
+    with ProcessPoolExecutor(max_workers=max(int(mesh_workers), 1)) as pool:
+        meshing = {}
+        for airfoil, _, _ in cases:
+            if airfoil not in meshing:
+                meshing[airfoil] = asyncio.ensure_future(_mesh_airfoil(airfoil, pool, cache, settings))
+
+        tasks = [asyncio.ensure_future(_solve_case(meshing[airfoil], airfoil, mach, aoa, settings))
+                 for airfoil, mach, aoa in cases]
+        for done, task in enumerate(asyncio.as_completed(tasks), 1):
+            record = await task
+            status = 'failed: ' + record['error'] if record['error'] else f"CL {record['cl']:.4f}, CD {record['cd']:.4f}"
+            print(f"[{done}/{len(cases)}] {record['airfoil']} M={record['mach']:.2f} "
+                  f"AoA={record['aoa']:.2f} {status} ({record['elapsed']:.1f} s)")
+        records = [task.result() for task in tasks]
+
+    # The shared meshes are no longer needed once every case has finished
+    for task in meshing.values():
+        if not task.cancelled() and task.exception() is None:
+            shutil.rmtree(task.result()['mesh_dir'], ignore_errors=True)
+    return records
+
+def run_cases_async(cases, table_path=None, **kwargs):
+    """
+    Runs run_pipeline in a new event loop and optionally writes the results table (see sweep.write_table).
+    """
+    start = time.time()
+    records = asyncio.run(run_pipeline(cases, **kwargs))
+    failed = sum(record['error'] is not None for record in records)
+    print(f'{len(records)} cases finished in {time.time() - start:.2f} seconds ({failed} failed)')
+    if table_path is not None:
+        write_table(records, table_path)
+        print(f'Results table written to {table_path}')
+    return records
+
+if __name__ == '__main__':
+    # python async_runner.py <airfoils> <machs> <aoas> [concurrency] [mesh_workers] [--fake]
+    # e.g. python async_runner.py 1000,1001 0.5,0.6 0,2,4 4 2
+    fake = '--fake' in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != '--fake']
+    airfoils, machs, aoas = ([float(v) for v in arg.split(',')] for arg in args[:3])
+    concurrency = int(args[3]) if len(args) > 3 else 4
+    mesh_workers = int(args[4]) if len(args) > 4 else 1
+    commands = {'prepro_command': FAKE_PREPRO_COMMAND, 'solver_command': FAKE_SOLVER_COMMAND} if fake else {}
+    run_cases_async([(a, m, x) for a in airfoils for m in machs for x in aoas], 'async_results.csv',
+                    concurrency=concurrency, mesh_workers=mesh_workers, **commands)
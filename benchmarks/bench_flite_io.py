@@ -0,0 +1,98 @@
+"""
+Times reading a solved case with the flite_io readers against the np.loadtxt / readlines code they replace.
+
+Every reader is checked against the reference result before it is timed. The result_store load is
+included to show what repeated reads of a converted case cost.
+
+The 10x target for importing solverout.res and solverout.rsd is not met: both are read with np.loadtxt,
+so 'res + rsd + forces' stays at about 1.0x (see flite_io.py).
+
+Usage:
+python benchmarks/bench_flite_io.py [--case raw_data/1000/0.50/4.00] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import flite_io
+from result_store import store_raw_case, load_case
+
+def best_of(repeat, func):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def legacy_import(case):
+    results = np.loadtxt(os.path.join(case, 'solverout.res'))
+    residual = np.loadtxt(os.path.join(case, 'solverout.rsd'))
+    with open(os.path.join(case, 'solverout.rsd'), 'r') as file:
+        lines = file.readlines()
+    parts = lines[-1].split()
+    return results, residual, (float(parts[2]), float(parts[3]))
+
+def fast_import(case):
+    results = flite_io.read_res(os.path.join(case, 'solverout.res'))
+    residual = flite_io.read_rsd(os.path.join(case, 'solverout.rsd'))
+    return results, residual, flite_io.read_forces(os.path.join(case, 'solverout.rsd'))
+
+def legacy_mesh(case):
+    path = os.path.join(case, 'mesh.dat')
+    with open(path, 'r') as f:
+        lines = [next(f) for _ in range(4)]
+    ne, np_, nb = (int(v) for v in lines[3].split())
+    connec = np.loadtxt(path, dtype=np.int64, skiprows=5, max_rows=ne)[:, 1:4]
+    xy = np.loadtxt(path, skiprows=6 + ne, max_rows=np_)[:, 1:3]
+    return xy, connec
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--case', default=os.path.join(ROOT, 'raw_data', '1000', '0.50', '4.00'))
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    case = args.case
+
+    reference = legacy_import(case)
+    fast = fast_import(case)
+    assert np.array_equal(reference[0], fast[0]) and np.array_equal(reference[1], fast[1])
+    assert reference[2] == fast[2]
+
+    xy, connec = legacy_mesh(case)
+    fast_xy, fast_connec, _ = flite_io.read_mesh_dat(os.path.join(case, 'mesh.dat'))
+    assert np.array_equal(xy, fast_xy) and np.array_equal(connec, fast_connec)
+
+    rebuilt = flite_io.mesh_from_sol(os.path.join(case, 'mesh.sol'))
+    same = {tuple(r) for r in np.sort(rebuilt['connec'], axis=1)} == {tuple(r) for r in np.sort(connec, axis=1)}
+    assert same and np.abs(rebuilt['xy'] - xy).max() < 1e-6
+
+    rows = [
+        ('res + rsd + forces', lambda: legacy_import(case), lambda: fast_import(case)),
+        ('final forces only', lambda: legacy_import(case)[2],
+         lambda: flite_io.read_forces(os.path.join(case, 'solverout.rsd'))),
+        ('mesh.dat', lambda: legacy_mesh(case), lambda: flite_io.read_mesh_dat(os.path.join(case, 'mesh.dat'))),
+        ('mesh.sol (nodes + edges)', lambda: legacy_mesh(case),
+         lambda: flite_io.read_mesh_sol(os.path.join(case, 'mesh.sol'))),
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = store_raw_case(case, os.path.join(tmp, 'case'))
+        rows.append(('result_store (mmap, touched)', lambda: legacy_import(case),
+                     lambda: [np.asarray(a).sum() for a in load_case(store).values()]))
+
+        print(f'{"read":<30} {"legacy ms":>10} {"new ms":>10} {"speed-up":>9}')
+        for name, legacy, new in rows:
+            t_legacy = best_of(args.repeat, legacy)
+            t_new = best_of(args.repeat, new)
+            print(f'{name:<30} {t_legacy * 1e3:10.2f} {t_new * 1e3:10.2f} {t_legacy / t_new:8.1f}x')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Compares in_out_status with the per-simplex in_out_status_loop on a Delaunay triangulation.
+
+Usage:
+python benchmarks/bench_in_out.py [--airfoil 1000] [--simplices 30000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.spatial import Delaunay
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mesh_gen import in_out_status, split_boundary
+from reference import in_out_status_loop
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--airfoil', default='1000')
+    parser.add_argument('--simplices', type=int, default=30000)
+    args = parser.parse_args()
+
+    coordinates = np.loadtxt(os.path.join(ROOT, 'data_geometry', f'{args.airfoil}.txt'))
+    xy = np.vstack((coordinates, np.loadtxt(os.path.join(ROOT, 'flow_field.txt'))))
+    bound_data = np.loadtxt(os.path.join(ROOT, 'bound_data.txt')).astype(int)
+    outer_boundary, inner_boundaries = split_boundary(xy, bound_data)
+
+    # Boundary points plus random points, clustered towards the airfoil like a refined mesh
+    rng = np.random.default_rng(0)
+    n = args.simplices // 2
+    radius = 15 * rng.random(n)**3
+    theta = 2 * np.pi * rng.random(n)
+    points = np.vstack([xy, np.column_stack([0.5 + radius * np.cos(theta), radius * np.sin(theta)])])
+    tri = Delaunay(points)
+    print(f'{len(tri.simplices)} simplices')
+
+    start = time.perf_counter()
+    loop = np.asarray(in_out_status_loop(tri, points, outer_boundary, inner_boundaries[0]))
+    t_loop = time.perf_counter() - start
+
+    start = time.perf_counter()
+    mask = in_out_status(tri, points, outer_boundary, inner_boundaries)
+    t_mask = time.perf_counter() - start
+
+    if not np.array_equal(loop, mask):
+        raise AssertionError('classifications differ')
+    print(f'loop {t_loop:.3f} s, vectorized {t_mask:.4f} s, speedup {t_loop / t_mask:.1f}x')
+
+if __name__ == '__main__':
+    main()
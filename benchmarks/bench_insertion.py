@@ -0,0 +1,98 @@
+"""
+Compares process_mesh_iteration with process_mesh_iteration_batched on the bundled airfoils.
+
+Both functions are given the same mesh at every refinement pass. The script checks that they accept the
+same points and reports the time taken by each.
+
+Usage:
+python benchmarks/bench_insertion.py [--passes N] [--airfoils 1000 10001 ...]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+from scipy.spatial import Delaunay, cKDTree
+from scipy.interpolate import LinearNDInterpolator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from geometry import boundary_edges, split_sections
+from make_input import make_input
+from mesh_gen import in_out_status
+from reference import process_mesh_iteration, process_mesh_iteration_batched
+
+def load_case(airfoil):
+    coordinates = np.loadtxt(os.path.join(ROOT, 'data_geometry', f'{airfoil}.txt'))
+    flow_field = np.loadtxt(os.path.join(ROOT, 'flow_field.txt'))
+    bound_data = boundary_edges(len(coordinates), len(flow_field))
+    psource = np.loadtxt(os.path.join(ROOT, 'psource.txt'))
+    return np.vstack((coordinates, flow_field)), bound_data, psource, len(coordinates)
+
+def bench_airfoil(airfoil, passes, alpha=0.8, tol=1e-12):
+    xy, bound_data, psource, n_airfoil = load_case(airfoil)
+
+    input_data = make_input(xy, bound_data)
+    no_bound = len(bound_data)
+    outerprofile, (innerprofile,) = split_sections(input_data[:no_bound, :2], n_airfoil)
+    spacing_interpolator = LinearNDInterpolator(input_data[:, :2], input_data[:, 2])
+
+    mesh_xy = input_data[:no_bound, :2]
+    dt = Delaunay(mesh_xy)
+    connec = dt.simplices[in_out_status(dt, mesh_xy, outerprofile, innerprofile)]
+    tree = cKDTree(mesh_xy)
+
+    total_loop = total_batched = 0.0
+    for ipass in range(passes):
+        mesh_data = (mesh_xy, connec, psource, alpha, spacing_interpolator, tree)
+
+        start = time.perf_counter()
+        loop_xy, _, _ = process_mesh_iteration(mesh_data)
+        t_loop = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batched_xy, tree, _ = process_mesh_iteration_batched(mesh_data)
+        t_batched = time.perf_counter() - start
+
+        if loop_xy.shape != batched_xy.shape or not np.allclose(loop_xy, batched_xy, rtol=0, atol=tol):
+            raise AssertionError(f'{airfoil}: pass {ipass} accepted points differ')
+
+        total_loop += t_loop
+        total_batched += t_batched
+        print(f'{airfoil:>8} pass {ipass}: {len(connec):6d} elements, '
+              f'loop {t_loop:8.3f} s, batched {t_batched:8.4f} s, speedup {t_loop / t_batched:7.1f}x')
+
+        mesh_xy = batched_xy
+        dt = Delaunay(mesh_xy)
+        connec = dt.simplices[in_out_status(dt, mesh_xy, outerprofile, innerprofile)]
+
+    return total_loop, total_batched
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--passes', type=int, default=4)
+    parser.add_argument('--airfoils', nargs='*')
+    args = parser.parse_args()
+
+    # The per-element getspace divides by D - xc, which is zero for some bundled sources
+    warnings.filterwarnings('ignore', category=RuntimeWarning)
+
+    airfoils = args.airfoils or sorted(
+        (os.path.splitext(os.path.basename(f))[0] for f in glob.glob(os.path.join(ROOT, 'data_geometry', '*.txt'))),
+        key=int)
+
+    total_loop = total_batched = 0.0
+    for airfoil in airfoils:
+        t_loop, t_batched = bench_airfoil(airfoil, args.passes)
+        total_loop += t_loop
+        total_batched += t_batched
+
+    if total_batched > 0:
+        print(f'Total: loop {total_loop:.2f} s, batched {total_batched:.3f} s, speedup {total_loop / total_batched:.1f}x')
+
+if __name__ == '__main__':
+    main()
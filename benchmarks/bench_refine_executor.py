@@ -0,0 +1,80 @@
+"""
+Times one RefinementExecutor pass for several worker counts.
+
+The mesh is grown with unsmoothed insertion passes until it holds at least --elements elements, then the
+same pass is repeated with each worker count. The accepted points are checked to be identical.
+
+Usage:
+python benchmarks/bench_refine_executor.py [--airfoil 1000] [--elements 200000] [--workers 1 2 4 8 16 32]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.spatial import Delaunay, cKDTree
+from scipy.interpolate import LinearNDInterpolator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from geometry import boundary_edges, split_sections
+from getspace import SpacingField
+from make_input import make_input
+from mesh_gen import in_out_status
+from refine_executor import RefinementExecutor
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--airfoil', default='1000')
+    parser.add_argument('--elements', type=int, default=200000)
+    parser.add_argument('--workers', type=int, nargs='*', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    coordinates = np.loadtxt(os.path.join(ROOT, 'data_geometry', f'{args.airfoil}.txt'))
+    flow_field = np.loadtxt(os.path.join(ROOT, 'flow_field.txt'))
+    xy = np.vstack((coordinates, flow_field))
+    bound_data = boundary_edges(len(coordinates), len(flow_field))
+    # Finer point sources than psource.txt, so the mesh can reach large sizes
+    psource = np.loadtxt(os.path.join(ROOT, 'psource.txt'))
+    psource[:, 2] /= 8
+
+    input_data = make_input(xy, bound_data)
+    spacing = SpacingField(LinearNDInterpolator(input_data[:, :2], input_data[:, 2]), psource)
+    no_bound = len(bound_data)
+    outerprofile, (innerprofile,) = split_sections(input_data[:no_bound, :2], len(coordinates))
+
+    def triangulate(points):
+        dt = Delaunay(points)
+        return dt.simplices[in_out_status(dt, points, outerprofile, innerprofile)]
+
+    mesh_xy = input_data[:no_bound, :2]
+    connec = triangulate(mesh_xy)
+    tree = cKDTree(mesh_xy)
+    with RefinementExecutor(spacing, 0.8) as executor:
+        while len(connec) < args.elements:
+            mesh_xy, tree, flag1 = executor.refine(mesh_xy, connec, tree)
+            if not flag1:
+                break
+            connec = triangulate(mesh_xy)
+    print(f'Mesh: {len(mesh_xy)} points, {len(connec)} elements, {os.cpu_count()} CPUs')
+
+    reference = None
+    for workers in args.workers:
+        with RefinementExecutor(spacing, 0.8, workers=workers) as executor:
+            executor.refine(mesh_xy, connec, tree)  # warm up the pool and shared memory
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                new_xy, _, _ = executor.refine(mesh_xy, connec, tree)
+            elapsed = (time.perf_counter() - start) / args.repeat
+
+        if reference is None:
+            reference, t_ref = new_xy, elapsed
+        elif not np.array_equal(reference, new_xy):
+            raise AssertionError(f'{workers} workers accepted different points')
+        print(f'workers {workers:3d}: {elapsed:8.4f} s per pass, speedup {t_ref / elapsed:5.2f}x')
+
+if __name__ == '__main__':
+    main()
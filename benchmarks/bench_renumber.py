@@ -0,0 +1,115 @@
+"""
+Compares node orderings of a finished mesh: bandwidth, and the time of the passes over its connectivity.
+
+The airfoil is meshed once. Each ordering ('none' keeps the order of mesh_gen) is then timed through
+conelem, laplacian_smooth, save_mesh, PrePro and Solver. The Python passes are repeated and the best
+time is kept. The solver runs at Mach 0.5, AoA 2 with the settings of solver.inp.
+
+With --solver fake the fake_flite.py stand-ins are run instead of PrePro.exe and Solver.exe, which is
+the default where the executables cannot run (anything but Windows). The stand-ins do not read the
+connectivity, so their times only show that the pipeline accepts the renumbered mesh.
+
+Usage:
+python benchmarks/bench_renumber.py [--airfoil 1000] [--alpha 0.8] [--orders none rcm morton] [--repeat 5]
+                                    [--solver real|fake|none]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from async_runner import (PREPRO_COMMAND, SOLVER_COMMAND, FAKE_PREPRO_COMMAND, FAKE_SOLVER_COMMAND, prepro_async,
+                          solver_async)
+from conelem import conelem
+from geometry import boundary_edges, load_geometries, load_shared
+from laplacian_smooth import laplacian_smooth
+from mesh_gen import mesh_gen
+from renumber import METHODS, bandwidth, fixed_nodes, renumber_mesh
+from save_mesh import save_mesh
+
+def best_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def run_flite(mesh, bound_data, commands):
+    # Times save_mesh, PrePro and Solver in a scratch directory
+    workdir = tempfile.mkdtemp(prefix='renumber_')
+    times = {}
+    try:
+        start = time.perf_counter()
+        save_mesh(mesh, os.path.join(workdir, 'mesh.dat'), bound_data)
+        times['save_mesh'] = time.perf_counter() - start
+        if commands is not None:
+            start = time.perf_counter()
+            asyncio.run(prepro_async(workdir, command=commands[0]))
+            times['prepro'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            asyncio.run(solver_async(0.5, 2.0, workdir, command=commands[1]))
+            times['solver'] = time.perf_counter() - start
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return times
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--airfoil', default='1000')
+    parser.add_argument('--alpha', type=float, default=0.8)
+    parser.add_argument('--orders', nargs='+', default=['none', *METHODS], choices=['none', *METHODS])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--solver', choices=('real', 'fake', 'none'), default='real' if os.name == 'nt' else 'fake')
+    args = parser.parse_args()
+
+    coordinates = load_geometries(os.path.join(ROOT, 'data_geometry'), cache_path=None).coordinates(args.airfoil)
+    flow_field = load_shared(os.path.join(ROOT, 'flow_field.txt'))
+    bound_data = boundary_edges(len(coordinates), len(flow_field))
+    psource = load_shared(os.path.join(ROOT, 'psource.txt'))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        mesh = mesh_gen(np.vstack((coordinates, flow_field)), bound_data, args.alpha, psource, plot=False)
+    base = {'xy': mesh['xy'], 'connec': mesh['connec'] - 1}
+    n_fixed = fixed_nodes(bound_data)
+    print(f"Airfoil {args.airfoil}: {len(base['xy'])} nodes, {len(base['connec'])} elements")
+
+    commands = {'real': (PREPRO_COMMAND, SOLVER_COMMAND), 'fake': (FAKE_PREPRO_COMMAND, FAKE_SOLVER_COMMAND),
+                'none': None}[args.solver]
+    if args.solver == 'fake':
+        print('PrePro and Solver are the fake_flite.py stand-ins; their times do not depend on the ordering')
+
+    print(f"\n{'order':<8} {'bandwidth':>9} {'free bw':>8} {'mean span':>9} {'renumber':>9} {'conelem':>8} "
+          f"{'smooth':>8} {'save':>8} {'prepro':>8} {'solver':>8}")
+    for order in args.orders:
+        start = time.perf_counter()
+        if order == 'none':
+            ordered = dict(base)
+        else:
+            ordered = renumber_mesh(dict(base), bound_data, order, verbose=False)
+            ordered = {'xy': ordered['xy'], 'connec': ordered['connec']}
+        renumber_time = time.perf_counter() - start if order != 'none' else 0.0
+        stats = bandwidth(ordered['connec'], n_fixed)
+
+        conelem_time = best_time(lambda: conelem(dict(ordered)), args.repeat)
+        smooth_time = best_time(lambda: laplacian_smooth(dict(ordered), bound_data, 5, 0.75), args.repeat)
+
+        saved = {'xy': ordered['xy'], 'connec': ordered['connec'] + 1}
+        flite = run_flite(saved, bound_data, commands)
+        print(f"{order:<8} {stats['bandwidth']:9d} {stats['free_bandwidth']:8d} {stats['mean_span']:9.0f} "
+              f"{renumber_time:9.3f} {conelem_time:8.3f} {smooth_time:8.3f} {flite['save_mesh']:8.3f} "
+              f"{flite.get('prepro', float('nan')):8.3f} {flite.get('solver', float('nan')):8.3f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Times the spacing field for a growing number of point sources, with and without KD-tree pruning.
+
+Sources are laid out as a wake line behind the airfoil plus a cluster over the upper surface, the
+kind of refinement sources psource.txt grows into. Both paths are checked to give the same spacing.
+
+Usage:
+python benchmarks/bench_spacing.py [--points 30000] [--sources 3 30 300 3000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.interpolate import LinearNDInterpolator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from getspace import SpacingField
+from make_input import make_input
+
+def make_sources(count, rng):
+    wake = count // 2
+    x = np.concatenate([np.linspace(1.0, 6.0, wake), 0.2 + 0.6 * rng.random(count - wake)])
+    y = np.concatenate([np.zeros(wake), 0.05 + 0.1 * rng.random(count - wake)])
+    d1 = np.full(count, 0.01)
+    xc = np.full(count, 0.05)
+    D = xc + 0.2
+    return np.column_stack([x, y, d1, D, xc])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--points', type=int, default=30000)
+    parser.add_argument('--sources', type=int, nargs='*', default=[3, 30, 300, 3000])
+    args = parser.parse_args()
+
+    coordinates = np.loadtxt(os.path.join(ROOT, 'data_geometry', '1000.txt'))
+    xy = np.vstack((coordinates, np.loadtxt(os.path.join(ROOT, 'flow_field.txt'))))
+    bound_data = np.loadtxt(os.path.join(ROOT, 'bound_data.txt')).astype(int)
+    input_data = make_input(xy, bound_data)
+    background = LinearNDInterpolator(input_data[:, :2], input_data[:, 2])
+
+    rng = np.random.default_rng(0)
+    radius = 10 * rng.random(args.points)**3
+    theta = 2 * np.pi * rng.random(args.points)
+    points = np.column_stack([0.5 + radius * np.cos(theta), radius * np.sin(theta)])
+
+    for count in args.sources:
+        psource = make_sources(count, rng)
+        dense = SpacingField(background, psource, prune_threshold=np.inf)
+        pruned = SpacingField(background, psource, prune_threshold=0)
+
+        start = time.perf_counter()
+        s_dense = dense(points)
+        t_dense = time.perf_counter() - start
+
+        start = time.perf_counter()
+        s_pruned = pruned(points)
+        t_pruned = time.perf_counter() - start
+
+        if not np.allclose(s_dense, s_pruned, rtol=1e-12, equal_nan=True):
+            raise AssertionError(f'{count} sources: pruned spacing differs')
+        print(f'{count:6d} sources: dense {t_dense:8.4f} s, pruned {t_pruned:8.4f} s')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Compares full re-triangulation with incremental triangulation in mesh_gen.
+
+For every airfoil, reports meshing time, element count and the smallest element angle of each mode.
+
+Usage:
+python benchmarks/bench_triangulation.py [--airfoils 1000 10001 ...]
+"""
+import argparse
+import contextlib
+import glob
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mesh_gen import mesh_gen
+
+def min_angles(xy, connec):
+    e = xy[connec[:, [1, 2, 0]]] - xy[connec]
+    angles = []
+    for k in range(3):
+        u = -e[:, (k + 2) % 3]
+        v = e[:, k]
+        cos = (u * v).sum(axis=1) / np.linalg.norm(u, axis=1) / np.linalg.norm(v, axis=1)
+        angles.append(np.degrees(np.arccos(np.clip(cos, -1, 1))))
+    return np.min(angles, axis=0)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--airfoils', nargs='*')
+    args = parser.parse_args()
+
+    airfoils = args.airfoils or sorted(
+        (os.path.splitext(os.path.basename(f))[0] for f in glob.glob(os.path.join(ROOT, 'data_geometry', '*.txt'))),
+        key=int)
+    flow_field = np.loadtxt(os.path.join(ROOT, 'flow_field.txt'))
+    bound_data = np.loadtxt(os.path.join(ROOT, 'bound_data.txt')).astype(int)
+    psource = np.loadtxt(os.path.join(ROOT, 'psource.txt'))
+
+    for airfoil in airfoils:
+        xy = np.vstack((np.loadtxt(os.path.join(ROOT, 'data_geometry', f'{airfoil}.txt')), flow_field))
+        for mode in ('full', 'incremental'):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                mesh = mesh_gen(xy, bound_data, alpha=0.8, psource=psource, triangulation=mode, plot=False)
+            elapsed = time.perf_counter() - start
+            angles = min_angles(mesh['xy'], mesh['connec'] - 1)
+            print(f'{airfoil:>8} {mode:>11}: {elapsed:6.2f} s, {len(mesh["connec"]):6d} elements, '
+                  f'min angle {angles.min():6.2f}, 1st percentile {np.percentile(angles, 1):6.2f}')
+
+if __name__ == '__main__':
+    main()
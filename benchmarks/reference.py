@@ -0,0 +1,107 @@
+"""
+Reference implementations that mesh_gen has replaced, kept to check and time the replacements against.
+
+- process_mesh_iteration: the per-element refinement pass (replaced by the batched evaluate_candidates /
+  insert_candidates of refine_executor.py); see bench_insertion.py.
+- process_mesh_iteration_batched: the first batched pass, which rebuilt its inputs on every call
+  (replaced by RefinementExecutor); see bench_insertion.py.
+- in_out_status_loop: the per-simplex STRtree query of in_out_status (replaced by the bulk centroid
+  classification of mesh_gen.in_out_mask); see bench_in_out.py.
+"""
+import numpy as np
+from scipy.spatial import cKDTree
+from shapely.geometry import Point, Polygon
+from shapely.strtree import STRtree
+
+from getspace import getspace, SpacingField
+from refine_executor import evaluate_candidates, insert_candidates
+
+def compute_distances(xx, xy, tree):
+    distances, _ = tree.query(xx, k=3)
+    return distances.min(axis=1)
+
+def process_mesh_iteration(mesh_data):
+    mesh_xy, mesh_connec, psource, alpha, spacing_interpolator, tree = mesh_data
+    ip = len(mesh_xy)
+    oldnp = ip
+    flag1 = False
+
+    new_points = []
+
+    for ie in range(len(mesh_connec)):
+        x1, y1 = mesh_xy[mesh_connec[ie, 0]]
+        x2, y2 = mesh_xy[mesh_connec[ie, 1]]
+        x3, y3 = mesh_xy[mesh_connec[ie, 2]]
+        xx = np.array([(x1 + x2 + x3) / 3, (y1 + y2 + y3) / 3])
+
+        distances = compute_distances([xx], mesh_xy, tree)
+        si = distances.min()
+
+        if ip - oldnp > 0:
+            new_points = mesh_xy[oldnp:]
+            distances = np.linalg.norm(xx - new_points, axis=1)
+            si = min(si, distances.min())
+
+        is_spacing = spacing_interpolator(xx[0], xx[1]) if psource is None else min(spacing_interpolator(xx[0], xx[1]), getspace(psource, xx))
+        ds = si - is_spacing
+
+        if ds >= -alpha * si:
+            new_points.append(xx)
+            flag1 = True
+
+    if flag1:
+        mesh_xy = np.vstack([mesh_xy] + new_points)
+        tree = cKDTree(mesh_xy)
+
+    return mesh_xy, tree, flag1
+
+def process_mesh_iteration_batched(mesh_data, min_separation=False):
+    """
+    Batched version of process_mesh_iteration.
+
+    Centroids, nearest-point distances, background spacing and point-source spacing are evaluated for all
+    elements at once. With min_separation=False the accepted points are the same as those of the
+    per-element loop, whose check against already-accepted points never triggers. With
+    min_separation=True that check is applied through reject_close_points.
+
+    Parameters:
+    mesh_data (tuple): (mesh_xy, mesh_connec, psource, alpha, spacing_interpolator, tree), as for
+        process_mesh_iteration.
+    min_separation (bool): Reject candidates too close to an earlier accepted candidate.
+
+    Returns:
+    tuple: Updated coordinates, KD-tree and a flag telling whether any point was inserted.
+    """
+    mesh_xy, mesh_connec, psource, alpha, spacing_interpolator, tree = mesh_data
+
+    result = evaluate_candidates(mesh_xy, mesh_connec, SpacingField(spacing_interpolator, psource), alpha, tree=tree)
+    return insert_candidates(mesh_xy, tree, result, alpha, min_separation)
+
+def in_out_status_loop(tri, points, outer_boundary, inner_boundary):
+    """
+    Per-simplex reference version of mesh_gen.in_out_status.
+    """
+    # Create polygons
+    outer_polygon = Polygon(outer_boundary)
+    inner_polygon = Polygon(inner_boundary)
+
+    # Create R-trees for faster spatial querying
+    outer_tree = STRtree([outer_polygon])
+    inner_tree = STRtree([inner_polygon])
+
+    # Prepare results list
+    in_status = []
+
+    for simplex in tri.simplices:
+        # Compute the centroid of the simplex
+        center = np.mean(points[simplex], axis=0)
+        point = Point(center)
+
+        # Check if the point is within the outer polygon and not within the inner polygon
+        is_in_outer = outer_tree.query(point, predicate='intersects')
+        is_in_inner = inner_tree.query(point, predicate='intersects')
+
+        # Append result
+        in_status.append(len(is_in_outer) > 0 and len(is_in_inner) == 0)
+
+    return in_status
@@ -0,0 +1,261 @@
+"""
+Benchmark suite for mesh generation and the pipeline stages around it, with a stored baseline.
+
+Every airfoil in data_geometry is meshed at each mesh size. The time and peak RSS of the mesh_gen
+stages (make_input, Delaunay, in_out_status, refinement including getspace, laplacian_smooth,
+conelem) are taken from the profiling spans. getspace is also timed on its own at the final mesh's
+centroids. Mesh quality (elements, points, angles, inverted elements) is recorded as well.
+
+Unless --no-pipeline is given, each mesh is then taken through save_mesh, the fake_flite.py stand-ins
+for PrePro and Solver, and import_FLITE_data. The suite therefore runs on any Linux box without the
+Windows executables. The stand-in stages measure process overhead, not the real executables.
+
+Mesh sizes are the presets of mesh_controls.PRESETS (coarse, medium, which is the FLITE2DPY default, and
+fine), so the suite follows any change to them; for airfoil 1000 they give about 14k, 23k and 28k
+elements. 'capped' is the medium preset with an element budget of CAPPED_ELEMENTS, below the predicted
+size of every airfoil, so that refinement stops at the budget partway through a pass.
+
+Results are compared with the baseline when one exists. The script exits with code 1 on a regression,
+which is any of:
+- a stage's time, summed over all cases, exceeds the baseline by more than --threshold (and by
+  more than the noise floor);
+- a case's mesh_gen time or peak RSS exceeds the baseline by the same margin;
+- a case's minimum angle drops by more than 0.5 degrees;
+- a case gains inverted elements;
+- any case has inverted elements, with or without a baseline (a mesh with folded elements is never
+  acceptable, and the capped size is where the budget stop could produce one).
+Changed element counts are reported but not counted as regressions. Use --repeat 3 for steadier times.
+
+Usage:
+python benchmarks/suite.py [--airfoils 1000 10001] [--sizes coarse medium fine capped] [--repeat 1]
+                           [--baseline benchmarks/baseline.json] [--save-baseline] [--threshold 0.25]
+                           [--output suite_results.json] [--no-pipeline]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import scipy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from conelem import mesh_quality
+from geometry import boundary_edges, load_geometries
+from getspace import SpacingField
+from import_FLITE_data import import_FLITE_data
+from make_input import make_input
+from mesh_controls import PRESETS, resolve_controls
+from mesh_gen import mesh_gen
+from profiling import profile_run
+from save_mesh import save_mesh
+from scipy.interpolate import LinearNDInterpolator
+
+CAPPED_ELEMENTS = 12000
+
+# Size name -> mesh controls (see mesh_controls.resolve_controls)
+SIZES = {**{name: name for name in PRESETS}, 'capped': {'preset': 'medium', 'max_elements': CAPPED_ELEMENTS}}
+
+# Stage name -> span names (anywhere below mesh_gen) whose times and peaks are combined
+STAGES = {
+    'make_input': ('make_input',),
+    'delaunay': ('delaunay', 'initial_triangulation'),
+    'in_out_status': ('in_out_status',),
+    'refine': ('refine',),
+    'laplacian_smooth': ('smooth',),
+    'conelem': ('conelem',),
+}
+
+# Differences below these are treated as noise
+TIME_FLOOR = 0.005
+RSS_FLOOR = 5.0
+ANGLE_DROP = 0.5
+
+FAKE_FLITE = os.path.join(ROOT, 'fake_flite.py')
+
+def load_airfoil(airfoil):
+    geometries = load_geometries(os.path.join(ROOT, 'data_geometry'), cache_path=None, airfoil=airfoil)
+    coordinates = geometries.coordinates(airfoil)
+    flow_field = np.loadtxt(os.path.join(ROOT, 'flow_field.txt'))
+    bound_data = boundary_edges(len(coordinates), len(flow_field))
+    psource = np.loadtxt(os.path.join(ROOT, 'psource.txt'))
+    return np.vstack((coordinates, flow_field)), bound_data, psource
+
+def collect_stages(spans, totals):
+    for node in spans:
+        for stage, names in STAGES.items():
+            if node['name'] in names:
+                time_, peak = totals.setdefault(stage, [0.0, 0.0])
+                totals[stage] = [time_ + (node['wall'] or 0.0), max(peak, node.get('peak_rss_mb') or 0.0)]
+        collect_stages(node.get('children', []), totals)
+    return totals
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def run_stub(mode, workdir):
+    # fake_flite.py reads its answers from stdin like the real executables; the answers are not used
+    subprocess.run([sys.executable, FAKE_FLITE, mode, '--delay', '0'], cwd=workdir, input='', text=True,
+                   check=True, stdout=subprocess.DEVNULL)
+
+def bench_case(airfoil, size, pipeline):
+    xy, bound_data, psource = load_airfoil(airfoil)
+    controls = resolve_controls(SIZES[size])
+
+    with profile_run('mesh_gen', out_dir=None) as profiler, contextlib.redirect_stdout(io.StringIO()):
+        mesh = mesh_gen(xy, bound_data, controls.alpha, psource, plot=False, controls=controls)
+    record = profiler.result
+    result = {'time': {'mesh_gen': record['wall']}, 'peak_rss_mb': {'mesh_gen': record['peak_rss_mb']}}
+    for stage, (time_, peak) in collect_stages(record['spans'], {}).items():
+        result['time'][stage] = time_
+        result['peak_rss_mb'][stage] = peak
+
+    tri = mesh['connec'] - 1
+    result['quality'] = mesh_quality(tri, mesh['xy'])
+
+    input_data = make_input(xy, bound_data)
+    spacing = SpacingField(LinearNDInterpolator(input_data[:, :2], input_data[:, 2]), psource)
+    _, result['time']['getspace'] = timed(spacing, mesh['xy'][tri].mean(axis=1))
+
+    if pipeline:
+        workdir = tempfile.mkdtemp(prefix='suite_')
+        try:
+            _, result['time']['save_mesh'] = timed(save_mesh, mesh, os.path.join(workdir, 'mesh.dat'), bound_data)
+            with open(os.path.join(workdir, 'solver.inp'), 'w') as f:
+                f.write(' ivd%alpha = 2.0,\n ivd%MachNumber = 0.5,\n ivd%numberOfMGIterations = 200,\n')
+            _, result['time']['prepro_stub'] = timed(run_stub, 'prepro', workdir)
+            _, result['time']['solver_stub'] = timed(run_stub, 'solver', workdir)
+            _, result['time']['import'] = timed(import_FLITE_data, os.path.join(workdir, 'solverout.rsd'),
+                                                os.path.join(workdir, 'solverout.res'), mesh, plot=False)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+def best_of(results):
+    # Fastest time and lowest peak of each stage over repeated runs; quality is the same for every run
+    best = {'time': {}, 'peak_rss_mb': {}, 'quality': results[0]['quality']}
+    for key in ('time', 'peak_rss_mb'):
+        for stage in results[0][key]:
+            values = [r[key][stage] for r in results if r[key].get(stage) is not None]
+            best[key][stage] = min(values) if values else None
+    return best
+
+def compare(results, baseline, threshold):
+    """
+    Compares results with the baseline. Stage times are compared as totals over the cases both hold, which
+    is far less noisy than single short stages; mesh_gen time, peak RSS and quality are compared per case.
+
+    Returns:
+    tuple: (regressions, notes), lists of messages.
+    """
+    regressions, notes = [], []
+
+    def check(label, old, value, floor, unit):
+        if value > old * (1 + threshold) and value - old > floor:
+            regressions.append(f'{label}: {old:.3f} -> {value:.3f} {unit} (+{(value / old - 1) * 100:.0f}%)')
+
+    totals = {}
+    for case, result in results.items():
+        reference = baseline.get(case)
+        if reference is None:
+            notes.append(f'{case}: not in baseline')
+            continue
+        for stage, value in result['time'].items():
+            old = reference['time'].get(stage)
+            if value is not None and old is not None:
+                total = totals.setdefault(stage, [0.0, 0.0])
+                total[0] += old
+                total[1] += value
+
+        check(f'{case} mesh_gen time', reference['time']['mesh_gen'], result['time']['mesh_gen'], TIME_FLOOR, 's')
+        old_peak, peak = reference['peak_rss_mb'].get('mesh_gen'), result['peak_rss_mb'].get('mesh_gen')
+        if old_peak is not None and peak is not None:
+            check(f'{case} mesh_gen peak RSS', old_peak, peak, RSS_FLOOR, 'MB')
+
+        old_quality, quality = reference['quality'], result['quality']
+        if quality['min_angle'] < old_quality['min_angle'] - ANGLE_DROP:
+            regressions.append(f"{case} min angle: {old_quality['min_angle']:.2f} -> {quality['min_angle']:.2f} deg")
+        if quality['inverted'] > old_quality['inverted']:
+            regressions.append(f"{case} inverted elements: {old_quality['inverted']} -> {quality['inverted']}")
+        if quality['elements'] != old_quality['elements']:
+            notes.append(f"{case} elements: {old_quality['elements']} -> {quality['elements']}")
+
+    for stage, (old, value) in totals.items():
+        check(f'{stage} time (all cases)', old, value, TIME_FLOOR, 's')
+    return regressions, notes
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--airfoils', nargs='+', default=None, help='default: every airfoil in data_geometry')
+    parser.add_argument('--sizes', nargs='+', default=list(SIZES), choices=list(SIZES))
+    parser.add_argument('--repeat', type=int, default=1, help='runs per case; the best time is kept')
+    parser.add_argument('--baseline', default=os.path.join(ROOT, 'benchmarks', 'baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed relative slow-down')
+    parser.add_argument('--output', default=None, help='also write the results to this JSON file')
+    parser.add_argument('--no-pipeline', action='store_true', help='only benchmark mesh generation')
+    args = parser.parse_args()
+
+    airfoils = args.airfoils or sorted((f[:-4] for f in os.listdir(os.path.join(ROOT, 'data_geometry'))
+                                        if f.endswith('.txt')), key=int)
+
+    results = {}
+    for airfoil in airfoils:
+        for size in args.sizes:
+            case = f'{airfoil}/{size}'
+            results[case] = best_of([bench_case(airfoil, size, not args.no_pipeline) for _ in range(args.repeat)])
+            result = results[case]
+            print(f"{case:<16} {result['quality']['elements']:6d} elements  min angle "
+                  f"{result['quality']['min_angle']:5.2f}  mesh_gen {result['time']['mesh_gen']:6.3f} s  "
+                  f"peak {result['peak_rss_mb']['mesh_gen'] or 0:6.0f} MB")
+
+    output = {'meta': {'python': platform.python_version(), 'numpy': np.__version__, 'scipy': scipy.__version__,
+                       'platform': platform.platform(), 'processor': platform.processor(), 'cpus': os.cpu_count(),
+                       'date': time.strftime('%Y-%m-%d'), 'repeat': args.repeat},
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=1)
+
+    status = 0
+    inverted = [case for case, result in results.items() if result['quality']['inverted']]
+    for case in inverted:
+        print(f"  REGRESSION: {case} has {results[case]['quality']['inverted']} inverted elements")
+    if inverted:
+        status = 1
+
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions, notes = compare(results, baseline['results'], args.threshold)
+        print(f"\nCompared with {args.baseline} ({baseline['meta'].get('platform')}, {baseline['meta'].get('date')})")
+        for note in notes:
+            print(f'  note: {note}')
+        for regression in regressions:
+            print(f'  REGRESSION: {regression}')
+        print(f'{len(regressions)} regression(s) over a threshold of {args.threshold:.0%}')
+        status = 1 if regressions or inverted else 0
+
+    if args.save_baseline:
+        if os.path.exists(args.baseline):
+            # Keep cases that were not part of this run
+            with open(args.baseline, 'r') as f:
+                output['results'] = {**json.load(f)['results'], **results}
+        with open(args.baseline, 'w') as f:
+            json.dump(output, f, indent=1)
+        print(f'Baseline written to {args.baseline}')
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
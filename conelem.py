@@ -1,85 +1,188 @@
 import numpy as np
 
+def element_areas(tri, xy):
+    """
+    Signed area of every element; positive when its nodes run anticlockwise.
+
+    Parameters:
+    tri (numpy.ndarray): Connectivity array of shape (ne, 3) (0-based).
+    xy (numpy.ndarray): Node coordinates.
+
+    Returns:
+    numpy.ndarray: Array of shape (ne,) with the signed areas.
+    """
+    xy12 = xy[tri[:, 0]] - xy[tri[:, 1]]
+    xy32 = xy[tri[:, 2]] - xy[tri[:, 1]]
+    return 0.5 * (xy32[:, 0] * xy12[:, 1] - xy32[:, 1] * xy12[:, 0])
+
+def element_angles(tri, xy):
+    """
+    Interior angles of every element.
+
+    Parameters:
+    tri (numpy.ndarray): Connectivity array of shape (ne, 3) (0-based).
+    xy (numpy.ndarray): Node coordinates.
+
+    Returns:
+    numpy.ndarray: Array of shape (ne, 3) with the angle at each node in degrees.
+    """
+    angles = np.empty(tri.shape, dtype=float)
+    for i in range(3):
+        u = xy[tri[:, (i + 1) % 3]] - xy[tri[:, i]]
+        v = xy[tri[:, (i + 2) % 3]] - xy[tri[:, i]]
+        cross = np.abs(u[:, 0] * v[:, 1] - u[:, 1] * v[:, 0])
+        angles[:, i] = np.degrees(np.arctan2(cross, (u * v).sum(axis=1)))
+    return angles
+
+def mesh_quality(tri, xy):
+    """
+    Summary quality measures of a triangulation.
+
+    Parameters:
+    tri (numpy.ndarray): Connectivity array of shape (ne, 3) (0-based).
+    xy (numpy.ndarray): Node coordinates.
+
+    Returns:
+    dict: elements, points, min_angle and max_angle (degrees), mean of the smallest angle of each
+        element, min_area, and the number of inverted (non-positive area) elements.
+    """
+    angles = element_angles(tri, xy)
+    areas = element_areas(tri, xy)
+    smallest = angles.min(axis=1)
+    return {'elements': int(len(tri)), 'points': int(len(xy)), 'min_angle': float(smallest.min()),
+            'max_angle': float(angles.max()), 'mean_min_angle': float(smallest.mean()),
+            'min_area': float(np.abs(areas).min()), 'inverted': int((areas <= 0).sum())}
+
+def orient_connectivity(tri, xy):
+    """
+    Reorders element nodes in place so that every element has a non-negative signed area.
+
+    Parameters:
+    tri (numpy.ndarray): Connectivity array of shape (ne, 3) (0-based).
+    xy (numpy.ndarray): Node coordinates.
+
+    Returns:
+    numpy.ndarray: The reoriented connectivity (the same array as tri).
+    """
+    flip = element_areas(tri, xy) < 0
+    tri[flip] = tri[flip][:, [0, 2, 1]]
+    return tri
+
+def build_adjacency(tri, NoPoints):
+    """
+    Builds the node and element adjacency of a triangulation as compact integer arrays.
+
+    Parameters:
+    tri (numpy.ndarray): Oriented connectivity array of shape (ne, 3) (0-based).
+    NoPoints (int): Number of nodes.
+
+    Returns:
+    dict: Adjacency arrays:
+        'lhowm', 'lwhere', 'conelem': node -> element CSR. The elements around node ip are
+            conelem[lwhere[ip]:lwhere[ip] + lhowm[ip]], in ascending order.
+        'edges': (nedge, 2) unique edges, lowest node first, sorted.
+        'edge_elems': (nedge, 2) element on which the edge runs low -> high, and element on which it
+            runs high -> low; -1 where there is none.
+        'edge_first': (nedge,) 2 * element + direction of the first half-edge on each edge.
+        'neighbours': (ne, 3) element across the edge opposite each local node; -1 on the boundary.
+        'node_ptr', 'node_adj': node -> node CSR. The nodes joined to ip by an edge are
+            node_adj[node_ptr[ip]:node_ptr[ip + 1]], in ascending order.
+    """
+    NoElem = len(tri)
+    flat = tri.ravel()
+
+    # Node -> element
+    lhowm = np.bincount(flat, minlength=NoPoints)
+    lwhere = np.cumsum(lhowm) - lhowm
+    conelem = np.argsort(flat, kind='stable') // 3
+
+    # Half-edges: half-edge 3*ie + k runs from node k+1 to node k+2 of element ie, opposite node k
+    start = tri[:, [1, 2, 0]].ravel()
+    end = tri[:, [2, 0, 1]].ravel()
+    lo = np.minimum(start, end)
+    hi = np.maximum(start, end)
+    edge_keys, edge_of = np.unique(lo.astype(np.int64) * NoPoints + hi, return_inverse=True)
+    edges = np.column_stack([edge_keys // NoPoints, edge_keys % NoPoints])
+
+    # On a folded mesh two elements can run along an edge the same way; the later one is kept
+    owner = np.repeat(np.arange(NoElem), 3)
+    direction = (start > end).astype(int)
+    edge_elems = np.full((len(edges), 2), -1, dtype=int)
+    np.maximum.at(edge_elems, (edge_of, direction), owner)
+
+    # Element -> element: the other element on each half-edge
+    pair = edge_elems[edge_of]
+    neighbours = np.where(pair[:, 0] == owner, pair[:, 1], pair[:, 0]).reshape(NoElem, 3)
+
+    # Node -> node
+    rows = np.concatenate([edges[:, 0], edges[:, 1]])
+    cols = np.concatenate([edges[:, 1], edges[:, 0]])
+    order = np.lexsort((cols, rows))
+    node_adj = cols[order]
+    node_ptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=NoPoints))])
+
+    # First (element, direction) each edge was met in, used to order the legacy iside lists
+    first_seen = np.full(len(edges), np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(first_seen, edge_of, 2 * owner + direction)
+
+    return {'lhowm': lhowm, 'lwhere': lwhere, 'conelem': conelem, 'edges': edges, 'edge_elems': edge_elems,
+            'edge_first': first_seen, 'neighbours': neighbours, 'node_ptr': node_ptr, 'node_adj': node_adj}
+
+def legacy_iside_intmel(tri, adjacency, NoPoints):
+    """
+    Builds the 'iside' and 'intmel' entries of the original conelem from the adjacency arrays.
+
+    iside[ip] lists [ip1, ip2, ie1, ie2] for the edges whose lower node is ip, in the order the original
+    loop met them. Element 0 doubles as "no element" in both structures, exactly as before.
+    """
+    edges = adjacency['edges']
+    ie1 = adjacency['edge_elems'][:, 0]
+    ie2 = adjacency['edge_elems'][:, 1]
+
+    # The loop visited the elements around the lower node in ascending order, taking the edge to the
+    # following node before the edge to the preceding one
+    order = np.lexsort((adjacency['edge_first'], edges[:, 0]))
+
+    items = np.column_stack([edges, np.maximum(ie1, 0), np.maximum(ie2, 0)])[order]
+
+    # Edges without a first element are stored the other way round
+    swap = items[:, 2] == 0
+    items[swap] = items[swap][:, [1, 0, 3, 2]]
+
+    counts = np.bincount(edges[:, 0], minlength=NoPoints)
+    bounds = np.concatenate([[0], np.cumsum(counts)])
+    rows = items.tolist()
+    iside = [rows[bounds[ip]:bounds[ip + 1]] for ip in range(NoPoints)]
+
+    # intmel[ie, position of ip1 in ie] = element on the other side, later edges overwriting earlier ones
+    writes = []
+    for a, b in ((2, 3), (3, 2)):
+        valid = items[:, a] != 0
+        ie = items[valid, a]
+        pos = np.argmax(tri[ie] == items[valid, 0][:, None], axis=1)
+        writes.append(np.column_stack([np.flatnonzero(valid) * 2 + (a == 3), ie * 3 + pos, items[valid, b]]))
+    writes = np.concatenate(writes)
+    writes = writes[np.argsort(writes[:, 0])][::-1]
+    slots, last = np.unique(writes[:, 1], return_index=True)
+
+    intmel = np.zeros((len(tri), 3), dtype=int)
+    intmel.ravel()[slots] = writes[last, 2]
+
+    return iside, intmel
+
 def conelem(mesh):
     tri = mesh['connec']
     xy = mesh['xy']
     NoPoints = len(xy)
-    NoElem = len(tri)
 
     # Check and reorder connectivity if necessary
-    def reorder_connectivity(tri, xy):
-        for i in range(NoElem):
-            xy12 = xy[tri[i, 0]] - xy[tri[i, 1]]
-            xy32 = xy[tri[i, 2]] - xy[tri[i, 1]]
-            te = xy32[0] * xy12[1] - xy32[1] * xy12[0]
-            if te < 0:
-                tri[i, [1, 2]] = tri[i, [2, 1]]
-        return tri
-
-    tri = reorder_connectivity(tri, xy)
+    tri = orient_connectivity(tri, xy)
     mesh['connec'] = tri
 
-    # Create lhowm and lwhere arrays efficiently
-    lhowm = np.bincount(tri.flatten(), minlength=NoPoints)
-    lwhere = np.cumsum(lhowm) - lhowm
+    adjacency = build_adjacency(tri, NoPoints)
+    iside, intmel = legacy_iside_intmel(tri, adjacency, NoPoints)
 
-    ConElemN = np.sum(lhowm)
-    conelem = np.zeros(ConElemN, dtype=int)
-
-    lhowm.fill(0)
-    for ie in range(NoElem):
-        for in_ in range(3):
-            ip = tri[ie, in_]
-            lhowm[ip] += 1
-            j = lwhere[ip] + lhowm[ip] - 1
-            conelem[j] = ie
-
-    # Construct iside efficiently
-    iside = [[] for _ in range(NoPoints)]
-    for ip in range(NoPoints):
-        iele = lhowm[ip]
-        if iele > 0:
-            iwhere = lwhere[ip]
-            ip1 = ip
-            for iel in range(1, iele + 1):
-                ie = conelem[iwhere + iel - 1]
-                in1 = np.where(tri[ie] == ip)[0][0] + 1
-                for j in range(2):
-                    in2 = (in1 + j) % 3
-                    ip2 = tri[ie, in2]
-                    if ip2 >= ip1:
-                        found = False
-                        for item in iside[ip1]:
-                            if item[1] == ip2:
-                                item[2 + j] = ie
-                                found = True
-                                break
-                        if not found:
-                            iside[ip1].append([ip1, ip2, 0, 0])
-                            iside[ip1][-1][2 + j] = ie
-
-            # Post-process iside
-            for item in iside[ip1]:
-                if item[2] == 0:
-                    item[2] = item[3]
-                    item[3] = 0
-                    item[0] = item[1]
-                    item[1] = ip1
-
-    # Create intmel array efficiently
-    intmel = np.zeros((NoElem, 3), dtype=int)
-    for ip1, items in enumerate(iside):
-        for item in items:
-            ip1, ie1, ie2 = item[0], item[2], item[3]
-            if ie1 != 0:
-                i1, i2, i3 = tri[ie1]
-                ipos = np.where([ip1 == i1, ip1 == i2, ip1 == i3])[0][0] + 1
-                intmel[ie1, ipos - 1] = ie2
-            if ie2 != 0:
-                i1, i2, i3 = tri[ie2]
-                ipos = np.where([ip1 == i1, ip1 == i2, ip1 == i3])[0][0] + 1
-                intmel[ie2, ipos - 1] = ie1
-
-    mesh.update({'lhowm': lhowm, 'lwhere': lwhere, 'conelem': conelem, 'iside': iside, 'intmel': intmel})
+    mesh.update(adjacency)
+    mesh.update({'iside': iside, 'intmel': intmel})
 
     return mesh
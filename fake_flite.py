@@ -0,0 +1,137 @@
+"""
+Stand-in for PrePro.exe and Solver.exe, so the run pipeline can be exercised where the Windows
+binaries cannot run.
+
+Both modes read their inputs from stdin and work in the current directory like the real executables:
+- prepro reads mesh.dat and writes a mesh.sol. The file only carries the mesh sizes and coordinates
+  as Fortran records; it does not follow the real preprocessor layout.
+- solver reads solver.inp and mesh.dat. It writes solverout.rsd line by line and writes
+  solverout.res every writeToFileInterval iterations, both in the solver's fixed-width formats.
+  The forces converge towards a thin-airfoil CL with a Prandtl-Glauert correction.
+
+Usage:
+python fake_flite.py prepro|solver [--delay 0.0005] [--fail-attempts 0] [--hang] [--diverge-at 0]
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+GAMMA = 1.4
+
+def fortran_e(value, digits=5):
+    # Formats a value like Fortran's Ew.d edit descriptor: 0.ddddE+xx
+    if value == 0 or not math.isfinite(value):
+        return f'0.{"0" * digits}E+00' if value == 0 else 'NaN'
+    exponent = math.floor(math.log10(abs(value))) + 1
+    mantissa = round(abs(value) / 10.0**exponent, digits)
+    if mantissa >= 1.0:
+        mantissa /= 10.0
+        exponent += 1
+    sign = '-' if value < 0 else ''
+    return f'{sign}0.{int(round(mantissa * 10**digits)):0{digits}d}E{exponent:+03d}'
+
+def read_sizes(path='mesh.dat'):
+    with open(path, 'r') as f:
+        lines = [next(f) for _ in range(4)]
+    return tuple(int(v) for v in lines[3].split())
+
+def read_solver_inp(path='solver.inp'):
+    settings = {}
+    with open(path, 'r') as f:
+        for line in f:
+            if '=' in line and 'ivd%' in line:
+                name, value = line.split('=', 1)
+                settings[name.strip().replace('ivd%', '')] = value.strip().rstrip(',').strip()
+    return settings
+
+def write_record(f, array):
+    data = np.ascontiguousarray(array).tobytes()
+    marker = np.array([len(data)], dtype='<i4').tobytes()
+    f.write(marker + data + marker)
+
+def prepro(args):
+    ne, np_, nb = read_sizes()
+    with open('mesh.dat', 'r') as f:
+        lines = f.readlines()
+    xy = np.array([line.split()[1:3] for line in lines[6 + ne:6 + ne + np_]], dtype=np.float32)
+    with open('mesh.sol', 'wb') as f:
+        write_record(f, np.array([ne, np_, nb], dtype='<i4'))
+        write_record(f, xy)
+    print(f'fake PrePro: {ne} elements, {np_} nodes, {nb} boundary edges')
+
+def solver(args):
+    ne, np_, nb = read_sizes()
+    settings = read_solver_inp()
+    mach = float(settings['MachNumber'])
+    alpha = float(settings['alpha'])
+    iterations = int(settings.get('numberOfMGIterations', 700))
+    interval = int(settings.get('writeToFileInterval', 100))
+
+    alpha_rad = math.radians(alpha)
+    cl_final = 2 * math.pi * alpha_rad / math.sqrt(max(1 - mach**2, 0.05))
+    cd_final = 0.01 + 0.05 * cl_final**2
+
+    def write_res():
+        u, v = math.cos(alpha_rad), math.sin(alpha_rad)
+        p = 1 / (GAMMA * mach**2)
+        e = p / (GAMMA - 1) + 0.5
+        fields = ''.join(f'{fortran_e(value, 4):>14}' for value in (1.0, u, v, e, p))
+        with open('solverout.res', 'w') as f:
+            f.writelines(f'{node:5d}{fields}\n' for node in range(1, np_ + 1))
+
+    with open('solverout.rsd', 'w') as rsd:
+        for iteration in range(1, iterations + 1):
+            decay = math.exp(-iteration / 40)
+            residual = -3.2 * (1 - math.exp(-iteration / 60))
+            if args.diverge_at and iteration >= args.diverge_at:
+                residual = 0.1 * (iteration - args.diverge_at)
+            cl = cl_final * (1 - decay * math.cos(iteration / 8))
+            cd = cd_final * (1 + decay)
+            # Like Solver.exe, CY and CX are in wind axes with both signs flipped
+            CY, CX = -cl, -cd
+            values = (residual, CY, CX, 0.25 * CY, CY, CX, 0.0)
+            rsd.write(f'{iteration:7d}' + ''.join(f'{fortran_e(value):>14}' for value in values) + '\n')
+            rsd.flush()
+
+            if iteration % interval == 0:
+                write_res()
+            if residual < -3.0:
+                break
+            time.sleep(args.delay)
+    write_res()
+    print(f'fake Solver: M={mach} AoA={alpha}, {iteration} iterations')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('mode', choices=('prepro', 'solver'))
+    parser.add_argument('--delay', type=float, default=0.0005, help='seconds per solver iteration')
+    parser.add_argument('--fail-attempts', type=int, default=0,
+                        help='fail this many times in the current directory before succeeding')
+    parser.add_argument('--hang', action='store_true', help='never finish, to test timeouts')
+    parser.add_argument('--diverge-at', type=int, default=0, help='let the residual grow from this iteration')
+    args = parser.parse_args()
+
+    # Consume the answers the pipeline sends on stdin, like the interactive executables
+    sys.stdin.read()
+
+    if args.fail_attempts:
+        counter = f'.fake_{args.mode}_attempts'
+        attempts = int(open(counter).read()) if os.path.exists(counter) else 0
+        with open(counter, 'w') as f:
+            f.write(str(attempts + 1))
+        if attempts < args.fail_attempts:
+            print(f'fake {args.mode}: failing attempt {attempts + 1}', file=sys.stderr)
+            sys.exit(1)
+
+    if args.hang:
+        while True:
+            time.sleep(1)
+
+    prepro(args) if args.mode == 'prepro' else solver(args)
+
+if __name__ == '__main__':
+    main()
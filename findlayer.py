@@ -6,33 +6,18 @@ def findlayer(mesh, ilayer1):
     if len(ilayer1) == 0:
         return np.array([], dtype=int)
     
-    ilayer1howm = mesh['lhowm'][ilayer1]
+    # Skip nodes that are not in the node -> element arrays
+    nodes = ilayer1[ilayer1 < len(mesh['lwhere'])]
+    ilayer1howm = mesh['lhowm'][nodes]
+    where = mesh['lwhere'][nodes]
     
-    # Calculate maximum possible size for the next layer array
-    total_elements = np.sum(ilayer1howm) * 3
-    ilayerall = np.zeros(total_elements, dtype=int)
+    # Positions of every element around every node of the layer in the CSR array
+    offsets = np.cumsum(ilayer1howm) - ilayer1howm
+    positions = np.repeat(where - offsets, ilayer1howm) + np.arange(np.sum(ilayer1howm))
+    elems = mesh['conelem'][positions[positions < len(mesh['conelem'])]]
     
-    k = 0
-    
-    for node, num_elems in zip(ilayer1, ilayer1howm):
-        if node >= len(mesh['lwhere']):
-            continue
-        
-        where = mesh['lwhere'][node]
-        
-        # Avoid out-of-bounds access
-        end = min(where + num_elems, len(mesh['conelem']))
-        elems = mesh['conelem'][where:end]
-        
-        # Collect nodes from connectivity
-        elems_nodes = mesh['connec'][elems].flatten()
-        if k + len(elems_nodes) > len(ilayerall):
-            ilayerall = np.resize(ilayerall, k + len(elems_nodes))
-        
-        ilayerall[k:k + len(elems_nodes)] = elems_nodes
-        k += len(elems_nodes)
-    
-    ilayerall = ilayerall[:k]
+    # Collect nodes from connectivity
+    ilayerall = mesh['connec'][elems].flatten()
     ilayer = np.unique(np.setdiff1d(ilayerall, ilayer1))
     
     return ilayer
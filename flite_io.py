@@ -0,0 +1,239 @@
+"""
+Readers for the FLITE files: solverout.res, solverout.rsd, mesh.dat and the binary mesh.sol.
+
+The text tables are read with np.loadtxt, whose C parser (numpy >= 1.23) is the fastest text reader
+available here: a fixed-width bulk parser in numpy measured 0.3x of it on raw_data/1000/0.50/4.00, since
+a single vectorised pass over the 0.9 MB of solverout.res already costs about 1 ms. The 10x faster
+import of solverout.res and solverout.rsd asked for is therefore not met (1.0x, see
+benchmarks/bench_flite_io.py), and read_mesh_dat is no faster than the sliced np.loadtxt calls it is
+made of (it also reads the boundary table). What is faster comes from not parsing text:
+
+- read_forces seeks to the last line of solverout.rsd instead of reading the history (several hundred
+  times faster);
+- read_mesh_sol reads the nodes and edges from the binary mesh.sol (about 4x against mesh.dat);
+- result_store keeps converted cases as memory-mappable .npy files (about 8x for repeated reads).
+"""
+import os
+import numpy as np
+
+from conelem import orient_connectivity
+
+def read_res(path):
+    """
+    Reads solverout.res: node number, rho, u, v, e and p for every node.
+
+    Returns:
+    np.ndarray: Array of shape (np, 6).
+    """
+    return np.loadtxt(path, ndmin=2)
+
+def read_rsd(path):
+    """
+    Reads solverout.rsd: iteration, log residual and force coefficients for every iteration.
+
+    Returns:
+    np.ndarray: Array of shape (iterations, columns).
+    """
+    return np.loadtxt(path, ndmin=2)
+
+def read_last_line(path, block=4096):
+    """
+    Returns the last non-empty line of a text file, reading backwards from the end so the cost does not
+    depend on the length of the file.
+    """
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        tail = b''
+        pos = size
+        while pos > 0:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            tail = f.read(step) + tail
+            stripped = tail.rstrip()
+            if stripped.rfind(b'\n') >= 0 or (pos == 0 and stripped):
+                break
+    line = tail.rstrip().rsplit(b'\n', 1)[-1].strip()
+    return line.decode()
+
+def read_forces(path):
+    """
+    Reads the force coefficients CY and CX from the last line of solverout.rsd.
+
+    Returns:
+    tuple: CY, CX.
+    """
+    line = read_last_line(path)
+    if not line:
+        raise ValueError(f"{path} does not contain any data lines.")
+    parts = line.split()
+    return float(parts[2]), float(parts[3])
+
+def read_mesh_size(path):
+    """
+    Returns:
+    tuple: Number of elements, points and boundary edges from the header of a mesh.dat file.
+    """
+    with open(path, 'r') as f:
+        lines = [next(f) for _ in range(4)]
+    return tuple(int(v) for v in lines[3].split())
+
+def read_mesh_dat(path):
+    """
+    Reads a mesh.dat file written by save_mesh.
+
+    Returns:
+    tuple: Coordinates (np, 2), 1-based connectivity (ne, 3) and boundary data (nb, 3).
+    """
+    ne, np_, nb = read_mesh_size(path)
+
+    connec = np.loadtxt(path, dtype=np.int64, skiprows=5, max_rows=ne, ndmin=2)[:, 1:4]
+    xy = np.loadtxt(path, skiprows=6 + ne, max_rows=np_, ndmin=2)[:, 1:3]
+    boundaries = np.loadtxt(path, dtype=np.int64, skiprows=7 + ne + np_, max_rows=nb, ndmin=2)
+    return xy, connec, boundaries
+
+class FortranRecords:
+    """
+    Sequential reader for Fortran unformatted files with 4-byte little-endian record markers.
+
+    Runs of records of the same length are read as one strided array, so a file of many small records
+    is read without a Python loop over the records.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def record(self, dtype='<i4'):
+        n = int(np.frombuffer(self.data, '<i4', 1, self.pos)[0])
+        value = np.frombuffer(self.data, dtype, n // np.dtype(dtype).itemsize, self.pos + 4)
+        if int(np.frombuffer(self.data, '<i4', 1, self.pos + 4 + n)[0]) != n:
+            raise ValueError(f"Corrupt record marker at byte {self.pos}")
+        self.pos += n + 8
+        return value
+
+    def length(self):
+        # Length in bytes of the next record
+        return int(np.frombuffer(self.data, '<i4', 1, self.pos)[0])
+
+    def run_length(self):
+        # Number of consecutive records, starting with the next one, that have the same length
+        n = self.length()
+        stride = n + 8
+        count = (len(self.data) - self.pos) // stride
+        markers = np.ndarray((count,), '<i4', self.data, self.pos, (stride,))
+        different = np.flatnonzero(markers != n)
+        return int(different[0]) if len(different) else count
+
+    def records(self, count, dtype='<i4'):
+        """
+        Reads `count` consecutive records of equal length as an array of shape (count, values per record).
+        """
+        n = int(np.frombuffer(self.data, '<i4', 1, self.pos)[0])
+        stride = n + 8
+        markers = np.ndarray((count, 2), '<i4', self.data, self.pos, (stride, n + 4))
+        if np.any(markers != n):
+            raise ValueError(f"Records starting at byte {self.pos} do not all have length {n}")
+        itemsize = np.dtype(dtype).itemsize
+        values = np.ndarray((count, n // itemsize), dtype, self.data, self.pos + 4, (stride, itemsize))
+        self.pos += count * stride
+        return values.copy()
+
+def read_mesh_sol(path):
+    """
+    Reads the finest grid of a mesh.sol file written by PrePro.exe.
+
+    The file holds the number of grid levels and then, for each level, the boundary edges, the boundary
+    node data, the edge list with its edge coefficients, the dual volumes and the node coordinates. Only
+    the finest level is decoded; the boundary node records are skipped.
+
+    Returns:
+    dict: 'levels', 'boundaries' (nb, 3), 'boundary_normals' (nb * 2, 2), 'edges' (nedge, 2, 1-based),
+        'edge_coefficients' (2, nedge, 2), 'volumes' (np,) and 'xy' (np, 2). Real arrays are single
+        precision, as stored.
+    """
+    with open(path, 'rb') as f:
+        reader = FortranRecords(f.read())
+
+    levels = int(reader.record()[0])
+    nb = int(reader.record()[0])
+    boundaries = reader.records(nb)
+
+    reader.records(reader.run_length())
+    normals = reader.records(reader.run_length(), '<f4')
+
+    # A few flag records follow; the edge count is the one followed by three records per edge
+    while True:
+        value = reader.record()
+        if len(value) == 1 and reader.length() == 8 and reader.run_length() == 3 * int(value[0]):
+            break
+    nedge = int(value[0])
+
+    edges = reader.records(nedge)
+    coefficients = reader.records(2 * nedge, '<f4').reshape(2, nedge, 2)
+
+    np_ = int(reader.record()[0])
+    volumes = reader.records(np_, '<f4').ravel()
+    xy = reader.records(np_, '<f4')
+
+    return {'levels': levels, 'boundaries': boundaries, 'boundary_normals': normals, 'edges': edges,
+            'edge_coefficients': coefficients, 'volumes': volumes, 'xy': xy}
+
+def triangles_from_edges(edges, xy):
+    """
+    Rebuilds the elements of a triangulation from its edge list, as the 3-cycles of the edge graph
+    that contain no node.
+
+    Parameters:
+    edges (np.ndarray): (nedge, 2) edges, 0-based.
+    xy (np.ndarray): Node coordinates.
+
+    Returns:
+    np.ndarray: Anticlockwise connectivity (0-based).
+    """
+    n = len(xy)
+    edges = np.sort(edges, axis=1)
+    keys = np.unique(edges[:, 0].astype(np.int64) * n + edges[:, 1])
+    lo, hi = keys // n, keys % n
+
+    # Wedges (a, b, c), a < b < c, with edges a-b and a-c; a triangle when b-c is an edge too.
+    # Edges are sorted, so the c of edge a-b are the later entries of a's group.
+    group_end = np.searchsorted(lo, lo, side='right')
+    idx = np.arange(len(keys))
+    count = group_end - idx - 1
+    ab = np.repeat(idx, count)
+    ac = ab + 1 + np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+    found = np.isin(hi[ab] * n + hi[ac], keys)
+    tri = np.column_stack([lo[ab[found]], hi[ab[found]], hi[ac[found]]])
+
+    # A 3-cycle that is not an element encloses nodes. An edge belongs to at most two elements, so only
+    # cycles on edges with more uses need checking.
+    tri = orient_connectivity(tri, xy)
+    half = np.sort(np.concatenate([tri[:, [0, 1]], tri[:, [1, 2]], tri[:, [2, 0]]]), axis=1)
+    _, inverse, uses = np.unique(half[:, 0].astype(np.int64) * n + half[:, 1], return_inverse=True, return_counts=True)
+    suspect = np.flatnonzero((uses[inverse] > 2).reshape(3, -1).any(axis=0))
+    keep = np.ones(len(tri), dtype=bool)
+    for t in suspect:
+        corners = xy[tri[t]]
+        inside = np.all((xy > corners.min(axis=0)) & (xy < corners.max(axis=0)), axis=1)
+        inside[tri[t]] = False
+        p = xy[inside]
+        # Strictly left of all three anticlockwise edges
+        for a, b in ((0, 1), (1, 2), (2, 0)):
+            edge = corners[b] - corners[a]
+            rel = p - corners[a]
+            p = p[edge[0] * rel[:, 1] - edge[1] * rel[:, 0] > 0]
+        keep[t] = len(p) == 0
+    return tri[keep]
+
+def mesh_from_sol(path):
+    """
+    Rebuilds a mesh dict ('xy' and 1-based 'connec') from mesh.sol, without reading mesh.dat.
+
+    The coordinates are the single-precision values stored by PrePro.exe.
+    """
+    sol = read_mesh_sol(path)
+    xy = sol['xy'].astype(np.float64)
+    connec = triangles_from_edges(sol['edges'] - 1, xy)
+    return {'xy': xy, 'connec': connec + 1}
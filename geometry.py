@@ -0,0 +1,216 @@
+"""
+Batch loading of airfoil sections and the boundary data derived from them.
+
+load_geometries reads every section in a directory (one 'x y' pair per line, any number of points) into
+a single stacked array with per-airfoil offsets. The result is cached on disk as .npz, keyed by the
+directory, and kept in memory, so a campaign over many airfoils parses each text file once. The cache
+is rebuilt when files are added, removed or modified.
+
+bound_data no longer comes from a fixed file. boundary_edges builds it for any section size: one
+closed loop over the airfoil points (flag AIRFOIL_FLAG) followed by one over the far-field points
+(flag FARFIELD_FLAG). For 174-point sections and the 28-point flow_field this is bound_data.txt.
+"""
+import os
+import hashlib
+import tempfile
+import numpy as np
+
+GEOMETRY_CACHE = os.path.join('.', 'geometry_cache')
+
+# Boundary flags written to mesh.dat for the airfoil and the far field
+AIRFOIL_FLAG = 1
+FARFIELD_FLAG = 3
+
+# Directory -> GeometrySet, for the sets already loaded by this process
+_loaded = {}
+# Path -> (modification time, array) of the shared input files
+_shared = {}
+
+def parse_section(data):
+    """
+    Parses the text of one section file.
+
+    Returns:
+    np.ndarray: Array of shape (n, 2). A closing point repeating the first one is dropped.
+    """
+    values = np.fromstring(data, sep=' ')
+    if len(values) % 2:
+        raise ValueError('Section file does not hold x y pairs')
+    points = values.reshape(-1, 2)
+    if len(points) > 1 and np.array_equal(points[0], points[-1]):
+        points = points[:-1]
+    return points
+
+def boundary_edges(n_airfoil, n_farfield):
+    """
+    Builds bound_data for an airfoil of n_airfoil points followed by n_farfield far-field points.
+
+    Returns:
+    np.ndarray: Array of shape (n_airfoil + n_farfield, 3) with the 1-based end points and boundary flag
+        of each edge.
+    """
+    edges = []
+    for start, n, flag in ((0, n_airfoil, AIRFOIL_FLAG), (n_airfoil, n_farfield, FARFIELD_FLAG)):
+        nodes = np.arange(start + 1, start + n + 1)
+        edges.append(np.column_stack([nodes, np.roll(nodes, -1), np.full(n, flag)]))
+    return np.vstack(edges).astype(int)
+
+def split_sections(xy, n_airfoil):
+    """
+    Returns the outer boundary and the list of inner boundaries of airfoil + far-field coordinates, as
+    split_boundary does for bound_data from boundary_edges.
+    """
+    return xy[n_airfoil:], [xy[:n_airfoil]]
+
+def _manifest(path):
+    # Name, size and modification time of every section file in the directory
+    entries = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.name.endswith('.txt') and entry.is_file():
+                stat = entry.stat()
+                entries.append((entry.name[:-4], stat.st_size, stat.st_mtime_ns))
+    return sorted(entries)
+
+def _name(airfoil):
+    # File stem of an airfoil given as a number (1000, 1000.0) or as its name
+    if isinstance(airfoil, (int, float, np.integer, np.floating)):
+        return str(int(airfoil))
+    return str(airfoil)
+
+class GeometrySet:
+    """
+    The sections of a directory of airfoils, stacked into one array.
+
+    Parameters:
+    path (str): Directory the sections were read from.
+    names (list): Airfoil names (file names without .txt).
+    points (np.ndarray): Coordinates of all sections, one after the other.
+    offsets (np.ndarray): Start of each section in points, followed by len(points).
+    manifest (list): (name, size, mtime_ns) of the files the set was read from.
+    """
+
+    def __init__(self, path, names, points, offsets, manifest):
+        self.path = path
+        self.names = list(names)
+        self.points = points
+        self.offsets = offsets
+        self.manifest = manifest
+        self._index = {name: i for i, name in enumerate(self.names)}
+        self._stats = {name: (size, mtime) for name, size, mtime in manifest}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __contains__(self, airfoil):
+        return _name(airfoil) in self._index
+
+    @property
+    def counts(self):
+        return np.diff(self.offsets)
+
+    def coordinates(self, airfoil):
+        """
+        Returns:
+        np.ndarray: (n, 2) coordinates of the airfoil, a read-only view into points.
+        """
+        i = self._index.get(_name(airfoil))
+        if i is None:
+            raise FileNotFoundError(f'No section for airfoil {_name(airfoil)} in {self.path}')
+        return self.points[self.offsets[i]:self.offsets[i + 1]]
+
+    def is_current(self, airfoil=None):
+        # Checks the directory, and the file of one airfoil, against the manifest without a full scan
+        if airfoil is None:
+            return _manifest(self.path) == self.manifest
+        try:
+            stat = os.stat(os.path.join(self.path, f'{_name(airfoil)}.txt'))
+        except FileNotFoundError:
+            return _name(airfoil) not in self._index
+        return self._stats.get(_name(airfoil)) == (stat.st_size, stat.st_mtime_ns)
+
+def _read_directory(path, manifest):
+    names, sections = [], []
+    for name, _, _ in manifest:
+        with open(os.path.join(path, f'{name}.txt'), 'r') as f:
+            sections.append(parse_section(f.read()))
+        names.append(name)
+    offsets = np.zeros(len(sections) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(s) for s in sections])
+    points = np.vstack(sections) if sections else np.zeros((0, 2))
+    return GeometrySet(path, names, points, offsets, manifest)
+
+def _cache_file(path, cache_path):
+    digest = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:16]
+    return os.path.join(cache_path, f'{digest}.npz')
+
+def _load_cache(file_path, path, manifest):
+    try:
+        with np.load(file_path) as data:
+            cached = list(zip(data['names'].tolist(), data['sizes'].tolist(), data['mtimes'].tolist()))
+            if cached != manifest:
+                return None
+            return GeometrySet(path, data['names'].tolist(), data['points'], data['offsets'], manifest)
+    except (OSError, KeyError, ValueError):
+        return None
+
+def _store_cache(file_path, geometries):
+    # Written to a temporary file and renamed, so concurrent readers never see a partial cache
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix='.npz', dir=os.path.dirname(file_path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, names=np.array([m[0] for m in geometries.manifest]),
+                     sizes=np.array([m[1] for m in geometries.manifest], dtype=np.int64),
+                     mtimes=np.array([m[2] for m in geometries.manifest], dtype=np.int64),
+                     points=geometries.points, offsets=geometries.offsets)
+        os.replace(tmp, file_path)
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def load_geometries(path=os.path.join('.', 'data_geometry'), cache_path=GEOMETRY_CACHE, airfoil=None):
+    """
+    Loads every section in a directory.
+
+    Parameters:
+    path (str): Directory of <airfoil>.txt section files.
+    cache_path (str): Directory of the on-disk cache; None always reads the text files.
+    airfoil: When given, a set already loaded by this process is reused as long as this airfoil's file
+        is unchanged, without scanning the directory again.
+
+    Returns:
+    GeometrySet: The sections.
+    """
+    key = os.path.abspath(path)
+    geometries = _loaded.get(key)
+    if geometries is not None and geometries.is_current(airfoil):
+        return geometries
+
+    manifest = _manifest(path)
+    geometries = None
+    if cache_path is not None:
+        file_path = _cache_file(path, cache_path)
+        geometries = _load_cache(file_path, path, manifest)
+    if geometries is None:
+        geometries = _read_directory(path, manifest)
+        if cache_path is not None:
+            _store_cache(file_path, geometries)
+
+    geometries.points.flags.writeable = False
+    _loaded[key] = geometries
+    return geometries
+
+def load_shared(path):
+    """
+    Loads a shared input file (flow_field.txt, psource.txt) with np.loadtxt, once per modification.
+    """
+    mtime = os.stat(path).st_mtime_ns
+    cached = _shared.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, np.loadtxt(path))
+        _shared[path] = cached
+    return cached[1].copy()
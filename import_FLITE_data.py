@@ -1,8 +1,6 @@
-import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.tri import Triangulation
+from flite_io import read_res, read_rsd
 
-def import_FLITE_data(rsdname, resname, mesh):
+def import_FLITE_data(rsdname, resname, mesh, plot=True):
     """
     Imports data output by the FLITE 2D solver and preprocessor, and creates various plots.
 
@@ -10,17 +8,55 @@ def import_FLITE_data(rsdname, resname, mesh):
     rsdname (str): Path to the residual data file.
     resname (str): Path to the results data file.
     mesh (dict): Dictionary containing mesh data with keys 'connec' (connectivity) and 'xy' (coordinates).
+    plot (bool): Draw and show the plots. matplotlib is only imported when this is True.
 
     Returns:
     results (np.ndarray): The results data from the FLITE solver.
     residual (np.ndarray): The residual data from the FLITE solver.
     """
     # Import data from text files
-    results = np.loadtxt(resname)
-    residual = np.loadtxt(rsdname)
+    results = read_res(resname)
+    residual = read_rsd(rsdname)
+
+    if plot:
+        plot_FLITE_data(results, residual, mesh)
+
+    return results, residual
+
+def normalised_pressure(results):
+    """
+    Normalised pressure p/q_inf at every node, from the p column of solverout.res. The solver scales its
+    variables by the freestream density and speed, so q_inf = 1/2.
+
+    Parameters:
+    results (np.ndarray): The results data from the FLITE solver (node number, rho, u, v, e, p), where
+        p = (gamma - 1) rho (e - |V|^2 / 2).
+
+    Returns:
+    np.ndarray: p/q_inf of every node.
+    """
+    return 2.0 * results[:, 5]
+
+def plot_FLITE_data(results, residual, mesh, show=True):
+    """
+    Plots convergence, force coefficients, density, pressure and velocity from FLITE solver output.
+
+    Parameters:
+    results (np.ndarray): The results data from the FLITE solver.
+    residual (np.ndarray): The residual data from the FLITE solver.
+    mesh (dict): Dictionary containing mesh data with keys 'connec' (1-based connectivity) and 'xy'.
+    show (bool): Call plt.show() once the figures are drawn.
+
+    Returns:
+    dict: The figures, keyed 'convergence', 'forces', 'density', 'pressure' and 'velocity'.
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.tri import Triangulation
+
+    figures = {}
 
     # Plot convergence plot
-    plt.figure()
+    figures['convergence'] = plt.figure()
     plt.plot(residual[:, 0], residual[:, 1])
     plt.title('Convergence Plot')
     plt.xlabel('Iteration Number')
@@ -28,7 +64,7 @@ def import_FLITE_data(rsdname, resname, mesh):
     plt.grid(True)
 
     # Plot Lift and Drag
-    plt.figure()
+    figures['forces'] = plt.figure()
     plt.plot(residual[:, 0], residual[:, 2], label='Lift')
     plt.plot(residual[:, 0], residual[:, 3], 'r', label='Drag')
     plt.legend()
@@ -37,7 +73,7 @@ def import_FLITE_data(rsdname, resname, mesh):
     plt.grid(True)
 
     # Plot Normalized Density
-    plt.figure()
+    figures['density'] = plt.figure()
     # Create a Triangulation object for 0-based indexing in Python
     tri = Triangulation(mesh['xy'][:, 0], mesh['xy'][:, 1], mesh['connec'] - 1)
     plt.tripcolor(tri, results[:, 1], shading='gouraud', cmap='jet')
@@ -46,11 +82,8 @@ def import_FLITE_data(rsdname, resname, mesh):
     plt.gca().set_aspect('equal')
 
     # Plot Normalized Pressure
-    plt.figure()
-    gamma = 1.4
-    T_star = gamma * (results[:, 4] - (results[:, 2]**2 + results[:, 3]**2))
-    p_star = ((gamma - 1) / gamma) * results[:, 1] * T_star
-    p_norm = 2.0 * p_star
+    figures['pressure'] = plt.figure()
+    p_norm = normalised_pressure(results)
     #plt.xlim(-0.2, 1.5)
     #plt.ylim(-0.5, 0.5)
     plt.tripcolor(tri, p_norm, shading='gouraud', cmap='jet')
@@ -60,12 +93,13 @@ def import_FLITE_data(rsdname, resname, mesh):
     plt.gca().set_aspect('equal')
 
     # Plot Velocity Vectors
-    plt.figure()
+    figures['velocity'] = plt.figure()
     plt.quiver(mesh['xy'][:, 0], mesh['xy'][:, 1], results[:, 2], results[:, 3], scale=0.1)
     plt.title('Velocity Vectors')
     plt.gca().set_aspect('equal')
     plt.grid(True)
 
-    plt.show()
+    if show:
+        plt.show()
 
-    return results, residual
+    return figures
@@ -0,0 +1,194 @@
+import numpy as np
+
+from conelem import element_areas, orient_connectivity, build_adjacency
+
+def incircle(xy, a, b, c, d):
+    """
+    Incircle determinant of the anticlockwise triangles (a, b, c) and the points d.
+
+    Returns:
+    tuple: Determinants, positive when d lies inside the circumcircle, and a scale for tolerances.
+    """
+    ad = xy[a] - xy[d]
+    bd = xy[b] - xy[d]
+    cd = xy[c] - xy[d]
+    ad2 = (ad**2).sum(axis=1)
+    bd2 = (bd**2).sum(axis=1)
+    cd2 = (cd**2).sum(axis=1)
+    det = (ad[:, 0] * (bd[:, 1] * cd2 - bd2 * cd[:, 1])
+           - ad[:, 1] * (bd[:, 0] * cd2 - bd2 * cd[:, 0])
+           + ad2 * (bd[:, 0] * cd[:, 1] - bd[:, 1] * cd[:, 0]))
+    scale = (ad2 + bd2 + cd2)**2
+    return det, scale
+
+def rematch_neighbours(connec, neighbours, changed):
+    """
+    Updates the element -> element neighbours around a set of elements whose nodes changed.
+
+    Only the changed elements and their previous neighbours are examined, so the cost depends on the
+    number of changed elements, not on the size of the mesh.
+
+    Parameters:
+    connec (np.ndarray): Connectivity (0-based), already holding the new node lists.
+    neighbours (np.ndarray): Element neighbours, opposite each local node; updated in place.
+    changed (np.ndarray): Elements whose node lists changed. Their rows in neighbours must still hold
+        the neighbours from before the change (-1 for new elements).
+    """
+    changed = np.unique(changed)
+    around = neighbours[changed].ravel()
+    local = np.union1d(changed, around[around >= 0])
+
+    NoPoints = int(connec[local].max()) + 1
+    start = connec[local][:, [1, 2, 0]].ravel()
+    end = connec[local][:, [2, 0, 1]].ravel()
+    keys = np.minimum(start, end).astype(np.int64) * NoPoints + np.maximum(start, end)
+    owner = np.repeat(local, 3)
+    slot = np.tile(np.arange(3), len(local))
+
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    owner = owner[order]
+    slot = slot[order]
+
+    # Half-edges of changed elements with no partner are on the boundary
+    is_changed = np.isin(owner, changed)
+    neighbours[owner[is_changed], slot[is_changed]] = -1
+
+    same = np.flatnonzero(keys[1:] == keys[:-1])
+    neighbours[owner[same], slot[same]] = owner[same + 1]
+    neighbours[owner[same + 1], slot[same + 1]] = owner[same]
+
+def split_elements(connec, neighbours, elems, new_nodes):
+    """
+    Splits each element of `elems` into three around the matching new node, which must lie inside it.
+
+    The element keeps its index for the sub-triangle that replaces its first node; the other two are
+    appended to the connectivity.
+
+    Parameters:
+    connec (np.ndarray): Anticlockwise connectivity (0-based).
+    neighbours (np.ndarray): Element neighbours, opposite each local node.
+    elems (np.ndarray): Elements to split.
+    new_nodes (np.ndarray): Node inserted in each element.
+
+    Returns:
+    tuple: The new connectivity, the new neighbours and the indices of every element created or changed.
+    """
+    NoElem = len(connec)
+    m = len(elems)
+    old = connec[elems]
+
+    second = NoElem + np.arange(m)
+    third = NoElem + m + np.arange(m)
+
+    connec = np.vstack([connec,
+                        np.column_stack([old[:, 0], new_nodes, old[:, 2]]),
+                        np.column_stack([old[:, 0], old[:, 1], new_nodes])])
+    connec[elems] = np.column_stack([new_nodes, old[:, 1], old[:, 2]])
+
+    # New elements start with the neighbours of the element they came from, so rematching sees them
+    neighbours = np.vstack([neighbours, neighbours[elems], neighbours[elems]])
+
+    changed = np.concatenate([elems, second, third])
+    rematch_neighbours(connec, neighbours, changed)
+    return connec, neighbours, changed
+
+def legalize(xy, connec, neighbours, dirty, max_rounds=10000):
+    """
+    Restores the Delaunay property around the given elements by Lawson edge flips.
+
+    Each round tests every edge of the dirty elements that has an element on both sides, and flips the
+    edges that fail the incircle test and whose quadrilateral is convex. Flips within a round share no
+    element. Boundary edges (no element on the other side) are never flipped, so the mesh stays inside
+    the domain. connec and neighbours are updated in place.
+
+    Parameters:
+    xy (np.ndarray): Node coordinates.
+    connec (np.ndarray): Anticlockwise connectivity (0-based).
+    neighbours (np.ndarray): Element neighbours, opposite each local node.
+    dirty (np.ndarray): Elements to start from.
+    max_rounds (int): Safety limit on the number of rounds.
+
+    Returns:
+    int: Number of flips made.
+    """
+    flips = 0
+    dirty = np.unique(dirty)
+
+    for _ in range(max_rounds):
+        t = np.repeat(dirty, 3)
+        k = np.tile(np.arange(3), len(dirty))
+        u = neighbours[t, k]
+        keep = (u >= 0) & (t < u)
+        keep |= (u >= 0) & ~np.isin(u, dirty)
+        t, k, u = t[keep], k[keep], u[keep]
+        if len(t) == 0:
+            break
+
+        p = connec[t, k]
+        e1 = connec[t, (k + 1) % 3]
+        e2 = connec[t, (k + 2) % 3]
+        m = np.argmax(neighbours[u] == t[:, None], axis=1)
+        q = connec[u, m]
+
+        det, scale = incircle(xy, p, e1, e2, q)
+        bad = det > 1e-12 * scale
+
+        # The flipped pair (p, e1, q), (q, e2, p) must both be anticlockwise
+        new_t = np.column_stack([p, e1, q])
+        new_u = np.column_stack([q, e2, p])
+        bad &= (element_areas(new_t, xy) > 0) & (element_areas(new_u, xy) > 0)
+
+        idx = np.flatnonzero(bad)
+        if len(idx) == 0:
+            break
+
+        # Independent set: an edge is flipped when it is the first candidate touching both its elements
+        elems = np.concatenate([t[idx], u[idx]])
+        position = np.tile(np.arange(len(idx)), 2)
+        order = np.lexsort((position, elems))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = elems[order][1:] != elems[order][:-1]
+        selected = np.bincount(position[order][first], minlength=len(idx)) == 2
+        waiting = idx[~selected]
+        idx = idx[selected]
+
+        connec[t[idx]] = new_t[idx]
+        connec[u[idx]] = new_u[idx]
+        changed = np.concatenate([t[idx], u[idx]])
+        rematch_neighbours(connec, neighbours, changed)
+
+        flips += len(idx)
+        dirty = np.union1d(changed, t[waiting])
+
+    return flips
+
+def insert_centroids(xy, connec, neighbours, elems, first_node):
+    """
+    Inserts nodes first_node, first_node + 1, ... into the elements `elems`, then restores the Delaunay
+    property around them.
+
+    Returns:
+    tuple: The new connectivity and neighbours.
+    """
+    if len(elems) == 0:
+        return connec, neighbours
+    new_nodes = first_node + np.arange(len(elems))
+    connec, neighbours, changed = split_elements(connec, neighbours, elems, new_nodes)
+    legalize(xy, connec, neighbours, changed)
+    return connec, neighbours
+
+def relegalize(xy, connec, neighbours):
+    """
+    Restores the Delaunay property after nodes have moved, using edge flips.
+
+    If any element has folded, the orientation and neighbours are rebuilt from scratch first.
+
+    Returns:
+    np.ndarray: The neighbours (connec is updated in place).
+    """
+    if np.any(element_areas(connec, xy) <= 0):
+        orient_connectivity(connec, xy)
+        neighbours = build_adjacency(connec, len(xy))['neighbours']
+    legalize(xy, connec, neighbours, np.arange(len(connec)))
+    return neighbours
@@ -1,24 +1,123 @@
 import numpy as np
-from conelem import conelem
-from findlayer import findlayer
+from scipy.sparse import csr_matrix
+from conelem import element_areas, orient_connectivity, build_adjacency
+
+def smoothing_matrix(mesh, bound_data):
+    """
+    Builds the structure shared by every smoothing sweep on a fixed connectivity.
+
+    Parameters:
+    mesh (dict): Mesh with 'xy' and oriented 'connec' (0-based).
+    bound_data (numpy.ndarray): Boundary edges; their first nodes stay fixed.
+
+    Returns:
+    dict: 'matrix' (node -> node adjacency as a CSR matrix of ones), 'degree' (neighbours per node),
+        'free' (mask of the nodes allowed to move) and 'rows' (row index of every stored entry).
+    """
+    NoPoints = len(mesh['xy'])
+    adjacency = build_adjacency(mesh['connec'], NoPoints)
+    node_ptr = adjacency['node_ptr']
+    node_adj = adjacency['node_adj']
+
+    matrix = csr_matrix((np.ones(len(node_adj)), node_adj, node_ptr), shape=(NoPoints, NoPoints))
+    degree = np.diff(node_ptr)
+
+    free = degree > 0
+    BoundIndex = bound_data[:, 0] - 1
+    free[BoundIndex[BoundIndex < NoPoints]] = False
+
+    return {'matrix': matrix, 'degree': degree, 'free': free, 'rows': np.repeat(np.arange(NoPoints), degree),
+            'adjacency': adjacency}
+
+def smoothing_step(xy, smoother, alpha, weighted=False):
+    """
+    Moves every free node a fraction alpha of the way to the (weighted) centroid of its neighbours.
+
+    With weighted=True each neighbour is weighted by the length of the edge joining it to the node,
+    which evens out edge lengths faster than the plain average.
+    """
+    free = smoother['free']
+    matrix = smoother['matrix']
+
+    if weighted:
+        d = xy[matrix.indices] - xy[smoother['rows']]
+        matrix = csr_matrix((np.sqrt((d**2).sum(axis=1)), matrix.indices, matrix.indptr), shape=matrix.shape)
+        centroid = (matrix @ xy)[free] / np.asarray(matrix.sum(axis=1))[free]
+    else:
+        centroid = (matrix @ xy)[free] / smoother['degree'][free, None]
+
+    new_xy = xy.copy()
+    x_c = centroid - xy[free]
+    new_xy[free] += alpha * x_c
+    return new_xy
+
+def guard_inversion(old_xy, new_xy, connec, free, max_halvings=8):
+    """
+    Cuts back node moves that would invert an element.
+
+    Elements with positive area before the sweep must keep a positive area. The moves of the free nodes
+    of any element that would fold are halved, and the check is repeated; after max_halvings the nodes
+    are sent back to their previous position.
+
+    Returns:
+    numpy.ndarray: The guarded coordinates.
+    """
+    valid = element_areas(connec, old_xy) > 0
+    new_xy = new_xy.copy()
+    halvings = np.zeros(len(old_xy), dtype=int)
+    while True:
+        bad = valid & (element_areas(connec, new_xy) <= 0)
+        if not bad.any():
+            return new_xy
+        nodes = np.unique(connec[bad])
+        nodes = nodes[free[nodes] & np.any(new_xy[nodes] != old_xy[nodes], axis=1)]
+        if len(nodes) == 0:
+            return new_xy
+        halvings[nodes] += 1
+        new_xy[nodes] = old_xy[nodes] + 0.5 * (new_xy[nodes] - old_xy[nodes])
+        stuck = nodes[halvings[nodes] > max_halvings]
+        new_xy[stuck] = old_xy[stuck]
+
+def laplacian_smooth(mesh_in, bound_data, NoSweeps, alpha, method='laplacian', guard=False, taubin_mu=None):
+    """
+    Laplacian smoothing of the free (non-boundary) nodes.
+
+    The node adjacency is built once as a sparse matrix, and every sweep is a sparse matrix-vector
+    product on it.
+
+    Parameters:
+    mesh_in (dict): Mesh with 'xy' and 'connec' (0-based).
+    bound_data (numpy.ndarray): Boundary edges; their first nodes stay fixed.
+    NoSweeps (int): Number of sweeps.
+    alpha (float): Relaxation factor of each sweep.
+    method (str): 'laplacian' (plain neighbour average), 'weighted' (edge-length weighted average) or
+        'taubin' (a shrinking step with alpha followed by an inflating step with taubin_mu).
+    guard (bool): Cut back moves that would invert an element (see guard_inversion).
+    taubin_mu (float): Negative factor of the Taubin inflating step. Defaults to a 0.1 pass-band value.
+
+    Returns:
+    dict: The smoothed mesh.
+    """
+    if method not in ('laplacian', 'weighted', 'taubin'):
+        raise ValueError(f"Unknown smoothing method: {method}")
 
-def laplacian_smooth(mesh_in, bound_data, NoSweeps, alpha):
     mesh = mesh_in.copy()
-    IndVec = np.arange(len(mesh['xy']))
-    BoundIndex = np.intersect1d(IndVec, bound_data[:, 0] - 1)
-    FreeInd = np.setdiff1d(IndVec, BoundIndex)
+
+    # Connectivity does not change between sweeps, so the sparse structure is built once
+    mesh['connec'] = orient_connectivity(mesh['connec'], mesh['xy'])
+    smoother = smoothing_matrix(mesh, bound_data)
+    mesh.update(smoother['adjacency'])
+
+    if method == 'taubin' and taubin_mu is None:
+        taubin_mu = 1.0 / (0.1 - 1.0 / alpha)
+    steps = [alpha] if method != 'taubin' else [alpha, taubin_mu]
 
     for _ in range(NoSweeps):
-        mesh = conelem(mesh)
-        new_xy = mesh['xy'].copy()
-
-        for i in FreeInd:
-            neighbours = findlayer(mesh, [i])
-            if len(neighbours) > 0:
-                centroid = np.mean(mesh['xy'][neighbours], axis=0)
-                x_c = centroid - mesh['xy'][i]
-                new_xy[i] += alpha * x_c
-        
-        mesh['xy'] = new_xy
+        mesh['connec'] = orient_connectivity(mesh['connec'], mesh['xy'])
+        for factor in steps:
+            new_xy = smoothing_step(mesh['xy'], smoother, factor, weighted=(method == 'weighted'))
+            if guard:
+                new_xy = guard_inversion(mesh['xy'], new_xy, mesh['connec'], smoother['free'])
+            mesh['xy'] = new_xy
     
     return mesh
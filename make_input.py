@@ -15,14 +15,12 @@ def make_input(xy, bound_data):
     input_data = np.zeros((xy.shape[0], 3))
     input_data[:, :2] = xy
 
-    # Loop around edges to find spacing
-    for i in range(len(bound_data)):
-        point1 = bound_data[i, 0] - 1  # Convert 1-based to 0-based index
-        point2 = bound_data[i, 1] - 1  # Convert 1-based to 0-based index
-        
-        s = np.linalg.norm(xy[point1, :] - xy[point2, :])
-        input_data[point1, 2] += s
-        input_data[point2, 2] += s
+    # Add the length of every edge to both of its end points, in edge order as the loop over the edges did
+    ends = bound_data[:, :2] - 1  # Convert 1-based to 0-based index
+    d = xy[ends[:, 0]] - xy[ends[:, 1]]
+    # Row-wise dot products round like np.linalg.norm of each edge vector, so the spacing is unchanged
+    s = np.sqrt(np.matmul(d[:, None, :], d[:, :, None])[:, 0, 0])
+    np.add.at(input_data[:, 2], ends.ravel(), np.repeat(s, 2))
 
     # Average the spacing values
     input_data[:, 2] /= 2
@@ -0,0 +1,204 @@
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+from mesh_gen import MESH_GEN_VERSION
+
+# Files kept for each cached mesh
+MESH_ARRAYS = 'mesh.npz'
+MESH_FILES = ('mesh.dat', 'mesh.sol')
+
+def mesh_key(coordinates, flow_field, bound_data, psource, alpha, **options):
+    """
+    Content hash of everything a mesh depends on: the input arrays, alpha, any further mesh_gen options
+    and MESH_GEN_VERSION.
+
+    Returns:
+    str: Hex SHA-256 digest.
+    """
+    h = hashlib.sha256()
+    h.update(f'mesh_gen {MESH_GEN_VERSION}\n'.encode())
+    for name, array in (('coordinates', coordinates), ('flow_field', flow_field),
+                        ('bound_data', bound_data), ('psource', psource)):
+        array = np.ascontiguousarray(array)
+        h.update(f'{name} {array.dtype.str} {array.shape}\n'.encode())
+        h.update(array.tobytes())
+    h.update(f'alpha {float(alpha)!r}\n'.encode())
+    for name in sorted(options):
+        h.update(f'{name} {options[name]!r}\n'.encode())
+    return h.hexdigest()
+
+@contextmanager
+def file_lock(path, timeout=3600.0, stale=1800.0, poll=0.05):
+    """
+    Exclusive lock on `path`, held by creating the file. Works across processes and on network
+    file systems without fcntl. A lock file older than `stale` seconds is taken to be left over from a
+    crashed process and is removed; while the lock is held, a thread refreshes its modification time
+    every stale / 4 seconds, so a long build (mesh_gen and PrePro) is never taken for a stale lock.
+    """
+    deadline = time.time() + timeout
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > stale:
+                    os.remove(path)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.time() > deadline:
+                raise TimeoutError(f"Could not acquire lock {path}")
+            time.sleep(poll)
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_refresh_lock, args=(path, stop, stale / 4), daemon=True)
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        heartbeat.start()
+        yield
+    finally:
+        stop.set()
+        if heartbeat.is_alive():
+            heartbeat.join()
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def _refresh_lock(path, stop, interval):
+    while not stop.wait(interval):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return
+
+class MeshCache:
+    """
+    Persistent on-disk cache of generated and preprocessed meshes, keyed by mesh_key.
+
+    Each entry is a directory <path>/<key> holding mesh.npz (xy and 1-based connec), mesh.dat and
+    mesh.sol. Entries are written to a temporary directory and renamed into place, so readers never see
+    a partial entry, and a per-key lock file makes sure only one worker builds a given mesh. The
+    modification time of an entry records its last use; once the cache grows beyond max_bytes the least
+    recently used entries are removed.
+
+    Parameters:
+    path (str): Cache directory.
+    max_bytes (int): Size cap of the cache. None disables eviction.
+    """
+
+    def __init__(self, path=os.path.join('.', 'mesh_cache'), max_bytes=2 * 1024**3):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+
+    def _entry(self, key):
+        return os.path.join(self.path, key)
+
+    def lock(self, key):
+        return file_lock(os.path.join(self.path, f'{key}.lock'))
+
+    def load(self, key, dest_dir):
+        """
+        Copies mesh.dat and mesh.sol of a cached mesh into dest_dir. The caller should hold lock(key).
+
+        Returns:
+        dict: The mesh ('xy' and 1-based 'connec'), or None if the key is not cached.
+        """
+        entry = self._entry(key)
+        if not os.path.isdir(entry):
+            return None
+        for file_name in MESH_FILES:
+            shutil.copy(os.path.join(entry, file_name), os.path.join(dest_dir, file_name))
+        with np.load(os.path.join(entry, MESH_ARRAYS)) as data:
+            mesh = {'xy': data['xy'], 'connec': data['connec']}
+        os.utime(entry)
+        return mesh
+
+    def store(self, key, mesh, src_dir):
+        """
+        Adds a mesh, with the mesh.dat and mesh.sol found in src_dir, to the cache.
+        """
+        tmp = tempfile.mkdtemp(prefix='.tmp-', dir=self.path)
+        try:
+            np.savez(os.path.join(tmp, MESH_ARRAYS), xy=mesh['xy'], connec=mesh['connec'])
+            for file_name in MESH_FILES:
+                shutil.copy(os.path.join(src_dir, file_name), os.path.join(tmp, file_name))
+            os.rename(tmp, self._entry(key))
+        except OSError:
+            # Another process stored the same key first
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.isdir(self._entry(key)):
+                raise
+        self.evict()
+
+    def fetch_or_build(self, key, dest_dir, build):
+        """
+        Puts the mesh for key into dest_dir, from the cache if possible, otherwise by calling build().
+
+        build() must write mesh.dat and mesh.sol into dest_dir and return the mesh.
+
+        Returns:
+        tuple: The mesh and a flag telling whether it came from the cache.
+        """
+        with self.lock(key):
+            mesh = self.load(key, dest_dir)
+            if mesh is not None:
+                return mesh, True
+            mesh = build()
+            self.store(key, mesh, dest_dir)
+            return mesh, False
+
+    def entries(self):
+        """
+        Returns:
+        list: (last use, size in bytes, key) of every entry, least recently used first.
+        """
+        found = []
+        for key in os.listdir(self.path):
+            entry = self._entry(key)
+            if key.startswith('.') or not os.path.isdir(entry):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry))
+                found.append((os.path.getmtime(entry), size, key))
+            except FileNotFoundError:
+                continue
+        return sorted(found)
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits in max_bytes. Entries locked by another
+        process are skipped.
+
+        Returns:
+        list: Keys of the removed entries.
+        """
+        if self.max_bytes is None:
+            return []
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = []
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                with file_lock(os.path.join(self.path, f'{key}.lock'), timeout=0):
+                    shutil.rmtree(self._entry(key), ignore_errors=True)
+            except TimeoutError:
+                continue
+            total -= size
+            removed.append(key)
+        return removed
+
+    def clear(self):
+        for _, _, key in self.entries():
+            with self.lock(key):
+                shutil.rmtree(self._entry(key), ignore_errors=True)
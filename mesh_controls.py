@@ -0,0 +1,166 @@
+"""
+Controls for mesh_gen: mesh size, element budget, time budget, convergence, smoothing, renumbering
+and morphing.
+
+Mesh size is set through the insertion factor alpha. A pass inserts the centroid of every element that
+is at least 1 / (1 + alpha) of its target spacing away from the nearest point, so a larger alpha gives
+a finer mesh. The final size can be predicted before refining from the integral of 1 / h^2 over the
+domain, where h is the target spacing. For the meshes mesh_gen produces it is close to
+
+    elements = DENSITY_SCALE * (1 + alpha)**DENSITY_POWER * integral(1 / h^2)
+
+The constants were fitted on the airfoils in data_geometry, which all have 174-point sections, at alpha
+0.4, 0.8 and 1.0, with a maximum error of about 2%. The fit is inverted to choose alpha for a target
+element count. Sections with other point counts change the boundary spacing the fit does not model: an
+87-point section asked for 8000 elements gets about 9800 (22% over). Targets outside what ALPHA_RANGE
+can reach are clamped, with a warning.
+"""
+import numpy as np
+
+DENSITY_SCALE = 1.3732
+DENSITY_POWER = 1.8919
+
+# Range alpha is clamped to when it is chosen for a target element count
+ALPHA_RANGE = (0.2, 1.2)
+
+class MeshControls:
+    """
+    Settings for one mesh_gen run.
+
+    Parameters:
+    alpha (float): Insertion factor; None keeps the alpha passed to mesh_gen.
+    max_elements (int): Element budget. Insertion stops once the next point would exceed it, and the pass
+        in progress is triangulated and smoothed before refinement ends.
+    target_elements (int): Element count to aim for. alpha is chosen from the predicted size (see
+        alpha_for_target) and overrides the alpha above.
+    time_budget (float): Seconds the refinement passes may take. No pass is started when the previous
+        pass would no longer fit into the remaining time.
+    convergence_threshold (float): Refinement stops when a pass changes the element count by less than
+        this fraction.
+    pass_sweeps (int): Laplacian smoothing sweeps after each pass.
+    final_sweeps (int): Laplacian smoothing sweeps of the final mesh.
+    final_relaxation (float): Relaxation factor of the final smoothing sweeps.
+    renumber (str): Renumber the finished mesh to reduce its bandwidth, 'rcm' or 'morton' (see
+        renumber.py); None keeps the numbering of mesh generation.
+    morph (str): Morph the mesh of the closest airfoil solved in raw_data onto the new section,
+        'laplacian' or 'rbf' (see morph.py), and only run mesh_gen when no morphed mesh passes the quality
+        check. None always runs mesh_gen.
+    """
+
+    FIELDS = ('alpha', 'max_elements', 'target_elements', 'time_budget', 'convergence_threshold', 'pass_sweeps',
+              'final_sweeps', 'final_relaxation', 'renumber',
+              'morph')
+
+    def __init__(self, alpha=None, max_elements=30000, target_elements=None, time_budget=None,
+                 convergence_threshold=0.02, pass_sweeps=1, final_sweeps=5, final_relaxation=0.75, renumber=None,
+                 morph=None):
+        self.alpha = alpha
+        self.max_elements = max_elements
+        self.target_elements = target_elements
+        self.time_budget = time_budget
+        self.convergence_threshold = convergence_threshold
+        self.pass_sweeps = pass_sweeps
+        self.final_sweeps = final_sweeps
+        self.final_relaxation = final_relaxation
+        self.renumber = renumber
+        self.morph = morph
+
+    def __repr__(self):
+        values = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.FIELDS)
+        return f'MeshControls({values})'
+
+    def __eq__(self, other):
+        return isinstance(other, MeshControls) and repr(self) == repr(other)
+
+    @classmethod
+    def preset(cls, name, **overrides):
+        """
+        Returns the controls of a preset ('coarse', 'medium' or 'fine'), with any settings overridden.
+        """
+        if name not in PRESETS:
+            raise ValueError(f"Unknown mesh preset: {name} (expected one of {', '.join(PRESETS)})")
+        return cls(**{**PRESETS[name], **overrides})
+
+# medium is the mesh FLITE2DPY has always generated; the element budgets leave room for the largest
+# airfoils in data_geometry
+PRESETS = {
+    'coarse': {'alpha': 0.4, 'max_elements': 20000, 'final_sweeps': 3},
+    'medium': {'alpha': 0.8, 'max_elements': 30000},
+    'fine': {'alpha': 1.0, 'max_elements': 40000},
+}
+
+def resolve_controls(controls):
+    """
+    Returns MeshControls for None (the defaults), a preset name, a dict of settings or MeshControls.
+    """
+    if controls is None:
+        return MeshControls()
+    if isinstance(controls, MeshControls):
+        return controls
+    if isinstance(controls, str):
+        return MeshControls.preset(controls)
+    if isinstance(controls, dict):
+        settings = dict(controls)
+        preset = settings.pop('preset', None)
+        return MeshControls.preset(preset, **settings) if preset is not None else MeshControls(**settings)
+    raise TypeError(f'Cannot make mesh controls from {type(controls).__name__}')
+
+def density_integral(spacing, outer_boundary, inner_boundaries, cells_per_spacing=0.5, max_depth=14):
+    """
+    Integral of 1 / h^2 over the domain, where h is the target spacing.
+
+    The bounding square of the outer boundary is split as a quadtree until each cell is smaller than
+    h / cells_per_spacing at its centre (or max_depth is reached). Cells whose centres are in the domain
+    contribute their area / h^2.
+
+    Parameters:
+    spacing (SpacingField): Target spacing field.
+    outer_boundary (np.ndarray): Coordinates of the outer boundary polygon.
+    inner_boundaries (list): Coordinates of each inner boundary polygon.
+    cells_per_spacing (float): Cell size relative to the local spacing.
+    max_depth (int): Maximum number of subdivisions.
+
+    Returns:
+    float: The integral, roughly the number of points a mesh of spacing h needs.
+    """
+    from mesh_gen import in_out_mask
+
+    lo = outer_boundary.min(axis=0)
+    size = (outer_boundary.max(axis=0) - lo).max()
+    centres = np.array([lo + size / 2])
+    sizes = np.array([size])
+    offsets = np.array([[-1, -1], [1, -1], [-1, 1], [1, 1]]) / 2
+
+    total = 0.0
+    for depth in range(max_depth + 1):
+        h = spacing(centres)
+        h = np.where(np.isnan(h), np.inf, h)
+        split = (sizes > h / cells_per_spacing) & (depth < max_depth)
+        done = ~split
+        inside = in_out_mask(centres[done], outer_boundary, inner_boundaries)
+        total += (sizes[done][inside]**2 / h[done][inside]**2).sum()
+        if not split.any():
+            break
+        sizes = np.repeat(sizes[split] / 2, 4)
+        centres = (centres[split][:, None, :] + offsets[None] * sizes.reshape(-1, 4)[:, :, None]).reshape(-1, 2)
+
+    return float(total)
+
+def predict_elements(alpha, integral):
+    """
+    Returns:
+    int: Predicted element count of a converged mesh for alpha and density_integral.
+    """
+    return int(round(DENSITY_SCALE * (1 + alpha)**DENSITY_POWER * integral))
+
+def alpha_for_target(target_elements, integral):
+    """
+    Returns:
+    float: alpha whose predicted element count is target_elements, clamped to ALPHA_RANGE.
+    """
+    alpha = (target_elements / (DENSITY_SCALE * integral))**(1 / DENSITY_POWER) - 1
+    clamped = float(np.clip(alpha, *ALPHA_RANGE))
+    if clamped != alpha:
+        print(f"Warning: target of {target_elements} elements needs alpha {alpha:.3f}, outside {ALPHA_RANGE}; "
+              f"alpha {clamped:.3f} gives about {predict_elements(clamped, integral)} elements instead.")
+    return clamped
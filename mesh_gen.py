@@ -1,18 +1,31 @@
+import time
 import numpy as np
 from scipy.spatial import Delaunay, cKDTree
 from scipy.interpolate import LinearNDInterpolator
-import matplotlib.pyplot as plt
-from shapely.geometry import Point, Polygon
-from multiprocessing import Pool
-from shapely.strtree import STRtree
+import shapely
+from shapely.geometry import Polygon
 
 from make_input import make_input
-from getspace import getspace
-from conelem import conelem
+from getspace import SpacingField
+from conelem import conelem, orient_connectivity, build_adjacency, mesh_quality
 from laplacian_smooth import laplacian_smooth
+from refine_executor import RefinementExecutor
+from incremental_mesh import insert_centroids, relegalize
+from mesh_controls import resolve_controls, density_integral, predict_elements, alpha_for_target
+from renumber import renumber_mesh
+from profiling import span, count
 
-def plot_mesh(mesh_xy, mesh_connec, airfoil_points, outer_points):
-    plt.figure(figsize=(10, 8))
+# Bump whenever a change to the generator can change the meshes it produces (used by mesh_cache)
+MESH_GEN_VERSION = '3'
+
+# Smallest angle (degrees) a mesh cut short by the element budget may have before mesh_gen falls back to
+# the last complete pass; the converged default meshes stay above it
+MIN_BUDGET_ANGLE = 1.0
+
+def plot_mesh(mesh_xy, mesh_connec, airfoil_points, outer_points, show=True):
+    import matplotlib.pyplot as plt
+
+    fig = plt.figure(figsize=(10, 8))
     plt.triplot(mesh_xy[:, 0], mesh_xy[:, 1], mesh_connec, linestyle='-', color='gray', alpha=0.6)
     plt.plot(airfoil_points[:, 0], airfoil_points[:, 1], 'ro', markersize=5, label='Airfoil Points')
     plt.plot(outer_points[:, 0], outer_points[:, 1], 'bo', markersize=5, label='Outer Points')
@@ -24,10 +37,14 @@ def plot_mesh(mesh_xy, mesh_connec, airfoil_points, outer_points):
     plt.legend()
     plt.title('Mesh Visualization')
     plt.gca().set_aspect('equal', adjustable='box')
-    plt.show()
+    if show:
+        plt.show()
+    return fig
 
-def plot_mesh_full(mesh_xy, mesh_connec, airfoil_points, outer_points):
-    plt.figure(figsize=(10, 8))
+def plot_mesh_full(mesh_xy, mesh_connec, airfoil_points, outer_points, show=True):
+    import matplotlib.pyplot as plt
+
+    fig = plt.figure(figsize=(10, 8))
     plt.triplot(mesh_xy[:, 0], mesh_xy[:, 1], mesh_connec, linestyle='-', color='gray', alpha=0.6)
     plt.plot(airfoil_points[:, 0], airfoil_points[:, 1], 'ro', markersize=5, label='Airfoil Points')
     plt.plot(outer_points[:, 0], outer_points[:, 1], 'bo', markersize=5, label='Outer Points')
@@ -37,151 +54,344 @@ def plot_mesh_full(mesh_xy, mesh_connec, airfoil_points, outer_points):
     plt.legend()
     plt.title('Mesh Visualization')
     plt.gca().set_aspect('equal', adjustable='box')
-    plt.show()
+    if show:
+        plt.show()
+    return fig
 
-def in_out_status(tri, points, outer_boundary, inner_boundary):
+def boundary_loops(bound_data):
     """
-    Determines which simplices in `tri` are inside the `outer_boundary` and outside the `inner_boundary`.
+    Splits the boundary edges into closed loops.
 
     Parameters:
-    tri (Delaunay): Delaunay triangulation object.
-    points (np.ndarray): Coordinates of the points.
-    outer_boundary (np.ndarray): Coordinates of the outer boundary polygon.
-    inner_boundary (np.ndarray): Coordinates of the inner boundary polygon.
+    bound_data (np.ndarray): Boundary edges (1-based node indices and a boundary flag per row).
 
     Returns:
-    list: Boolean list indicating which simplices are inside the outer boundary and outside the inner boundary.
+    list: 0-based node indices of every loop, in the order the loops first appear in bound_data.
     """
-    # Create polygons
-    outer_polygon = Polygon(outer_boundary)
-    inner_polygon = Polygon(inner_boundary)
-
-    # Create R-trees for faster spatial querying
-    outer_tree = STRtree([outer_polygon])
-    inner_tree = STRtree([inner_polygon])
+    nxt = dict(zip(bound_data[:, 0] - 1, bound_data[:, 1] - 1))
+    loops = []
+    seen = set()
+    for start in bound_data[:, 0] - 1:
+        if start in seen:
+            continue
+        loop = [start]
+        seen.add(start)
+        node = nxt[start]
+        while node != start:
+            loop.append(node)
+            seen.add(node)
+            node = nxt[node]
+        loops.append(np.array(loop))
+    return loops
+
+def split_boundary(xy, bound_data):
+    """
+    Returns the outer boundary polygon and the list of inner boundary polygons described by bound_data.
 
-    # Prepare results list
-    in_status = []
+    Parameters:
+    xy (np.ndarray): Coordinates of the boundary points.
+    bound_data (np.ndarray): Boundary edges (1-based node indices).
 
-    for simplex in tri.simplices:
-        # Compute the centroid of the simplex
-        center = np.mean(points[simplex], axis=0)
-        point = Point(center)
+    Returns:
+    tuple: (outer_boundary, inner_boundaries) as coordinate arrays. The outer boundary is the loop
+        enclosing the largest area.
+    """
+    loops = boundary_loops(bound_data)
+    areas = [abs(np.dot(xy[l, 0], np.roll(xy[l, 1], -1)) - np.dot(xy[l, 1], np.roll(xy[l, 0], -1))) for l in loops]
+    iouter = int(np.argmax(areas))
+    return xy[loops[iouter]], [xy[l] for i, l in enumerate(loops) if i != iouter]
 
-        # Check if the point is within the outer polygon and not within the inner polygon
-        is_in_outer = outer_tree.query(point, predicate='intersects')
-        is_in_inner = inner_tree.query(point, predicate='intersects')
+def in_out_mask(points, outer_boundary, inner_boundaries):
+    """
+    Classifies points as inside the domain: inside the outer boundary and outside every inner boundary.
 
-        # Append result
-        in_status.append(len(is_in_outer) > 0 and len(is_in_inner) == 0)
+    Points lying on a boundary count as inside that polygon, as with the STRtree 'intersects' query of
+    in_out_status_loop (benchmarks/reference.py).
 
-    return in_status
+    Parameters:
+    points (np.ndarray): Array of shape (n, 2) with the points to classify.
+    outer_boundary (np.ndarray): Coordinates of the outer boundary polygon.
+    inner_boundaries (list): Coordinates of each inner boundary polygon. A single array is also accepted.
 
-def adjust_indices(connec):
-    return connec + 1
+    Returns:
+    np.ndarray: Boolean mask of the points inside the domain.
+    """
+    if isinstance(inner_boundaries, np.ndarray) and inner_boundaries.ndim == 2:
+        inner_boundaries = [inner_boundaries]
 
-def compute_distances(xx, xy, tree):
-    distances, _ = tree.query(xx, k=3)
-    return distances.min(axis=1)
+    x = points[:, 0]
+    y = points[:, 1]
 
-def process_mesh_iteration(mesh_data):
-    mesh_xy, mesh_connec, psource, alpha, spacing_interpolator, tree = mesh_data
-    ip = len(mesh_xy)
-    oldnp = ip
-    flag1 = False
+    outer_polygon = Polygon(outer_boundary)
+    shapely.prepare(outer_polygon)
+    mask = shapely.intersects_xy(outer_polygon, x, y)
 
-    new_points = []
+    for inner_boundary in inner_boundaries:
+        inner_polygon = Polygon(inner_boundary)
+        shapely.prepare(inner_polygon)
+        idx = np.flatnonzero(mask)
+        mask[idx] = ~shapely.intersects_xy(inner_polygon, x[idx], y[idx])
 
-    for ie in range(len(mesh_connec)):
-        x1, y1 = mesh_xy[mesh_connec[ie, 0]]
-        x2, y2 = mesh_xy[mesh_connec[ie, 1]]
-        x3, y3 = mesh_xy[mesh_connec[ie, 2]]
-        xx = np.array([(x1 + x2 + x3) / 3, (y1 + y2 + y3) / 3])
+    return mask
 
-        distances = compute_distances([xx], mesh_xy, tree)
-        si = distances.min()
+def in_out_status(tri, points, outer_boundary, inner_boundary):
+    """
+    Determines which simplices in `tri` are inside the `outer_boundary` and outside the `inner_boundary`.
 
-        if ip - oldnp > 0:
-            new_points = mesh_xy[oldnp:]
-            distances = np.linalg.norm(xx - new_points, axis=1)
-            si = min(si, distances.min())
+    Parameters:
+    tri (Delaunay): Delaunay triangulation object.
+    points (np.ndarray): Coordinates of the points.
+    outer_boundary (np.ndarray): Coordinates of the outer boundary polygon.
+    inner_boundary (np.ndarray or list): Coordinates of the inner boundary polygon, or a list of them.
 
-        is_spacing = spacing_interpolator(xx[0], xx[1]) if psource is None else min(spacing_interpolator(xx[0], xx[1]), getspace(psource, xx))
-        ds = si - is_spacing
+    Returns:
+    np.ndarray: Boolean mask indicating which simplices are inside the outer boundary and outside the inner boundary.
+    """
+    corners = points[tri.simplices]
+    centers = np.column_stack([
+        (corners[:, 0, 0] + corners[:, 1, 0] + corners[:, 2, 0]) / 3,
+        (corners[:, 0, 1] + corners[:, 1, 1] + corners[:, 2, 1]) / 3,
+    ])
+    return in_out_mask(centers, outer_boundary, inner_boundary)
+
+def triangulate(xy, outerprofile, innerprofiles):
+    with span('delaunay'):
+        dt = Delaunay(xy)
+    with span('in_out_status'):
+        inside = in_out_status(dt, xy, outerprofile, innerprofiles)
+    return dt.simplices[inside]
+
+def finalize_mesh(mesh, bound_data, outerprofile, innerprofiles, controls, neighbours=None, guard=False,
+                  retriangulate=False):
+    """
+    Triangulates the final points (or relegalizes the incremental triangulation when neighbours are
+    given), builds the element data and applies the final smoothing sweeps.
 
-        if ds >= -alpha * si:
-            new_points.append(xx)
-            flag1 = True
+    Parameters:
+    guard (bool): Guard the final smoothing sweeps against inverted elements.
+    retriangulate (bool): Triangulate the smoothed points again, as after each pass, so that elements
+        flattened by the smoothing are flipped away.
 
-    if flag1:
-        mesh_xy = np.vstack([mesh_xy] + new_points)
-        tree = cKDTree(mesh_xy)
+    Returns:
+    dict: The finished mesh with 0-based connectivity.
+    """
+    mesh = {'xy': mesh['xy'], 'connec': mesh['connec'].copy()}
+    if neighbours is not None:
+        with span('relegalize'):
+            relegalize(mesh['xy'], mesh['connec'], neighbours.copy())
+    else:
+        mesh['connec'] = triangulate(mesh['xy'], outerprofile, innerprofiles)
+    with span('conelem'):
+        mesh = conelem(mesh)
+    with span('smooth'):
+        mesh = laplacian_smooth(mesh, bound_data, controls.final_sweeps, controls.final_relaxation, guard=guard)
+    if retriangulate:
+        mesh = {'xy': mesh['xy'], 'connec': triangulate(mesh['xy'], outerprofile, innerprofiles)}
+        with span('conelem'):
+            mesh = conelem(mesh)
+    return mesh
 
-    return mesh_xy, tree, flag1
+def size_target(spacing, outer_boundary, inner_boundaries, alpha, controls):
+    """
+    Returns:
+    tuple: alpha the mesh is refined with (alpha of the controls, or the one for their target_elements)
+        and the predicted element count.
+    """
+    integral = density_integral(spacing, outer_boundary, inner_boundaries)
+    if controls.target_elements is not None:
+        alpha = alpha_for_target(controls.target_elements, integral)
+    elif controls.alpha is not None:
+        alpha = controls.alpha
+    return alpha, predict_elements(alpha, integral)
+
+def predict_mesh_size(xy, bound_data, alpha, psource, controls=None):
+    """
+    Predicts the element count mesh_gen reaches with the same arguments, without refining.
 
-def mesh_gen(xy, bound_data, alpha, psource):
+    Returns:
+    int: Predicted element count.
+    """
+    controls = resolve_controls(controls)
     input_data = make_input(xy, bound_data)
-    no_bound = len(bound_data)
-    outerprofile = input_data[174:no_bound, :2]
-    innerprofile = input_data[0:174, :2]
-    profile = input_data[0:no_bound, :2]
-
-    mesh = {'xy': input_data[:no_bound, :2]}
-    dt = Delaunay(profile)
-    inside = in_out_status(dt, profile, outerprofile, innerprofile)
-    mesh['connec'] = dt.simplices[inside]
+    outerprofile, innerprofiles = split_boundary(input_data[:len(bound_data), :2], bound_data)
+    spacing = SpacingField(LinearNDInterpolator(input_data[:, :2], input_data[:, 2]), psource)
+    return size_target(spacing, outerprofile, innerprofiles, alpha, controls)[1]
 
-    spacing_interpolator = LinearNDInterpolator(input_data[:, :2], input_data[:, 2])
-    max_elements = 30000
-    flag = True
-
-    tree = cKDTree(mesh['xy'])
+def adjust_indices(connec):
+    return connec + 1
 
-    # Convergence parameters
-    convergence_threshold = 0.02  # 2% change threshold
-    previous_num_elements = len(mesh['connec'])
+def mesh_gen(xy, bound_data, alpha, psource, min_separation=False, workers=1, triangulation='full', plot=True,
+             controls=None):
+    """
+    Generates a triangular mesh of the domain described by bound_data.
 
-    while flag:
-        mesh_data = (mesh['xy'], mesh['connec'], psource, alpha, spacing_interpolator, tree)
-        with Pool() as pool:
-            mesh['xy'], tree, flag1 = pool.apply(process_mesh_iteration, (mesh_data,))
+    Points are inserted at element centroids pass by pass until the element count changes by less than
+    the convergence threshold, the element budget is used up or the time budget runs out.
 
-        dt = Delaunay(mesh['xy'])
-        inside = in_out_status(dt, mesh['xy'], outerprofile, innerprofile)
-        mesh['connec'] = dt.simplices[inside]
+    Parameters:
+    xy (np.ndarray): Coordinates of the boundary points (airfoil and outer boundary).
+    bound_data (np.ndarray): Boundary edges (1-based node indices and a boundary flag per row).
+    alpha (float): Insertion factor; larger values give finer meshes.
+    psource (np.ndarray): Point sources of the spacing field.
+    min_separation (bool): Reject candidates too close to an earlier accepted candidate.
+    workers (int): Processes evaluating refinement candidates (see RefinementExecutor).
+    triangulation (str): 'full' (Delaunay of all points after each pass) or 'incremental'.
+    plot (bool): Plot the final mesh.
+    controls (MeshControls, str or dict): Element and time budgets, target size, convergence, smoothing
+        and renumbering settings, or a preset name ('coarse', 'medium', 'fine'); see mesh_controls.py.
+        None keeps the defaults (the 'medium' settings with the alpha given).
 
-        if len(mesh['connec']) > max_elements:
-            print("Max elements reached. Exiting loop.")
-            break
+    Returns:
+    dict: Mesh with xy (coordinates) and connec (1-based connectivity).
+    """
+    controls = resolve_controls(controls)
+    start = time.perf_counter()
 
-        mesh = conelem(mesh)
-        mesh = laplacian_smooth(mesh, bound_data, 1, 1.0)
+    with span('make_input'):
+        input_data = make_input(xy, bound_data)
+    no_bound = len(bound_data)
+    outerprofile, innerprofiles = split_boundary(input_data[:no_bound, :2], bound_data)
+    innerprofile = np.vstack(innerprofiles)
+    profile = input_data[0:no_bound, :2]
 
-        dt = Delaunay(mesh['xy'])
-        inside = in_out_status(dt, mesh['xy'], outerprofile, innerprofile)
+    mesh = {'xy': input_data[:no_bound, :2]}
+    with span('initial_triangulation'):
+        dt = Delaunay(profile)
+        inside = in_out_status(dt, profile, outerprofile, innerprofiles)
         mesh['connec'] = dt.simplices[inside]
-        mesh = conelem(mesh)
 
-        current_num_elements = len(mesh['connec'])
-        change_ratio = abs(current_num_elements - previous_num_elements) / previous_num_elements
+    max_elements = controls.max_elements
+    flag = True
 
-        if change_ratio < convergence_threshold:
-            print(f"Change ratio {change_ratio:.4f} below threshold. Exiting loop.")
-            break
+    tree = cKDTree(mesh['xy'])
 
-        previous_num_elements = current_num_elements
+    # Convergence parameters
+    convergence_threshold = controls.convergence_threshold  # 2% change threshold by default
+    previous_num_elements = len(mesh['connec'])
 
-        print("Number of elements:", len(mesh['connec']))
+    spacing = SpacingField(LinearNDInterpolator(input_data[:, :2], input_data[:, 2]), psource)
+
+    # The final size follows from the spacing field and alpha, so it is known before refining
+    with span('predict'):
+        alpha, predicted = size_target(spacing, outerprofile, innerprofiles, alpha, controls)
+        count(predicted=predicted)
+    print(f"Predicted number of elements: {predicted} (alpha {alpha:.3f})")
+    if predicted > max_elements:
+        print(f"Predicted size exceeds the budget of {max_elements} elements; refinement will stop at the budget.")
+
+    # Incremental mode splits refined elements and restores the Delaunay property with local edge
+    # flips, instead of triangulating and classifying the whole point set again
+    incremental = triangulation == 'incremental'
+    if incremental:
+        mesh['connec'] = orient_connectivity(mesh['connec'], mesh['xy'])
+        neighbours = build_adjacency(mesh['connec'], len(mesh['xy']))['neighbours']
+    elif triangulation != 'full':
+        raise ValueError(f"Unknown triangulation mode: {triangulation}")
+
+    # Points of the last pass that ran to completion, to fall back on when the budget cuts a pass short
+    budget_cut = False
+    complete = {'xy': mesh['xy'], 'connec': mesh['connec'].copy(),
+                'neighbours': neighbours.copy() if incremental else None}
+
+    with RefinementExecutor(spacing, alpha, workers=workers, min_separation=min_separation) as executor:
+        passes = 0
+        pass_time = 0.0
+        while flag:
+            if controls.time_budget is not None and time.perf_counter() - start + pass_time > controls.time_budget:
+                print("Time budget reached. Exiting loop.")
+                break
+
+            passes += 1
+            pass_start = time.perf_counter()
+            with span('pass'):
+                oldnp = len(mesh['xy'])
+                # Each point inserted inside the domain adds two elements
+                limit = max((max_elements - len(mesh['connec'])) // 2, 0)
+                with span('refine'):
+                    mesh['xy'], tree, flag1 = executor.refine(mesh['xy'], mesh['connec'], tree, limit)
+                count(inserted=len(mesh['xy']) - oldnp)
+                at_budget = len(executor.accepted_elements) == limit
+
+                if incremental:
+                    with span('insert_centroids'):
+                        mesh['connec'], neighbours = insert_centroids(mesh['xy'], mesh['connec'], neighbours,
+                                                                      executor.accepted_elements, oldnp)
+                else:
+                    with span('delaunay'):
+                        dt = Delaunay(mesh['xy'])
+                    with span('in_out_status'):
+                        inside = in_out_status(dt, mesh['xy'], outerprofile, innerprofiles)
+                    mesh['connec'] = dt.simplices[inside]
+
+                if incremental:
+                    with span('smooth'):
+                        mesh = laplacian_smooth(mesh, bound_data, controls.pass_sweeps, 1.0, guard=True)
+                    with span('relegalize'):
+                        neighbours = relegalize(mesh['xy'], mesh['connec'], neighbours)
+                else:
+                    with span('smooth'):
+                        mesh = laplacian_smooth(mesh, bound_data, controls.pass_sweeps, 1.0)
+
+                    with span('delaunay'):
+                        dt = Delaunay(mesh['xy'])
+                    with span('in_out_status'):
+                        inside = in_out_status(dt, mesh['xy'], outerprofile, innerprofiles)
+                    mesh['connec'] = dt.simplices[inside]
+                    mesh['connec'] = orient_connectivity(mesh['connec'], mesh['xy'])
+
+                current_num_elements = len(mesh['connec'])
+                count(points=len(mesh['xy']), elements=current_num_elements)
+                pass_time = time.perf_counter() - pass_start
+
+                if at_budget:
+                    print("Max elements reached. Exiting loop.")
+                    budget_cut = True
+                    break
+
+                change_ratio = abs(current_num_elements - previous_num_elements) / previous_num_elements
+
+                if change_ratio < convergence_threshold:
+                    print(f"Change ratio {change_ratio:.4f} below threshold. Exiting loop.")
+                    break
+
+                previous_num_elements = current_num_elements
+                complete = {'xy': mesh['xy'], 'connec': mesh['connec'].copy(),
+                            'neighbours': neighbours.copy() if incremental else None}
+
+                print("Number of elements:", len(mesh['connec']))
 
     print('Outside of loop now')
-    dt = Delaunay(mesh['xy'])
-    inside = in_out_status(dt, mesh['xy'], outerprofile, innerprofile)
-    mesh['connec'] = dt.simplices[inside]
-    mesh = conelem(mesh)
-    mesh = laplacian_smooth(mesh, bound_data, 5, 0.75)
-
-    plot_mesh(mesh['xy'], mesh['connec'], innerprofile, outerprofile)
-    plot_mesh_full(mesh['xy'], mesh['connec'], innerprofile, outerprofile)
+    with span('finalize'):
+        # The points of a pass cut short by the budget fill the largest gaps only and the final smoothing
+        # moves them far, so it is guarded, followed by a triangulation, and the mesh is checked before
+        # it is kept
+        mesh = finalize_mesh(mesh, bound_data, outerprofile, innerprofiles, controls,
+                             neighbours if incremental else None, guard=incremental or budget_cut,
+                             retriangulate=budget_cut)
+        if budget_cut:
+            quality = mesh_quality(mesh['connec'], mesh['xy'])
+            if quality['inverted'] or quality['min_angle'] < MIN_BUDGET_ANGLE:
+                print(f"Mesh at the budget has {quality['inverted']} inverted elements and a min angle of "
+                      f"{quality['min_angle']:.2f}; trying the last complete pass ({len(complete['connec'])} "
+                      f"elements).")
+                fallback = finalize_mesh(complete, bound_data, outerprofile, innerprofiles, controls,
+                                         complete['neighbours'], guard=True, retriangulate=True)
+                fallback_quality = mesh_quality(fallback['connec'], fallback['xy'])
+                if (fallback_quality['inverted'], -fallback_quality['min_angle']) < (quality['inverted'],
+                                                                                     -quality['min_angle']):
+                    mesh, quality = fallback, fallback_quality
+                if quality['inverted'] or quality['min_angle'] < MIN_BUDGET_ANGLE:
+                    print(f"Warning: the budget of {max_elements} elements is too small for the boundary "
+                          f"spacing; the mesh kept ({len(mesh['connec'])} elements) has a min angle of "
+                          f"{quality['min_angle']:.2f}.")
+        if controls.renumber is not None:
+            with span('renumber'):
+                mesh = renumber_mesh(mesh, bound_data, controls.renumber)
+        count(points=len(mesh['xy']), elements=len(mesh['connec']), passes=passes)
+
+    if plot:
+        plot_mesh(mesh['xy'], mesh['connec'], innerprofile, outerprofile)
+        plot_mesh_full(mesh['xy'], mesh['connec'], innerprofile, outerprofile)
 
     mesh['connec'] = adjust_indices(mesh['connec'])
     return mesh
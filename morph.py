@@ -0,0 +1,220 @@
+"""
+Meshes an airfoil by morphing the mesh of a similar airfoil already solved in raw_data.
+
+Sections of one family share the same parameterisation and far field, so their meshes have the same
+boundary nodes and differ only in where the airfoil points lie. The donor is the solved airfoil whose
+section is closest to the new one (largest point-to-point distance, both read from data_geometry). Its
+boundary nodes are moved onto the new section and the displacement is spread through the interior:
+
+- 'laplacian' solves a graph Laplace equation for the displacement of the free nodes, with the boundary
+  displacement as Dirichlet condition. Each node moves with the average of its neighbours, which keeps
+  the elements near the airfoil in shape.
+- 'rbf' interpolates the boundary displacement with thin-plate-spline radial basis functions. It is
+  faster, but distorts the small elements at the airfoil more for larger changes in shape.
+
+A donor is only tried when its element count fits the mesh controls: within max_elements and within
+SIZE_TOLERANCE of the element count mesh_gen would reach for the new section (its preset, alpha or
+target_elements). The connectivity of the donor is kept, renumbered when the controls ask for it. The morphed mesh is accepted when no element is inverted and its
+smallest angle and mean smallest angle stay within MIN_ANGLE_RATIO and MEAN_ANGLE_RATIO of the donor's.
+Otherwise the next closest donor is tried, and morph_mesh returns None when none is accepted, so that the
+caller can fall back to mesh_gen.
+"""
+import os
+import numpy as np
+from scipy.interpolate import RBFInterpolator
+from scipy.sparse import csr_matrix, diags
+from scipy.sparse.linalg import spsolve
+
+from conelem import build_adjacency, mesh_quality
+from flite_io import read_mesh_dat, read_mesh_size
+from geometry import load_geometries
+from renumber import renumber_mesh
+
+METHODS = ('laplacian', 'rbf')
+
+# Quality of the morphed mesh relative to the donor below which it is rejected
+MIN_ANGLE_RATIO = 0.75
+MEAN_ANGLE_RATIO = 0.9
+
+# Donors whose sections differ by more than this (in chord units) are not tried
+MAX_DISTANCE = 0.1
+MAX_DONORS = 3
+
+# Relative difference from the expected element count above which a donor mesh is not tried
+SIZE_TOLERANCE = 0.1
+
+# Tolerance when matching the far field of a donor mesh.dat (coordinates are written with 6 decimals)
+COORDINATE_TOLERANCE = 1e-5
+
+def find_donors(airfoil, coordinates, raw_root=os.path.join('.', 'raw_data'),
+                coordinates_path=os.path.join('.', 'data_geometry'), max_distance=MAX_DISTANCE, max_elements=None,
+                expected_elements=None, size_tolerance=SIZE_TOLERANCE):
+    """
+    Lists the airfoils in raw_data with a mesh.dat whose sections match the new one point for point.
+
+    Parameters:
+    max_elements (int): Donor meshes with more elements are skipped; None accepts any size.
+    expected_elements (int): Element count the new mesh should have; donor meshes differing from it by
+        more than size_tolerance (relative) are skipped. None accepts any size.
+
+    Returns:
+    list: (distance, airfoil, mesh.dat path), closest first. distance is the largest distance between
+        corresponding section points.
+    """
+    if not os.path.isdir(raw_root):
+        return []
+    geometries = load_geometries(coordinates_path)
+    donors = []
+    for name in sorted(os.listdir(raw_root)):
+        if name == str(int(airfoil)) or name not in geometries:
+            continue
+        section = geometries.coordinates(name)
+        if section.shape != coordinates.shape:
+            continue
+        distance = float(np.sqrt(((section - coordinates)**2).sum(axis=1)).max())
+        if distance > max_distance:
+            continue
+        mesh_path = _mesh_file(os.path.join(raw_root, name))
+        if mesh_path is None:
+            continue
+        elements = read_mesh_size(mesh_path)[0]
+        if max_elements is not None and elements > max_elements:
+            print(f'Mesh of airfoil {name} has {elements} elements, above the budget of {max_elements}; '
+                  'not used for morphing')
+            continue
+        if expected_elements is not None and abs(elements - expected_elements) > size_tolerance * expected_elements:
+            print(f'Mesh of airfoil {name} has {elements} elements, {expected_elements} expected; '
+                  'not used for morphing')
+            continue
+        donors.append((distance, name, mesh_path))
+    return sorted(donors)
+
+def _mesh_file(airfoil_dir):
+    # mesh.dat of any case of the airfoil; every flight condition shares the same mesh
+    for mach in sorted(os.listdir(airfoil_dir)):
+        mach_dir = os.path.join(airfoil_dir, mach)
+        if not os.path.isdir(mach_dir):
+            continue
+        for aoa in sorted(os.listdir(mach_dir)):
+            path = os.path.join(mach_dir, aoa, 'mesh.dat')
+            if os.path.exists(path):
+                return path
+    return None
+
+def laplacian_displacement(xy, connec, boundary_displacement):
+    """
+    Spreads the displacement of the first len(boundary_displacement) nodes through the mesh by solving
+    L d = 0 on the free nodes, where L is the graph Laplacian of the connectivity (0-based).
+
+    Returns:
+    np.ndarray: Displacement of every node.
+    """
+    NoPoints = len(xy)
+    nb = len(boundary_displacement)
+    adjacency = build_adjacency(connec, NoPoints)
+    graph = csr_matrix((np.ones(len(adjacency['node_adj'])), adjacency['node_adj'], adjacency['node_ptr']),
+                       shape=(NoPoints, NoPoints))
+    laplacian = (diags(np.diff(adjacency['node_ptr']).astype(float)) - graph).tocsr()
+
+    free = spsolve(laplacian[nb:, nb:].tocsc(), -(laplacian[nb:, :nb] @ boundary_displacement))
+    return np.vstack([boundary_displacement, free.reshape(-1, 2)])
+
+def rbf_displacement(xy, boundary_displacement):
+    """
+    Interpolates the displacement of the first len(boundary_displacement) nodes with thin-plate splines.
+
+    Returns:
+    np.ndarray: Displacement of every node.
+    """
+    nb = len(boundary_displacement)
+    rbf = RBFInterpolator(xy[:nb], boundary_displacement, kernel='thin_plate_spline')
+    return np.vstack([boundary_displacement, rbf(xy[nb:])])
+
+def morph_donor(donor_xy, connec, xy, method='laplacian'):
+    """
+    Moves the boundary nodes of a donor mesh onto new boundary coordinates.
+
+    Parameters:
+    donor_xy (np.ndarray): Node coordinates of the donor mesh; its first len(xy) nodes are the boundary.
+    connec (np.ndarray): 0-based connectivity of the donor mesh.
+    xy (np.ndarray): New boundary coordinates (airfoil and far field).
+    method (str): 'laplacian' or 'rbf'.
+
+    Returns:
+    np.ndarray: Morphed node coordinates.
+    """
+    boundary_displacement = xy - donor_xy[:len(xy)]
+    if method == 'laplacian':
+        displacement = laplacian_displacement(donor_xy, connec, boundary_displacement)
+    elif method == 'rbf':
+        displacement = rbf_displacement(donor_xy, boundary_displacement)
+    else:
+        raise ValueError(f"Unknown morphing method: {method} (expected one of {', '.join(METHODS)})")
+    morphed = donor_xy + displacement
+    morphed[:len(xy)] = xy
+    return morphed
+
+def accept_quality(quality, donor_quality, min_angle_ratio=MIN_ANGLE_RATIO, mean_angle_ratio=MEAN_ANGLE_RATIO):
+    """
+    Returns:
+    str: Why the morphed mesh is rejected, or None when it is accepted.
+    """
+    if quality['inverted']:
+        return f"{quality['inverted']} inverted elements"
+    if quality['min_angle'] < min_angle_ratio * donor_quality['min_angle']:
+        return f"min angle {quality['min_angle']:.2f} (donor {donor_quality['min_angle']:.2f})"
+    if quality['mean_min_angle'] < mean_angle_ratio * donor_quality['mean_min_angle']:
+        return f"mean min angle {quality['mean_min_angle']:.2f} (donor {donor_quality['mean_min_angle']:.2f})"
+    return None
+
+def morph_mesh(airfoil, coordinates, xy, bound_data, method='laplacian', raw_root=os.path.join('.', 'raw_data'),
+               coordinates_path=os.path.join('.', 'data_geometry'), max_donors=MAX_DONORS, max_elements=None,
+               expected_elements=None, renumber=None, **thresholds):
+    """
+    Morphs the mesh of the closest solved airfoil onto a new one.
+
+    Parameters:
+    airfoil: Number of the new airfoil (its own results are never used as donor).
+    coordinates (np.ndarray): Section of the new airfoil.
+    xy (np.ndarray): Boundary coordinates (section followed by the far field), as for mesh_gen.
+    bound_data (np.ndarray): Boundary edges; a donor must have the same.
+    method (str): 'laplacian' or 'rbf'.
+    raw_root (str): raw_data tree the donors are taken from.
+    coordinates_path (str): Directory of the sections.
+    max_donors (int): Donors tried, closest first.
+    max_elements (int): Element budget; larger donor meshes are not tried.
+    expected_elements (int): Element count the mesh controls give for the new section (see
+        mesh_gen.predict_mesh_size); donor meshes further than SIZE_TOLERANCE from it are not tried.
+    renumber (str): Renumber the accepted mesh, 'rcm' or 'morton' (see renumber.py); None keeps the
+        numbering of the donor.
+    thresholds: min_angle_ratio and mean_angle_ratio for accept_quality.
+
+    Returns:
+    dict: Mesh with xy and 1-based connec, as mesh_gen returns it, and the 'donor' airfoil and the
+        'quality' of the morphed mesh (see mesh_quality); None when no donor gives an acceptable mesh.
+    """
+    donors = find_donors(airfoil, coordinates, raw_root, coordinates_path, max_elements=max_elements,
+                         expected_elements=expected_elements)
+    for distance, donor, mesh_path in donors[:max_donors]:
+        donor_xy, donor_connec, boundaries = read_mesh_dat(mesh_path)
+        if (not np.array_equal(boundaries.astype(int), bound_data)
+                or not np.allclose(donor_xy[len(coordinates):len(xy)], xy[len(coordinates):],
+                                   atol=COORDINATE_TOLERANCE)):
+            print(f'Mesh of airfoil {donor} has different boundaries; not used for morphing')
+            continue
+
+        connec = donor_connec - 1
+        morphed = morph_donor(donor_xy, connec, xy, method)
+        quality = mesh_quality(connec, morphed)
+        reason = accept_quality(quality, mesh_quality(connec, donor_xy), **thresholds)
+        if reason is not None:
+            print(f'Mesh morphed from airfoil {donor} rejected: {reason}')
+            continue
+
+        print(f"Mesh morphed from airfoil {donor} ({method}, section distance {distance:.4f}): "
+              f"{len(connec)} elements, min angle {quality['min_angle']:.2f}")
+        mesh = {'xy': morphed, 'connec': connec}
+        if renumber is not None:
+            mesh = renumber_mesh(mesh, bound_data, renumber)
+        return {'xy': mesh['xy'], 'connec': mesh['connec'] + 1, 'donor': donor, 'quality': quality}
+    return None
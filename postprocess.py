@@ -0,0 +1,184 @@
+"""
+Aerodynamic post-processing of solver results, without plotting.
+
+From solverout.res and the boundary edges of mesh.dat this computes the surface pressure coefficient,
+CL and CD from the integrated surface pressure, the pitching moment about the quarter chord and the
+field Mach number. Everything works on whole arrays, one case at a time.
+
+The solver's variables are scaled by the freestream density and speed, so q_inf = 1/2 and
+p_inf = 1 / (gamma M^2). Pressure is the p column of solverout.res, (gamma - 1) rho (e - |V|^2 / 2).
+Forces are integrated over the airfoil edges with the mean Cp of their end points. Coefficients use the
+chord from the leading edge (smallest x) to the trailing edge (largest x). Cm is positive nose-up.
+
+polar_table processes a whole raw_data/<airfoil>/<mach>/<aoa> tree in a process pool and writes one CSV
+table. Next to the pressure-integrated coefficients it lists CL and CD from the force coefficients on the
+last line of solverout.rsd (cl_rsd, cd_rsd), converted with solver_monitor.forces_to_cl_cd like the
+FLITE2DPY and sweep results, so the two figures can be compared.
+
+Usage:
+python postprocess.py [raw_data] [polar_table.csv] [workers]
+"""
+import os
+import sys
+import csv
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from flite_io import read_res, read_mesh_dat, read_forces
+from geometry import AIRFOIL_FLAG
+from mesh_gen import boundary_loops
+from result_store import list_cases
+from solver_monitor import forces_to_cl_cd
+
+GAMMA = 1.4
+
+POLAR_COLUMNS = ('airfoil', 'mach', 'aoa', 'cl', 'cd', 'cm', 'cl_rsd', 'cd_rsd', 'cp_min', 'mach_max',
+                 'error')
+
+def pressure_coefficient(results, mach, gamma=GAMMA):
+    """
+    Returns:
+    np.ndarray: Cp = (p - p_inf) / q_inf of every node.
+    """
+    return 2.0 * results[:, 5] - 2.0 / (gamma * mach**2)
+
+def mach_number(results, gamma=GAMMA):
+    """
+    Returns:
+    np.ndarray: Local Mach number |V| / sqrt(gamma p / rho) of every node.
+    """
+    p = results[:, 5]
+    speed = np.sqrt(results[:, 2]**2 + results[:, 3]**2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return speed / np.sqrt(gamma * p / results[:, 1])
+
+def surface_nodes(boundaries, flag=AIRFOIL_FLAG):
+    """
+    Returns:
+    np.ndarray: 0-based nodes of the boundary loop with the given flag, in edge order.
+    """
+    return boundary_loops(boundaries[boundaries[:, 2] == flag])[0]
+
+def surface_cp(xy, boundaries, cp):
+    """
+    Returns:
+    dict: Nodes, x, y, Cp and arc length s along the airfoil surface, in boundary order.
+    """
+    nodes = surface_nodes(boundaries)
+    points = xy[nodes]
+    s = np.concatenate([[0.0], np.cumsum(np.sqrt((np.diff(points, axis=0)**2).sum(axis=1)))])
+    return {'node': nodes, 'x': points[:, 0], 'y': points[:, 1], 'cp': cp[nodes], 's': s}
+
+def integrate_forces(xy, boundaries, cp, aoa):
+    """
+    Integrates the surface pressure over the airfoil edges.
+
+    Parameters:
+    xy (np.ndarray): Node coordinates (np, 2).
+    boundaries (np.ndarray): Boundary edges with 1-based nodes and flag (nb, 3).
+    cp (np.ndarray): Pressure coefficient of every node.
+    aoa (float): Angle of attack in degrees.
+
+    Returns:
+    dict: cl, cd, cm (about the quarter chord, nose-up positive) and the force coefficients cx, cy along
+        the x and y axes.
+    """
+    nodes = surface_nodes(boundaries)
+    start, end = nodes, np.roll(nodes, -1)
+    d = xy[end] - xy[start]
+    # (dy, -dx) points away from the body for a counter-clockwise loop
+    normal = np.column_stack([d[:, 1], -d[:, 0]])
+    area = np.dot(xy[start, 0], xy[end, 1]) - np.dot(xy[end, 0], xy[start, 1])
+    if area < 0:
+        normal = -normal
+
+    leading, trailing = xy[nodes[np.argmin(xy[nodes, 0])]], xy[nodes[np.argmax(xy[nodes, 0])]]
+    chord = np.sqrt(((trailing - leading)**2).sum())
+    quarter = leading + 0.25 * (trailing - leading)
+
+    force = -(0.5 * (cp[start] + cp[end]))[:, None] * normal / chord
+    arm = 0.5 * (xy[start] + xy[end]) - quarter
+    cx, cy = force.sum(axis=0)
+    cm = -(arm[:, 0] * force[:, 1] - arm[:, 1] * force[:, 0]).sum() / chord
+
+    alpha = np.radians(aoa)
+    return {'cl': cy * np.cos(alpha) - cx * np.sin(alpha), 'cd': cx * np.cos(alpha) + cy * np.sin(alpha),
+            'cm': cm, 'cx': cx, 'cy': cy}
+
+def analyse_case(case_dir, mach, aoa, gamma=GAMMA):
+    """
+    Post-processes one case folder (mesh.dat, solverout.res and, if present, solverout.rsd).
+
+    Returns:
+    dict: cl, cd, cm, cx, cy, cl_rsd, cd_rsd, cp_min, mach_max, and the arrays cp and mach (per node)
+        and surface (see surface_cp).
+    """
+    xy, _, boundaries = read_mesh_dat(os.path.join(case_dir, 'mesh.dat'))
+    results = read_res(os.path.join(case_dir, 'solverout.res'))
+
+    cp = pressure_coefficient(results, mach, gamma)
+    mach_field = mach_number(results, gamma)
+    analysis = integrate_forces(xy, boundaries, cp, aoa)
+    analysis['surface'] = surface_cp(xy, boundaries, cp)
+    analysis['cp'] = cp
+    analysis['mach'] = mach_field
+    analysis['cp_min'] = float(analysis['surface']['cp'].min())
+    analysis['mach_max'] = float(np.nanmax(mach_field))
+
+    analysis['cl_rsd'] = analysis['cd_rsd'] = float('nan')
+    rsd_path = os.path.join(case_dir, 'solverout.rsd')
+    if os.path.exists(rsd_path):
+        analysis['cl_rsd'], analysis['cd_rsd'] = forces_to_cl_cd(*read_forces(rsd_path), aoa)
+    return analysis
+
+def _polar_row(raw_root, case, gamma):
+    airfoil, mach, aoa = case
+    record = {'airfoil': airfoil, 'mach': float(mach), 'aoa': float(aoa), 'error': None}
+    try:
+        analysis = analyse_case(os.path.join(raw_root, *case), float(mach), float(aoa), gamma)
+        record.update({name: float(analysis[name]) for name in POLAR_COLUMNS[3:-1]})
+    except Exception as exc:
+        record.update({name: float('nan') for name in POLAR_COLUMNS[3:-1]})
+        record['error'] = f'{type(exc).__name__}: {exc}'
+    return record
+
+def polar_table(raw_root=os.path.join('.', 'raw_data'), table_path='polar_table.csv', workers=None, gamma=GAMMA):
+    """
+    Post-processes every case of a raw_data tree that has a solverout.res.
+
+    Parameters:
+    raw_root (str): Root of the raw_data tree.
+    table_path (str): CSV file the table is written to (columns POLAR_COLUMNS), or None.
+    workers (int): Worker processes; None uses os.cpu_count(), 1 runs in the calling process.
+    gamma (float): Ratio of specific heats.
+
+    Returns:
+    list: One dict per case, ordered by airfoil, Mach and AoA.
+    """
+    cases = [case for case in list_cases(raw_root)
+             if os.path.exists(os.path.join(raw_root, *case, 'solverout.res'))]
+    workers = os.cpu_count() if workers is None else max(int(workers), 1)
+
+    if workers == 1 or len(cases) < 2:
+        records = [_polar_row(raw_root, case, gamma) for case in cases]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(len(cases) // (4 * workers), 1)
+            records = list(pool.map(_polar_row, [raw_root] * len(cases), cases, [gamma] * len(cases),
+                                    chunksize=chunksize))
+
+    records.sort(key=lambda r: (int(r['airfoil']), r['mach'], r['aoa']))
+    if table_path is not None:
+        with open(table_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=POLAR_COLUMNS)
+            writer.writeheader()
+            writer.writerows(records)
+    return records
+
+if __name__ == '__main__':
+    raw_root = sys.argv[1] if len(sys.argv) > 1 else os.path.join('.', 'raw_data')
+    table_path = sys.argv[2] if len(sys.argv) > 2 else 'polar_table.csv'
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    records = polar_table(raw_root, table_path, workers)
+    failed = sum(record['error'] is not None for record in records)
+    print(f'{len(records)} cases written to {table_path} ({failed} failed)')
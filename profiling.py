@@ -0,0 +1,342 @@
+"""
+Nested timing spans, counts and peak memory for FLITE2DPY runs.
+
+Instrumented code marks its stages with `with span('name'):` and attaches counts with count(...). Both
+do nothing unless a run is being profiled, i.e. inside `with profile_run(...)` (or FLITE2DPY(...,
+profile='profiles')). Each profiled run writes one JSON record with the span tree: wall and CPU time,
+counts and peak RSS of every span, plus an optional cProfile dump of the whole run.
+
+Peak RSS is per span on Linux, where the kernel's high-water mark can be reset (/proc/self/clear_refs);
+elsewhere it is the process high-water mark at the end of the span (peak_rss_scope 'process').
+
+Summarise a campaign of records with:
+python profiling.py summary profiles [--sort wall|calls|peak] [--top 40]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# The profiler spans and counts are recorded into; None when no run is profiled
+_active = None
+
+def _read_hwm_kb():
+    # Kernel RSS high-water mark of this process in kB, if it can be read
+    try:
+        with open('/proc/self/status', 'rb') as f:
+            for line in f:
+                if line.startswith(b'VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    if resource is not None:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss // 1024 if sys.platform == 'darwin' else maxrss
+    return None
+
+def _reset_hwm():
+    # Resets the high-water mark to the current RSS; returns False where that is not supported
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+class Profiler:
+    """
+    Records a tree of timed spans for one run. Only spans opened by the thread that created the
+    profiler are recorded.
+
+    Parameters:
+    name (str): Name of the run, e.g. 'FLITE2DPY'.
+    memory (bool): Record peak RSS, resetting the process high-water mark where supported. Off for tasks
+        that share the process with others (profile_task), whose resets would clobber each other.
+    **meta: Run description stored in the record (airfoil, mach, aoa, ...).
+    """
+
+    def __init__(self, name, memory=True, **meta):
+        self.thread = threading.get_ident()
+        self.memory = memory
+        self.per_span_peak = memory and _reset_hwm()
+        self.root = {'name': name, 'counts': {}, 'children': [], '_peak': 0}
+        self.meta = meta
+        self.started = datetime.now().isoformat(timespec='seconds')
+        self._stack = [self.root]
+        self._start = time.perf_counter()
+        self._cpu = time.process_time()
+
+    def _checkpoint(self, node):
+        # Folds the kernel high-water mark since the last reset into node and starts a new interval
+        if not self.memory:
+            return
+        hwm = _read_hwm_kb()
+        if hwm is not None:
+            node['_peak'] = max(node['_peak'], hwm)
+        if self.per_span_peak:
+            _reset_hwm()
+
+    @contextmanager
+    def span(self, name, **counts):
+        if threading.get_ident() != self.thread:
+            yield None
+            return
+        parent = self._stack[-1]
+        node = {'name': name, 'counts': dict(counts), 'children': [], '_peak': 0}
+        parent['children'].append(node)
+        self._checkpoint(parent)
+        self._stack.append(node)
+        start, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield node
+        finally:
+            node['wall'] = time.perf_counter() - start
+            node['cpu'] = time.process_time() - cpu
+            self._checkpoint(node)
+            parent['_peak'] = max(parent['_peak'], node['_peak'])
+            self._stack.pop()
+
+    def count(self, **counts):
+        if threading.get_ident() == self.thread:
+            self._stack[-1]['counts'].update(counts)
+
+    def attach(self, record):
+        """
+        Adds the spans of a record made elsewhere, e.g. by profile_run(..., out_dir=None) in a worker
+        process, under the innermost open span.
+        """
+        def restore(node):
+            return {'name': node['name'], 'counts': dict(node.get('counts', {})),
+                    'children': [restore(child) for child in node.get('children', [])],
+                    '_peak': (node.get('peak_rss_mb') or 0) * 1024, 'wall': node.get('wall'), 'cpu': node.get('cpu')}
+
+        if threading.get_ident() == self.thread:
+            parent = self._stack[-1]
+            for node in record.get('spans', []):
+                parent['children'].append(restore(node))
+                if self.memory:
+                    parent['_peak'] = max(parent['_peak'], parent['children'][-1]['_peak'])
+
+    def record(self):
+        """
+        Returns:
+        dict: The JSON-serialisable record of the run so far.
+        """
+        self._checkpoint(self.root)
+
+        def export(node):
+            out = {'name': node['name'], 'wall': node.get('wall'), 'cpu': node.get('cpu'),
+                   'peak_rss_mb': node['_peak'] / 1024 if node['_peak'] else None}
+            if node['counts']:
+                out['counts'] = node['counts']
+            if node['children']:
+                out['children'] = [export(child) for child in node['children']]
+            return out
+
+        root = export(self.root)
+        root['wall'] = time.perf_counter() - self._start
+        root['cpu'] = time.process_time() - self._cpu
+        return {'name': self.root['name'], 'meta': self.meta, 'started': self.started, 'host': socket.gethostname(),
+                'pid': os.getpid(), 'peak_rss_scope': ('span' if self.per_span_peak else 'process') if self.memory else None,
+                'wall': root['wall'], 'cpu': root['cpu'], 'peak_rss_mb': root['peak_rss_mb'],
+                'spans': root.get('children', []), 'counts': root.get('counts', {})}
+
+@contextmanager
+def span(name, **counts):
+    """
+    Times a stage of the active profiled run; does nothing when no run is profiled.
+    """
+    profiler = _active
+    if profiler is None:
+        yield None
+        return
+    with profiler.span(name, **counts) as node:
+        yield node
+
+def count(**counts):
+    """
+    Attaches counts (elements, points, ...) to the innermost open span of the active run.
+    """
+    if _active is not None:
+        _active.count(**counts)
+
+@contextmanager
+def profile_run(name, out_dir=os.path.join('.', 'profiles'), cprofile=False, **meta):
+    """
+    Profiles everything run inside the with block and writes the record to out_dir as JSON.
+
+    Parameters:
+    name (str): Name of the run.
+    out_dir (str): Folder for the records (and .prof files); None keeps the record in memory only, as
+        the profiler's `result` attribute once the block has finished.
+    cprofile (bool): Also run cProfile over the block and dump its stats next to the record, for
+        snakeviz/pstats. The record holds the pid, so a sampling profiler such as py-spy can be attached
+        to long runs instead.
+    **meta: Run description stored in the record.
+
+    Yields:
+    Profiler: The active profiler. When a run is already being profiled the block becomes a span of it
+        and no separate record is written.
+    """
+    global _active
+    if _active is not None:
+        with span(name):
+            yield _active
+        return
+
+    profiler = Profiler(name, **meta)
+    stem = f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{os.getpid()}"
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+
+    cprofiler = None
+    if cprofile and out_dir is not None:
+        import cProfile
+        cprofiler = cProfile.Profile()
+
+    _active = profiler
+    error = None
+    try:
+        if cprofiler is not None:
+            cprofiler.enable()
+        yield profiler
+    except BaseException as exc:
+        error = f'{type(exc).__name__}: {exc}'
+        raise
+    finally:
+        if cprofiler is not None:
+            cprofiler.disable()
+        _active = None
+        record = profiler.record()
+        record['error'] = error
+        profiler.result = record
+        if cprofiler is not None:
+            record['cprofile'] = os.path.join(out_dir, f'{stem}.prof')
+            cprofiler.dump_stats(record['cprofile'])
+        _write_record(record, out_dir, stem)
+
+@contextmanager
+def profile_task(name, out_dir=os.path.join('.', 'profiles'), **meta):
+    """
+    Profiles one of several tasks that run interleaved on this thread, such as the cases of an asyncio
+    pipeline, and writes its record to out_dir as profile_run does.
+
+    The profiler is not made active, so span() and count() do not reach it: the task opens its spans with
+    profiler.span(...) and can attach records made in worker processes (see Profiler.attach). The tasks
+    share the process, so no peak RSS is recorded for their own spans (peak_rss_scope None); attached
+    records keep the peaks measured in their worker processes.
+
+    Yields:
+    Profiler: The task's profiler.
+    """
+    profiler = Profiler(name, memory=False, **meta)
+    stem = f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{os.getpid()}-{id(profiler):x}"
+    error = None
+    try:
+        yield profiler
+    except BaseException as exc:
+        error = f'{type(exc).__name__}: {exc}'
+        raise
+    finally:
+        record = profiler.record()
+        record['error'] = error
+        profiler.result = record
+        _write_record(record, out_dir, stem)
+
+def _write_record(record, out_dir, stem):
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+        with open(os.path.join(out_dir, f'{stem}.json'), 'w') as f:
+            json.dump(record, f, indent=1)
+
+def load_records(path):
+    """
+    Returns:
+    list: Every record in a folder of JSON records (or a single record file).
+    """
+    if os.path.isfile(path):
+        paths = [path]
+    else:
+        paths = [os.path.join(path, f) for f in sorted(os.listdir(path)) if f.endswith('.json')]
+    records = []
+    for file_path in paths:
+        with open(file_path, 'r') as f:
+            records.append(json.load(f))
+    return records
+
+def summarize(records):
+    """
+    Aggregates spans over many runs by their path (e.g. 'mesh_gen/pass/delaunay').
+
+    Returns:
+    list: One dict per span path with calls, runs, wall (total), cpu (total), mean wall per run, share of
+        the total wall time of all runs, peak RSS (max over calls) and counts (mean per call).
+    """
+    rows = {}
+
+    def visit(node, prefix, run):
+        path = f"{prefix}/{node['name']}" if prefix else node['name']
+        row = rows.setdefault(path, {'span': path, 'calls': 0, 'runs': set(), 'wall': 0.0, 'cpu': 0.0,
+                                     'peak_rss_mb': None, 'counts': {}})
+        row['calls'] += 1
+        row['runs'].add(run)
+        row['wall'] += node.get('wall') or 0.0
+        row['cpu'] += node.get('cpu') or 0.0
+        if node.get('peak_rss_mb') is not None:
+            row['peak_rss_mb'] = max(row['peak_rss_mb'] or 0.0, node['peak_rss_mb'])
+        for key, value in node.get('counts', {}).items():
+            if isinstance(value, (int, float)):
+                row['counts'][key] = row['counts'].get(key, 0) + value
+        for child in node.get('children', []):
+            visit(child, path, run)
+
+    total = 0.0
+    for run, record in enumerate(records):
+        total += record.get('wall') or 0.0
+        for node in record.get('spans', []):
+            visit(node, '', run)
+
+    summary = []
+    for row in rows.values():
+        row['runs'] = len(row['runs'])
+        row['mean_wall'] = row['wall'] / row['runs']
+        row['share'] = row['wall'] / total if total else 0.0
+        row['counts'] = {key: value / row['calls'] for key, value in row['counts'].items()}
+        summary.append(row)
+    return summary
+
+def print_summary(records, sort='wall', top=40):
+    summary = summarize(records)
+    key = {'wall': lambda r: r['wall'], 'calls': lambda r: r['calls'],
+           'peak': lambda r: r['peak_rss_mb'] or 0.0}[sort]
+    summary.sort(key=key, reverse=True)
+
+    total = sum(record.get('wall') or 0.0 for record in records)
+    failed = sum(record.get('error') is not None for record in records)
+    print(f'{len(records)} runs ({failed} failed), {total:.1f} s wall in total')
+    print(f'{"span":<44} {"calls":>6} {"total s":>9} {"mean s":>8} {"share":>6} {"peak MB":>8}  counts')
+    for row in summary[:top]:
+        peak = f"{row['peak_rss_mb']:8.0f}" if row['peak_rss_mb'] is not None else f'{"-":>8}'
+        counts = ', '.join(f'{k}={v:g}' for k, v in row['counts'].items())
+        print(f"{row['span']:<44} {row['calls']:6d} {row['wall']:9.2f} {row['mean_wall']:8.3f} "
+              f"{row['share']:6.1%} {peak}  {counts}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Aggregate FLITE2DPY profiling records.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    summary_parser = commands.add_parser('summary', help='where the time goes over a campaign of runs')
+    summary_parser.add_argument('path', nargs='?', default=os.path.join('.', 'profiles'))
+    summary_parser.add_argument('--sort', choices=('wall', 'calls', 'peak'), default='wall')
+    summary_parser.add_argument('--top', type=int, default=40)
+    args = parser.parse_args()
+    print_summary(load_records(args.path), args.sort, args.top)
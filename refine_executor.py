@@ -0,0 +1,287 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from scipy.spatial import cKDTree
+
+# Per-worker state, set once by _init_worker
+_worker = {}
+
+def _init_worker(spacing, alpha):
+    _worker['spacing'] = spacing
+    _worker['alpha'] = alpha
+    _worker['shm'] = {}
+
+def _attach(specs):
+    # Keep blocks open between tasks; the parent only replaces a block when it needs to grow
+    names = {name for name, _, _ in specs}
+    for name in list(_worker['shm']):
+        if name not in names:
+            _worker['shm'].pop(name).close()
+    arrays = []
+    for name, shape, dtype in specs:
+        if name not in _worker['shm']:
+            _worker['shm'][name] = shared_memory.SharedMemory(name=name)
+        arrays.append(np.ndarray(shape, dtype=dtype, buffer=_worker['shm'][name].buf))
+    return arrays
+
+def _evaluate_partition(task):
+    (xy_name, tree_name, connec_name, order_name), no_points, no_elem, lo, hi = task
+    mesh_xy, tree_xy, connec, order = _attach([
+        (xy_name, (no_points, 2), np.float64),
+        (tree_name, (no_points, 2), np.float64),
+        (connec_name, (no_elem, 3), np.int64),
+        (order_name, (no_elem,), np.int64),
+    ])
+    elems = order[lo:hi].copy()
+    values = evaluate_candidates(mesh_xy, connec[elems], _worker['spacing'], _worker['alpha'], tree_xy=tree_xy)
+    del mesh_xy, tree_xy, connec, order
+    return elems, values
+
+def reject_close_points(candidates, spacing, alpha):
+    """
+    Applies the "too close to an already-accepted point" rule to a batch of candidates.
+
+    Candidates are visited in element order, as in the per-element loop. Candidate i is rejected when an
+    earlier accepted candidate lies closer than spacing[i] / (1 + alpha). Conflicting pairs are found with
+    a KD-tree so only candidates that actually have a close neighbour are resolved sequentially.
+
+    Parameters:
+    candidates (np.ndarray): Array of shape (n, 2) with the candidate points, in element order.
+    spacing (np.ndarray): Target spacing at each candidate.
+    alpha (float): Insertion tolerance used by the refinement loop.
+
+    Returns:
+    np.ndarray: Boolean mask of the candidates that survive.
+    """
+    keep = np.ones(len(candidates), dtype=bool)
+    if len(candidates) < 2:
+        return keep
+
+    radius = spacing / (1 + alpha)
+    pairs = cKDTree(candidates).query_pairs(r=radius.max(), output_type='ndarray')
+    if len(pairs) == 0:
+        return keep
+
+    # query_pairs returns i < j, so j is always the later candidate and is tested against radius[j]
+    d = np.linalg.norm(candidates[pairs[:, 0]] - candidates[pairs[:, 1]], axis=1)
+    pairs = pairs[d < radius[pairs[:, 1]]]
+    pairs = pairs[np.lexsort((pairs[:, 0], pairs[:, 1]))]
+
+    later, start = np.unique(pairs[:, 1], return_index=True)
+    stop = np.append(start[1:], len(pairs))
+    for j, a, b in zip(later, start, stop):
+        if keep[pairs[a:b, 0]].any():
+            keep[j] = False
+
+    return keep
+
+def evaluate_candidates(mesh_xy, connec, spacing, alpha, tree=None, tree_xy=None):
+    """
+    Evaluates the insertion test for the centroids of a set of elements.
+
+    The distance check is made against `tree` when given. Otherwise a KD-tree is built over the points of
+    `tree_xy` that can be closer to a centroid than that element's own vertices, so a partition never
+    needs the whole point set in its KD-tree.
+
+    Parameters:
+    mesh_xy (np.ndarray): Current coordinates, used for the centroids.
+    connec (np.ndarray): Connectivity of the elements to evaluate (0-based).
+    spacing (SpacingField): Target spacing field.
+    alpha (float): Insertion tolerance.
+    tree (cKDTree): KD-tree the distance check is made against.
+    tree_xy (np.ndarray): Coordinates the distance check is made against, when no tree is given.
+
+    Returns:
+    np.ndarray: Array of shape (n, 5) with the centroid, target spacing, acceptance flag and distance to the
+        nearest existing point of each element.
+    """
+    corners = mesh_xy[connec]
+    centroids = np.column_stack([
+        (corners[:, 0, 0] + corners[:, 1, 0] + corners[:, 2, 0]) / 3,
+        (corners[:, 0, 1] + corners[:, 1, 1] + corners[:, 2, 1]) / 3,
+    ])
+
+    if len(centroids) == 0:
+        return np.zeros((0, 5))
+
+    if tree is not None:
+        si, _ = tree.query(centroids)
+    else:
+        margin = np.sqrt(((tree_xy[connec] - centroids[:, None, :])**2).sum(axis=2)).min(axis=1).max()
+        lo = centroids.min(axis=0) - margin
+        hi = centroids.max(axis=0) + margin
+        local = np.flatnonzero(np.all((tree_xy >= lo) & (tree_xy <= hi), axis=1))
+        si, _ = cKDTree(tree_xy[local]).query(centroids)
+
+    is_spacing = spacing(centroids)
+
+    with np.errstate(invalid='ignore'):
+        accept = si - is_spacing >= -alpha * si
+
+    return np.column_stack([centroids, is_spacing, accept, si])
+
+def accepted_candidates(result, alpha, min_separation=False, limit=None):
+    """
+    Returns the indices of the candidates from evaluate_candidates that are inserted.
+
+    With a limit, only the `limit` accepted candidates furthest from any existing point relative to their
+    target spacing (the largest gaps in the mesh) are kept, still in element order.
+    """
+    accept = result[:, 3] > 0
+
+    if min_separation:
+        idx = np.flatnonzero(accept)
+        accept[idx[~reject_close_points(result[idx, :2], result[idx, 2], alpha)]] = False
+
+    accepted = np.flatnonzero(accept)
+    if limit is not None and len(accepted) > limit:
+        gap = result[accepted, 4] / result[accepted, 2]
+        accepted = np.sort(accepted[np.argsort(-gap, kind='stable')[:max(int(limit), 0)]])
+    return accepted
+
+def append_points(mesh_xy, tree, points):
+    """
+    Appends points to the coordinates and rebuilds the KD-tree.
+
+    Returns:
+    tuple: Updated coordinates, KD-tree and a flag telling whether any point was inserted.
+    """
+    flag1 = len(points) > 0
+    if flag1:
+        mesh_xy = np.vstack([mesh_xy, points])
+        tree = cKDTree(mesh_xy)
+
+    return mesh_xy, tree, flag1
+
+def insert_candidates(mesh_xy, tree, result, alpha, min_separation=False, limit=None):
+    """
+    Appends the accepted candidates from evaluate_candidates to the coordinates.
+
+    Returns:
+    tuple: Updated coordinates, KD-tree and a flag telling whether any point was inserted.
+    """
+    accepted = accepted_candidates(result, alpha, min_separation, limit)
+    return append_points(mesh_xy, tree, result[accepted, :2])
+
+def morton_keys(points):
+    """
+    Returns:
+    np.ndarray: Position of each point along a Morton (Z-order) curve through their bounding box, as
+        uint64 keys of 16 bits per axis.
+    """
+    lo = points.min(axis=0)
+    extent = np.maximum(points.max(axis=0) - lo, np.finfo(float).tiny)
+    cells = np.minimum((points - lo) / extent * 65536, 65535).astype(np.uint64)
+
+    def spread(v):
+        v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF)
+        v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F)
+        v = (v | (v << np.uint64(2))) & np.uint64(0x33333333)
+        v = (v | (v << np.uint64(1))) & np.uint64(0x55555555)
+        return v
+
+    return spread(cells[:, 0]) | (spread(cells[:, 1]) << np.uint64(1))
+
+def spatial_order(mesh_xy, connec):
+    """
+    Orders elements along a Morton (Z-order) curve through their centroids, so that contiguous slices
+    of the result are compact spatial partitions.
+    """
+    return np.argsort(morton_keys(mesh_xy[connec].mean(axis=1)), kind='stable')
+
+class RefinementExecutor:
+    """
+    Evaluates refinement candidates for mesh_gen, optionally across a pool of worker processes.
+
+    The pool is started once and reused for every refinement pass. Workers receive the spacing field
+    once, at start-up. On each pass the coordinates and connectivity are placed in shared
+    memory, the elements are split into spatial partitions and each worker evaluates the centroids of one
+    partition. The results are merged in element order, so the accepted points do not depend on the
+    number of workers or on the order in which partitions finish.
+
+    Parameters:
+    spacing (SpacingField): Target spacing field.
+    alpha (float): Insertion tolerance.
+    workers (int): Number of worker processes. 1 evaluates in the calling process; None uses os.cpu_count().
+    min_separation (bool): Reject candidates too close to an earlier accepted candidate.
+    """
+
+    def __init__(self, spacing, alpha, workers=1, min_separation=False):
+        self.spacing = spacing
+        self.alpha = alpha
+        self.min_separation = min_separation
+        self.workers = os.cpu_count() if workers is None else max(int(workers), 1)
+        self._pool = None
+        self._shm = {}
+        self.accepted_elements = np.zeros(0, dtype=int)
+
+        if self.workers > 1:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(spacing, alpha))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        for shm in self._shm.values():
+            shm.close()
+            shm.unlink()
+        self._shm = {}
+
+    def _share(self, key, array):
+        # Reuse the block while it is large enough, so workers can keep it attached
+        shm = self._shm.get(key)
+        if shm is None or shm.size < array.nbytes:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+            shm = shared_memory.SharedMemory(create=True, size=max(int(array.nbytes * 1.5), 1))
+            self._shm[key] = shm
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+        return shm.name
+
+    def _evaluate(self, mesh_xy, connec, tree):
+        if self._pool is None or len(connec) < 4 * self.workers:
+            return evaluate_candidates(mesh_xy, connec, self.spacing, self.alpha, tree=tree)
+
+        mesh_xy = np.ascontiguousarray(mesh_xy, dtype=np.float64)
+        connec = np.ascontiguousarray(connec, dtype=np.int64)
+        order = spatial_order(mesh_xy, connec)
+        names = (self._share('xy', mesh_xy),
+                 self._share('tree', np.asarray(tree.data, dtype=np.float64)),
+                 self._share('connec', connec),
+                 self._share('order', order))
+
+        bounds = np.linspace(0, len(connec), self.workers + 1).astype(int)
+        tasks = [(names, len(mesh_xy), len(connec), lo, hi)
+                 for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+
+        result = np.empty((len(connec), 5))
+        for elems, values in self._pool.map(_evaluate_partition, tasks):
+            result[elems] = values
+        return result
+
+    def refine(self, mesh_xy, connec, tree, limit=None):
+        """
+        Runs one insertion pass.
+
+        Parameters:
+        mesh_xy (np.ndarray): Current coordinates.
+        connec (np.ndarray): Current connectivity (0-based).
+        tree (cKDTree): KD-tree the distance check is made against.
+        limit (int): Maximum number of points to insert; None inserts every accepted candidate.
+
+        Returns:
+        tuple: Updated coordinates, KD-tree and a flag telling whether any point was inserted. The
+            elements whose centroids were inserted are left in accepted_elements, in insertion order.
+        """
+        result = self._evaluate(mesh_xy, connec, tree)
+        self.accepted_elements = accepted_candidates(result, self.alpha, self.min_separation, limit)
+        return append_points(mesh_xy, tree, result[self.accepted_elements, :2])
@@ -0,0 +1,120 @@
+import os
+import subprocess
+import sys
+import numpy as np
+
+# How FLITE2DPY handles plots:
+#   'show'       draw the figures and block in plt.show(), as before
+#   'off'        no plots at all
+#   'deferred'   save the arrays the plots need next to the results, to be rendered later
+#   'background' save the arrays and render them to PNG in a separate process
+RENDER_POLICIES = ('show', 'off', 'deferred', 'background')
+
+PLOT_DATA = 'plot_data.npz'
+# Output of a background render, written next to its plot_data.npz
+RENDER_LOG = 'render.log'
+
+def check_render_policy(render):
+    if render not in RENDER_POLICIES:
+        raise ValueError(f"Unknown render policy {render!r}; expected one of {RENDER_POLICIES}")
+    return render
+
+def save_plot_data(folder, mesh, airfoil_points, outer_points, results, residual):
+    """
+    Saves everything the mesh and solution plots need into folder/plot_data.npz.
+
+    Parameters:
+    folder (str): Case results folder.
+    mesh (dict): Mesh with 'xy' and 1-based 'connec'.
+    airfoil_points (np.ndarray): Inner boundary points.
+    outer_points (np.ndarray): Outer boundary points.
+    results (np.ndarray): The results data from the FLITE solver.
+    residual (np.ndarray): The residual data from the FLITE solver.
+
+    Returns:
+    str: Path of the saved file.
+    """
+    path = os.path.join(folder, PLOT_DATA)
+    np.savez(path, xy=mesh['xy'], connec=mesh['connec'], airfoil_points=airfoil_points,
+             outer_points=outer_points, results=results, residual=residual)
+    return path
+
+def render_plot_data(path, out_dir=None):
+    """
+    Renders the figures of a saved plot_data.npz to PNG files, without a display.
+
+    Parameters:
+    path (str): Path of the plot_data.npz file.
+    out_dir (str): Folder for the PNG files. Defaults to the folder of path.
+
+    Returns:
+    list: Paths of the written PNG files.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from mesh_gen import plot_mesh, plot_mesh_full
+    from import_FLITE_data import plot_FLITE_data
+
+    out_dir = out_dir or os.path.dirname(os.path.abspath(path))
+    data = np.load(path)
+    mesh = {'xy': data['xy'], 'connec': data['connec']}
+
+    figures = {
+        'mesh': plot_mesh(mesh['xy'], mesh['connec'] - 1, data['airfoil_points'], data['outer_points'], show=False),
+        'mesh_full': plot_mesh_full(mesh['xy'], mesh['connec'] - 1, data['airfoil_points'], data['outer_points'],
+                                    show=False),
+    }
+    figures.update(plot_FLITE_data(data['results'], data['residual'], mesh, show=False))
+
+    written = []
+    for name, fig in figures.items():
+        png = os.path.join(out_dir, f'{name}.png')
+        fig.savefig(png)
+        plt.close(fig)
+        written.append(png)
+    return written
+
+def render_in_background(path):
+    """
+    Starts a separate Python process that renders path with render_plot_data, and returns at once.
+    Its output and any error go to RENDER_LOG next to the plot_data.npz file.
+
+    Returns:
+    subprocess.Popen: The rendering process.
+    """
+    path = os.path.abspath(path)
+    kwargs = {}
+    if os.name == 'nt':
+        kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs['start_new_session'] = True
+    with open(os.path.join(os.path.dirname(path), RENDER_LOG), 'w') as log:
+        return subprocess.Popen([sys.executable, os.path.abspath(__file__), path],
+                                cwd=os.path.dirname(os.path.abspath(__file__)),
+                                stdout=log, stderr=subprocess.STDOUT, **kwargs)
+
+def render_pending(root):
+    """
+    Renders every plot_data.npz under root that has no PNG files next to it yet.
+
+    Returns:
+    list: Paths of the rendered plot_data.npz files.
+    """
+    rendered = []
+    for folder, _, files in os.walk(root):
+        if PLOT_DATA in files and not any(f.endswith('.png') for f in files):
+            path = os.path.join(folder, PLOT_DATA)
+            render_plot_data(path)
+            rendered.append(path)
+    return rendered
+
+if __name__ == '__main__':
+    # python render.py <plot_data.npz or results folder> ...
+    for target in sys.argv[1:] or ['raw_data']:
+        if os.path.isdir(target):
+            for path in render_pending(target):
+                print(f"Rendered {path}")
+        else:
+            render_plot_data(target)
+            print(f"Rendered {target}")
@@ -0,0 +1,116 @@
+"""
+Bandwidth-reducing renumbering of a finished mesh, applied before save_mesh.
+
+Nodes come out of mesh_gen in insertion order and elements in Delaunay order, so the nodes of one
+element are scattered over the whole node array. Renumbering the free nodes along reverse Cuthill-McKee
+('rcm') or along a Morton curve ('morton') and sorting the elements by their lowest node keeps
+neighbouring nodes and elements close together in memory for PrePro, the solver and the Python passes
+over the connectivity (conelem, laplacian_smooth).
+
+The boundary nodes keep their numbers, so bound_data stays valid: save_mesh writes it unchanged and the
+solver's boundary conditions still apply to the same points. Since the boundary nodes are the first
+ones, elements on the boundary keep a large span and set the bandwidth of the whole mesh; the bandwidth
+of the free nodes and the mean span per element show the effect of the ordering.
+"""
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import reverse_cuthill_mckee
+
+from conelem import build_adjacency, conelem
+from refine_executor import morton_keys
+
+METHODS = ('rcm', 'morton')
+
+def fixed_nodes(bound_data):
+    """
+    Returns:
+    int: Number of boundary nodes; bound_data must number them 1..n.
+    """
+    nodes = np.unique(bound_data[:, :2])
+    if nodes[0] != 1 or nodes[-1] != len(nodes):
+        raise ValueError('Boundary nodes must be the first nodes of the mesh to renumber it')
+    return len(nodes)
+
+def bandwidth(connec, n_fixed=0):
+    """
+    Measures how far apart the nodes of each element are numbered.
+
+    Parameters:
+    connec (np.ndarray): Connectivity (0- or 1-based).
+    n_fixed (int): Number of boundary nodes.
+
+    Returns:
+    dict: 'bandwidth' (largest node index difference within an element), 'free_bandwidth' (the same over
+        the elements that have no boundary node) and 'mean_span' (mean difference per element).
+    """
+    connec = connec - connec.min()
+    span = connec.max(axis=1) - connec.min(axis=1)
+    free = span[connec.min(axis=1) >= n_fixed]
+    return {'bandwidth': int(span.max()), 'free_bandwidth': int(free.max()) if len(free) else 0,
+            'mean_span': float(span.mean())}
+
+def node_order(xy, connec, n_fixed, method='rcm'):
+    """
+    Orders the free nodes of a mesh.
+
+    Parameters:
+    xy (np.ndarray): Node coordinates.
+    connec (np.ndarray): 0-based connectivity.
+    n_fixed (int): Number of boundary nodes, which keep their numbers.
+    method (str): 'rcm' (reverse Cuthill-McKee on the graph of the free nodes) or 'morton'.
+
+    Returns:
+    np.ndarray: Old node index of every new node.
+    """
+    NoPoints = len(xy)
+    if method == 'rcm':
+        adjacency = build_adjacency(connec, NoPoints)
+        graph = csr_matrix((np.ones(len(adjacency['node_adj'])), adjacency['node_adj'], adjacency['node_ptr']),
+                           shape=(NoPoints, NoPoints))
+        free = reverse_cuthill_mckee(graph[n_fixed:, n_fixed:].tocsr(), symmetric_mode=True) + n_fixed
+    elif method == 'morton':
+        free = np.argsort(morton_keys(xy[n_fixed:]), kind='stable') + n_fixed
+    else:
+        raise ValueError(f"Unknown renumbering method: {method} (expected one of {', '.join(METHODS)})")
+    return np.concatenate([np.arange(n_fixed), free])
+
+def element_order(connec):
+    """
+    Returns:
+    np.ndarray: Order of the elements by their lowest node, then their second and highest node.
+    """
+    nodes = np.sort(connec, axis=1)
+    return np.lexsort((nodes[:, 2], nodes[:, 1], nodes[:, 0]))
+
+def renumber_mesh(mesh, bound_data, method='rcm', verbose=True):
+    """
+    Renumbers the free nodes and sorts the elements to match.
+
+    Parameters:
+    mesh (dict): Mesh with 'xy' and 0-based 'connec', as mesh_gen has it before adjust_indices.
+    bound_data (np.ndarray): Boundary edges; their nodes keep their numbers.
+    method (str): 'rcm' or 'morton' (see node_order).
+    verbose (bool): Print the bandwidth before and after.
+
+    Returns:
+    dict: The renumbered mesh, with the conelem data rebuilt for the new numbering and 'bandwidth'
+        (bandwidth of the mesh before and after, see bandwidth).
+    """
+    n_fixed = fixed_nodes(bound_data)
+    before = bandwidth(mesh['connec'], n_fixed)
+
+    order = node_order(mesh['xy'], mesh['connec'], n_fixed, method)
+    new_index = np.empty_like(order)
+    new_index[order] = np.arange(len(order))
+    connec = new_index[mesh['connec']]
+    connec = connec[element_order(connec)]
+
+    renumbered = conelem({'xy': mesh['xy'][order], 'connec': connec})
+    after = bandwidth(renumbered['connec'], n_fixed)
+    renumbered['bandwidth'] = {'before': before, 'after': after}
+
+    if verbose:
+        print(f"Renumbered nodes ({method}): bandwidth {before['bandwidth']} -> {after['bandwidth']}, "
+              f"free nodes {before['free_bandwidth']} -> {after['free_bandwidth']}, "
+              f"mean element span {before['mean_span']:.0f} -> {after['mean_span']:.0f}")
+    return renumbered
@@ -0,0 +1,345 @@
+"""
+Resampling of solver results onto fixed grids, for datasets built from raw_data.
+
+Every case has its own unstructured mesh. A Resampler locates the grid points in the mesh once (see
+locate_points) and keeps their barycentric weights as a sparse matrix of shape (grid points,
+nodes). All fields of a case are then resampled with one sparse product. Resamplers are cached per mesh
+(by the content of mesh.dat) and grid, in memory and optionally on disk, so the cases of an airfoil,
+which share a mesh, only pay for the point location once.
+
+Grids are either Cartesian (the same points for every case) or body-fitted: an O-grid grown along the
+normals of each airfoil, with the same shape for every airfoil. Grid points outside the mesh are NaN.
+
+resample_tree resamples a whole raw_data tree, in parallel, into one .npy array of shape (cases, fields,
+*grid shape). Workers write their cases straight into the memory-mapped file. A JSON index next to it
+lists the cases, fields and grid.
+
+Usage:
+python resample.py raw_data dataset.npy [--grid cartesian|body] [--nx 256] [--ny 128] [--xlim -0.5 1.5]
+                   [--ylim -0.5 0.5] [--n-around 128] [--n-normal 64] [--first 0.001] [--extent 5.0]
+                   [--workers 4] [--cache resample_cache]
+"""
+import os
+import sys
+import json
+import hashlib
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy import sparse
+from scipy.spatial import cKDTree
+
+from flite_io import read_res, read_mesh_dat
+from geometry import AIRFOIL_FLAG
+from import_FLITE_data import normalised_pressure
+from mesh_gen import boundary_loops
+from result_store import FIELDS, list_cases
+
+# Resampled fields: the columns of solverout.res and 'pressure', p/q_inf = 2 p from the p column
+# (import_FLITE_data.normalised_pressure, the field plot_FLITE_data shows)
+EXPORT_FIELDS = FIELDS + ('pressure',)
+
+# Coordinates of body-fitted grids differ per airfoil, so they are exported as two more fields
+GRID_FIELDS = ('x', 'y')
+
+# Resamplers kept in memory by this process, most recently used last
+CACHE_SIZE = 16
+_resamplers = OrderedDict()
+
+def cartesian_grid(xlim=(-0.5, 1.5), ylim=(-0.5, 0.5), nx=256, ny=128):
+    """
+    Returns:
+    dict: Grid of nx * ny points covering xlim x ylim, with shape (ny, nx).
+    """
+    x, y = np.meshgrid(np.linspace(*xlim, nx), np.linspace(*ylim, ny))
+    return {'kind': 'cartesian', 'xy': np.column_stack([x.ravel(), y.ravel()]), 'shape': (ny, nx)}
+
+def body_fitted_grid(n_around=128, n_normal=64, first=1e-3, extent=5.0):
+    """
+    O-grid around the airfoil of each mesh: n_around points spaced evenly by arc length along the
+    surface, offset along the outward normals by n_normal distances growing geometrically from first to
+    extent (in chords). The points are built per mesh by grid_points.
+
+    Returns:
+    dict: Grid description, with shape (n_normal, n_around).
+    """
+    return {'kind': 'body', 'n_around': int(n_around), 'n_normal': int(n_normal), 'first': float(first),
+            'extent': float(extent), 'shape': (int(n_normal), int(n_around))}
+
+def airfoil_loop(xy, boundaries):
+    """
+    Returns:
+    np.ndarray: Coordinates of the airfoil surface of a mesh, in the order of its boundary edges.
+    """
+    edges = boundaries[boundaries[:, 2] == AIRFOIL_FLAG]
+    return xy[boundary_loops(edges)[0]]
+
+def grid_points(grid, xy=None, boundaries=None):
+    """
+    Returns:
+    np.ndarray: (n, 2) points of a grid; for body-fitted grids those around the airfoil of the mesh
+        with coordinates xy and boundary data boundaries.
+    """
+    if grid['kind'] == 'cartesian':
+        return grid['xy']
+
+    loop = airfoil_loop(xy, boundaries)
+    closed = np.vstack([loop, loop[:1]])
+    s = np.concatenate([[0.0], np.cumsum(np.sqrt((np.diff(closed, axis=0)**2).sum(axis=1)))])
+    t = np.linspace(0.0, s[-1], grid['n_around'], endpoint=False)
+    surface = np.column_stack([np.interp(t, s, closed[:, 0]), np.interp(t, s, closed[:, 1])])
+
+    tangent = np.roll(surface, -1, axis=0) - np.roll(surface, 1, axis=0)
+    normal = np.column_stack([tangent[:, 1], -tangent[:, 0]])
+    normal /= np.sqrt((normal**2).sum(axis=1))[:, None]
+    # (dy, -dx) points outwards for a counter-clockwise loop
+    area = np.dot(loop[:, 0], np.roll(loop[:, 1], -1)) - np.dot(loop[:, 1], np.roll(loop[:, 0], -1))
+    if area < 0:
+        normal = -normal
+
+    distance = np.geomspace(grid['first'], grid['extent'], grid['n_normal'])
+    return (surface[None, :, :] + distance[:, None, None] * normal[None, :, :]).reshape(-1, 2)
+
+def grid_digest(grid):
+    h = hashlib.sha256()
+    if grid['kind'] == 'cartesian':
+        h.update(np.ascontiguousarray(grid['xy'], dtype=np.float64).tobytes())
+    else:
+        h.update(repr(sorted(grid.items())).encode())
+    return h.hexdigest()
+
+def barycentric(corners, points):
+    # Barycentric coordinates of points (..., 2) in triangles with corners (..., 3, 2)
+    c0, c1, c2 = corners[..., 0, :], corners[..., 1, :], corners[..., 2, :]
+    e1, e2, d = c1 - c0, c2 - c0, points - c0
+    det = e1[..., 0] * e2[..., 1] - e1[..., 1] * e2[..., 0]
+    l1 = (d[..., 0] * e2[..., 1] - d[..., 1] * e2[..., 0]) / det
+    l2 = (e1[..., 0] * d[..., 1] - e1[..., 1] * d[..., 0]) / det
+    return np.stack([1.0 - l1 - l2, l1, l2], axis=-1)
+
+def locate_points(xy, tri, points, neighbours=(8, 32, 128), tol=1e-10):
+    """
+    Finds the element containing each point.
+
+    Candidate elements are the ones with the nearest centroids (a KD-tree query). A point belongs to the
+    first candidate whose barycentric coordinates are all >= -tol. Points not found among the nearest
+    neighbours[0] centroids are tried again with more, and are outside the mesh if none contains them.
+    matplotlib's trifinder is not used: it can reject saved meshes as invalid, since mesh.dat rounds the
+    coordinates to six decimals.
+
+    Parameters:
+    xy (np.ndarray): Node coordinates (np, 2).
+    tri (np.ndarray): 0-based connectivity (ne, 3).
+    points (np.ndarray): Points to locate (n, 2).
+    neighbours (tuple): Numbers of candidate elements tried in turn.
+    tol (float): Tolerance on the barycentric coordinates, for points on edges.
+
+    Returns:
+    tuple: Element of each point (-1 outside the mesh) and the barycentric coordinates (n, 3).
+    """
+    corners = xy[tri]
+    tree = cKDTree(corners.mean(axis=1))
+    element = np.full(len(points), -1)
+    bary = np.zeros((len(points), 3))
+
+    remaining = np.arange(len(points))
+    for k in neighbours:
+        k = min(k, len(tri))
+        if len(remaining) == 0 or k == 0:
+            break
+        _, candidates = tree.query(points[remaining], k=k)
+        candidates = candidates.reshape(len(remaining), k)
+        weights = barycentric(corners[candidates], points[remaining][:, None, :])
+        hit = (weights >= -tol).all(axis=2)
+        first = hit.argmax(axis=1)
+        found = hit[np.arange(len(remaining)), first]
+        rows = remaining[found]
+        element[rows] = candidates[found, first[found]]
+        bary[rows] = weights[found, first[found]]
+        remaining = remaining[~found]
+    return element, bary
+
+class Resampler:
+    """
+    Linear interpolation from the nodes of a triangular mesh to a fixed set of points.
+
+    Parameters:
+    xy (np.ndarray): Node coordinates (np, 2).
+    connec (np.ndarray): 1-based connectivity (ne, 3).
+    points (np.ndarray): Points to resample to (n, 2).
+    weights (scipy.sparse.csr_matrix): Precomputed weights (e.g. from a cache); the mesh is then not used.
+    """
+
+    def __init__(self, xy, connec, points, weights=None):
+        self.points = points
+        if weights is None:
+            weights = self.barycentric_weights(xy, connec, points)
+        self.weights = weights.tocsr()
+        # Points found in the mesh have three weights, the others none
+        self.inside = np.diff(self.weights.indptr) > 0
+
+    @staticmethod
+    def barycentric_weights(xy, connec, points):
+        tri = connec - 1
+        element, bary = locate_points(xy, tri, points)
+        found = np.flatnonzero(element >= 0)
+        return sparse.csr_matrix((bary[found].ravel(), (np.repeat(found, 3), tri[element[found]].ravel())),
+                                 shape=(len(points), len(xy)))
+
+    def __call__(self, values, fill_value=np.nan):
+        """
+        Resamples nodal values (np,) or (np, k) to the points; points outside the mesh get fill_value.
+        """
+        out = np.asarray(self.weights @ values, dtype=np.float64)
+        out[~self.inside] = fill_value
+        return out
+
+def resampler_for(mesh_path, grid, cache_dir=None):
+    """
+    Returns the Resampler from the mesh in mesh_path (mesh.dat) to grid, from the in-memory cache, the
+    cache_dir on disk or built anew.
+
+    Returns:
+    tuple: (Resampler, points of the grid for this mesh).
+    """
+    with open(mesh_path, 'rb') as f:
+        key = hashlib.sha256(f.read()).hexdigest() + grid_digest(grid)[:32]
+
+    cached = _resamplers.get(key)
+    if cached is not None:
+        _resamplers.move_to_end(key)
+        return cached
+
+    xy, connec, boundaries = read_mesh_dat(mesh_path)
+    points = grid_points(grid, xy, boundaries)
+
+    file_path = os.path.join(cache_dir, f'{key}.npz') if cache_dir is not None else None
+    if file_path is not None and os.path.exists(file_path):
+        resampler = Resampler(xy, connec, points, sparse.load_npz(file_path))
+    else:
+        resampler = Resampler(xy, connec, points)
+        if file_path is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = f'{file_path}.{os.getpid()}.tmp.npz'
+            sparse.save_npz(tmp, resampler.weights)
+            os.replace(tmp, file_path)
+
+    _resamplers[key] = (resampler, points)
+    while len(_resamplers) > CACHE_SIZE:
+        _resamplers.popitem(last=False)
+    return resampler, points
+
+def export_fields(grid):
+    return EXPORT_FIELDS + (GRID_FIELDS if grid['kind'] == 'body' else ())
+
+def resample_case(case_dir, grid, cache_dir=None):
+    """
+    Resamples the fields of one raw_data case folder (mesh.dat and solverout.res) to a grid.
+
+    The 'pressure' field is p/q_inf = 2 p, taken from the p column of solverout.res (see
+    normalised_pressure). Datasets exported before that formula was corrected hold
+    2 (gamma - 1) rho (e - |V|^2) instead, which leaves the 1/2 out of |V|^2.
+
+    Returns:
+    np.ndarray: Array of shape (len(export_fields(grid)), *grid['shape']).
+    """
+    resampler, points = resampler_for(os.path.join(case_dir, 'mesh.dat'), grid, cache_dir)
+    results = read_res(os.path.join(case_dir, 'solverout.res'))
+    nodal = np.column_stack([results[:, 1:6], normalised_pressure(results)])
+    fields = resampler(nodal).T
+    if grid['kind'] == 'body':
+        fields = np.vstack([fields, points.T])
+    return fields.reshape((len(fields),) + tuple(grid['shape']))
+
+def _resample_chunk(out_path, items, grid, cache_dir):
+    # Resamples (index, case folder) items straight into the memory-mapped output
+    out = np.load(out_path, mmap_mode='r+')
+    errors = {}
+    for index, case_dir in items:
+        try:
+            out[index] = resample_case(case_dir, grid, cache_dir)
+        except Exception as exc:
+            out[index] = np.nan
+            errors[index] = f'{type(exc).__name__}: {exc}'
+    out.flush()
+    del out
+    return errors
+
+def resample_tree(raw_root, out_path, grid=None, workers=1, dtype=np.float32, cache_dir=None, chunk_size=32):
+    """
+    Resamples every solved case of a raw_data tree into one array file.
+
+    Cases are processed in chunks of the same airfoil, so a worker reuses the resampler of that mesh.
+
+    Parameters:
+    raw_root (str): Root of the raw_data tree.
+    out_path (str): .npy file written, of shape (cases, fields, *grid shape).
+    grid (dict): Grid from cartesian_grid or body_fitted_grid; None uses cartesian_grid().
+    workers (int): Worker processes; None uses os.cpu_count().
+    dtype: dtype of the output array.
+    cache_dir (str): Optional folder the resampler weights are cached in across runs.
+    chunk_size (int): Cases per task.
+
+    Returns:
+    dict: The index also written next to out_path as JSON: cases, fields, grid and errors (by case).
+    """
+    grid = cartesian_grid() if grid is None else grid
+    workers = os.cpu_count() if workers is None else max(int(workers), 1)
+    cases = [case for case in list_cases(raw_root)
+             if all(os.path.exists(os.path.join(raw_root, *case, f)) for f in ('mesh.dat', 'solverout.res'))]
+    fields = export_fields(grid)
+
+    out = np.lib.format.open_memmap(out_path, mode='w+', dtype=dtype,
+                                    shape=(len(cases), len(fields)) + tuple(grid['shape']))
+    del out
+
+    chunks = []
+    for i, case in enumerate(cases):
+        if not chunks or len(chunks[-1]) >= chunk_size or cases[chunks[-1][-1][0]][0] != case[0]:
+            chunks.append([])
+        chunks[-1].append((i, os.path.join(raw_root, *case)))
+
+    errors = {}
+    if workers == 1:
+        for items in chunks:
+            errors.update(_resample_chunk(out_path, items, grid, cache_dir))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for found in pool.map(_resample_chunk, [out_path] * len(chunks), chunks, [grid] * len(chunks),
+                                  [cache_dir] * len(chunks)):
+                errors.update(found)
+
+    index = {'cases': [list(case) for case in cases], 'fields': list(fields), 'shape': list(grid['shape']),
+             'grid': {k: (v.tolist() if isinstance(v, np.ndarray) else v) for k, v in grid.items() if k != 'xy'},
+             'errors': {'/'.join(cases[i]): error for i, error in sorted(errors.items())}}
+    if grid['kind'] == 'cartesian':
+        np.save(f'{os.path.splitext(out_path)[0]}_grid.npy', grid['xy'].reshape(tuple(grid['shape']) + (2,)))
+    with open(f'{os.path.splitext(out_path)[0]}.json', 'w') as f:
+        json.dump(index, f, indent=1)
+    return index
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Resample a raw_data tree onto a fixed grid.')
+    parser.add_argument('raw_root')
+    parser.add_argument('out_path')
+    parser.add_argument('--grid', choices=('cartesian', 'body'), default='cartesian')
+    parser.add_argument('--nx', type=int, default=256)
+    parser.add_argument('--ny', type=int, default=128)
+    parser.add_argument('--xlim', type=float, nargs=2, default=(-0.5, 1.5))
+    parser.add_argument('--ylim', type=float, nargs=2, default=(-0.5, 0.5))
+    parser.add_argument('--n-around', type=int, default=128)
+    parser.add_argument('--n-normal', type=int, default=64)
+    parser.add_argument('--first', type=float, default=1e-3, help='first wall distance of the body-fitted grid')
+    parser.add_argument('--extent', type=float, default=5.0, help='outer wall distance of the body-fitted grid')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--cache', default=None, help='folder to cache resampler weights in')
+    args = parser.parse_args()
+
+    if args.grid == 'cartesian':
+        grid = cartesian_grid(args.xlim, args.ylim, args.nx, args.ny)
+    else:
+        grid = body_fitted_grid(args.n_around, args.n_normal, args.first, args.extent)
+    index = resample_tree(args.raw_root, args.out_path, grid, args.workers, cache_dir=args.cache)
+    print(f"{len(index['cases'])} cases resampled to {args.out_path} ({len(index['errors'])} failed)")
+    sys.exit(1 if index['errors'] else 0)
@@ -0,0 +1,134 @@
+import os
+import sys
+import shutil
+import tempfile
+import numpy as np
+
+from import_FLITE_data import import_FLITE_data
+from flite_io import read_mesh_dat
+
+# Solution fields, in the column order of solverout.res (after the node number)
+FIELDS = ('rho', 'u', 'v', 'e', 'p')
+
+# Every array kept for a case; each is stored as <name>.npy in the case folder
+ARRAYS = ('xy', 'connec', 'boundaries') + FIELDS + ('residual',)
+
+def case_path(store_root, airfoil, mach, aoa):
+    """
+    Folder of a case in the store, laid out like raw_data: <store_root>/<airfoil>/<mach>/<aoa>.
+    """
+    if not isinstance(mach, str):
+        mach = f'{mach:.2f}'
+    if not isinstance(aoa, str):
+        aoa = f'{aoa:.2f}'
+    return os.path.join(store_root, str(int(airfoil)), mach, aoa)
+
+def write_case(case_dir, xy, connec, results, residual, boundaries=None):
+    """
+    Writes one case to the store as one .npy file per array.
+
+    The case is written to a temporary folder and renamed into place, so a reader never sees a
+    partially written case.
+
+    Parameters:
+    case_dir (str): Case folder, see case_path.
+    xy (np.ndarray): Node coordinates (np, 2).
+    connec (np.ndarray): 1-based connectivity (ne, 3).
+    results (np.ndarray): Contents of solverout.res (np, 6).
+    residual (np.ndarray): Contents of solverout.rsd.
+    boundaries (np.ndarray): Boundary data (nb, 3).
+
+    Returns:
+    str: case_dir.
+    """
+    parent = os.path.dirname(os.path.abspath(case_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix='.tmp-', dir=parent)
+
+    arrays = {
+        'xy': np.ascontiguousarray(xy[:, :2], dtype=np.float64),
+        'connec': np.ascontiguousarray(connec[:, :3], dtype=np.int32),
+        'boundaries': np.zeros((0, 3), dtype=np.int32) if boundaries is None
+                      else np.ascontiguousarray(boundaries, dtype=np.int32),
+        'residual': np.ascontiguousarray(residual, dtype=np.float64),
+    }
+    for i, field in enumerate(FIELDS):
+        arrays[field] = np.ascontiguousarray(results[:, i + 1], dtype=np.float64)
+
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp, f'{name}.npy'), array)
+
+    if os.path.isdir(case_dir):
+        shutil.rmtree(case_dir)
+    os.rename(tmp, case_dir)
+    return case_dir
+
+def load_case(case_dir, names=ARRAYS, mmap_mode='r'):
+    """
+    Opens the arrays of a case as read-only memory maps. Nothing is read until the arrays are used,
+    and slicing them returns views into the files.
+
+    Parameters:
+    case_dir (str): Case folder, see case_path.
+    names (tuple): Arrays to open, from ARRAYS.
+    mmap_mode (str): Passed to np.load; None reads the arrays into memory.
+
+    Returns:
+    dict: The arrays, keyed by name.
+    """
+    return {name: np.load(os.path.join(case_dir, f'{name}.npy'), mmap_mode=mmap_mode) for name in names}
+
+def list_cases(store_root):
+    """
+    Returns:
+    list: (airfoil, mach, aoa) strings of every case under store_root (or under a raw_data tree).
+    """
+    cases = []
+    for airfoil in sorted(os.listdir(store_root)):
+        if airfoil.startswith('.') or not os.path.isdir(os.path.join(store_root, airfoil)):
+            continue
+        for mach in sorted(os.listdir(os.path.join(store_root, airfoil))):
+            if mach.startswith('.') or not os.path.isdir(os.path.join(store_root, airfoil, mach)):
+                continue
+            for aoa in sorted(os.listdir(os.path.join(store_root, airfoil, mach))):
+                if not aoa.startswith('.') and os.path.isdir(os.path.join(store_root, airfoil, mach, aoa)):
+                    cases.append((airfoil, mach, aoa))
+    return cases
+
+def store_raw_case(raw_case_dir, case_dir):
+    """
+    Converts one raw_data case folder (mesh.dat, solverout.res, solverout.rsd) into the store.
+    """
+    xy, connec, boundaries = read_mesh_dat(os.path.join(raw_case_dir, 'mesh.dat'))
+    results, residual = import_FLITE_data(os.path.join(raw_case_dir, 'solverout.rsd'),
+                                          os.path.join(raw_case_dir, 'solverout.res'), None, plot=False)
+    return write_case(case_dir, xy, connec, results, residual, boundaries)
+
+def convert_raw_data(raw_root=os.path.join('.', 'raw_data'), store_root=os.path.join('.', 'result_store'),
+                     overwrite=False):
+    """
+    Converts every case of a raw_data tree into the store.
+
+    Parameters:
+    raw_root (str): Root of the raw_data tree.
+    store_root (str): Root of the store.
+    overwrite (bool): Convert cases that are already in the store again.
+
+    Returns:
+    list: Folders of the converted cases.
+    """
+    converted = []
+    for airfoil, mach, aoa in list_cases(raw_root):
+        case_dir = case_path(store_root, airfoil, mach, aoa)
+        if os.path.isdir(case_dir) and not overwrite:
+            continue
+        store_raw_case(os.path.join(raw_root, airfoil, mach, aoa), case_dir)
+        converted.append(case_dir)
+    return converted
+
+if __name__ == '__main__':
+    # python result_store.py [raw_data] [result_store]
+    raw_root = sys.argv[1] if len(sys.argv) > 1 else os.path.join('.', 'raw_data')
+    store_root = sys.argv[2] if len(sys.argv) > 2 else os.path.join('.', 'result_store')
+    for case_dir in convert_raw_data(raw_root, store_root):
+        print(f"Converted {case_dir}")
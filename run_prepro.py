@@ -1,28 +1,66 @@
 import os
+import time
+import errno
+import threading
 import subprocess
+from save_mesh import save_mesh
 
 # Define paths to executable and input file
-prepro_exe = r'PrePro.exe'
-input_file = r'runPrePro.inp'
+FLITE_DIR = os.path.dirname(os.path.abspath(__file__))
+prepro_exe = os.path.join(FLITE_DIR, 'PrePro.exe')
+input_file = os.path.join(FLITE_DIR, 'runPrePro.inp')
 
-# Check if the executable exists
-if not os.path.exists(prepro_exe):
-    raise FileNotFoundError(f"PrePro.exe not found at {prepro_exe}")
+def _stream_mesh(path, mesh, bound_data, process):
+    # Wait for PrePro.exe to open the FIFO for reading, giving up if it exits first
+    while True:
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+            break
+        except OSError as e:
+            if e.errno != errno.ENXIO or process.poll() is not None:
+                return
+            time.sleep(0.01)
+    os.set_blocking(fd, True)
+    try:
+        with os.fdopen(fd, 'w', buffering=1 << 20) as f:
+            save_mesh(mesh, f, bound_data)
+    except BrokenPipeError:
+        pass
 
 # Function to run PrePro.exe
-def run_prepro():
-    # Open PrePro.exe process
-    with subprocess.Popen([prepro_exe], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True) as process:
-        # Read inputs from input file and feed them sequentially
+def run_prepro(workdir='.', mesh=None, bound_data=None):
+    # When mesh and bound_data are given, mesh.dat is streamed to PrePro.exe through a named pipe
+    # instead of being written to disk first (falls back to a regular file where FIFOs are not available)
+
+    # Check if the executable exists
+    if not os.path.exists(prepro_exe):
+        raise FileNotFoundError(f"PrePro.exe not found at {prepro_exe}")
+
+    mesh_file = os.path.join(workdir, 'mesh.dat')
+    stream = mesh is not None and hasattr(os, 'mkfifo')
+    if mesh is not None:
+        if os.path.exists(mesh_file):
+            os.remove(mesh_file)
+        if stream:
+            os.mkfifo(mesh_file)
+        else:
+            save_mesh(mesh, mesh_file, bound_data)
+
+    # Open PrePro.exe process; it reads mesh.dat and writes mesh.sol in workdir
+    with subprocess.Popen([prepro_exe], cwd=workdir, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True) as process:
+        if stream:
+            writer = threading.Thread(target=_stream_mesh, args=(mesh_file, mesh, bound_data, process), daemon=True)
+            writer.start()
+
+        # Read inputs from input file and feed them in one go; communicate closes stdin afterwards
         with open(input_file, 'r') as f:
-            for line in f:
-                input_value = line.strip()  
-                process.stdin.write(input_value + '\n')
-                process.stdin.flush() 
+            inputs = ''.join(line.strip() + '\n' for line in f)
 
-        process.stdin.close()
+        stdout, stderr = process.communicate(inputs)
 
-        stdout, stderr = process.communicate() 
+        if stream:
+            writer.join()
+            os.remove(mesh_file)
 
         # Check if process exited successfully
         if process.returncode != 0:
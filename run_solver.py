@@ -1,18 +1,20 @@
 import os
+import shutil
 import subprocess
+from contextlib import nullcontext
+from solver_monitor import ConvergenceMonitor, watch_solver
 
-def run_solver(mach, aoa):
-    # Define paths to executable and input files
-    solver_exe = r'Solver.exe'
-    inp_file = r'runSolver.inp'
-    solverinp_file = r'solver.inp'
-    
-    # Check if the executable exists
-    if not os.path.exists(solver_exe):
-        raise FileNotFoundError(f"Solver.exe not found at {solver_exe}")
+FLITE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Name the restart solution is copied to in the working directory
+RESTART_FILE = 'restart.res'
 
-    # Modify input file 'solver.inp' based on mach and aoa
-    with open(solverinp_file, 'r') as f:
+def write_solver_input(mach, aoa, workdir='.'):
+    # Write workdir/solver.inp from the template, based on mach and aoa
+    template_file = os.path.join(FLITE_DIR, 'solver.inp')
+    solverinp_file = os.path.join(workdir, 'solver.inp')
+
+    with open(template_file, 'r') as f:
         solver_input = f.readlines()
     
     # Update Mach number and AoA in the input file
@@ -24,24 +26,81 @@ def run_solver(mach, aoa):
 
     with open(solverinp_file, 'w') as f:
         f.writelines(solver_input)
+    return solverinp_file
+
+def solver_inputs(restart=None):
+    # Answers fed to Solver.exe on stdin, one per line of runSolver.inp. The third answer names the
+    # restart file; it is left blank to start from freestream
+    inp_file = os.path.join(FLITE_DIR, 'runSolver.inp')
+    with open(inp_file, 'r') as f:
+        lines = [line.strip() for line in f]
+    if restart is not None:
+        lines[2] = restart
+    return ''.join(line + '\n' for line in lines)
+
+def run_solver(mach, aoa, workdir='.', slot=None, monitor=None, poll_interval=0.5, restart=None):
+    # restart: optional solverout.res of a neighbouring solved case (see warm_start.py); it is copied
+    # into workdir and named as the restart file, so the solver starts from it instead of freestream
+    # monitor: None runs the solver to completion as before. Otherwise a dict of ConvergenceMonitor
+    # options (tolerance, window, min_iterations, divergence, callback), or a ConvergenceMonitor;
+    # solverout.rsd is then tailed while the solver runs, the run is stopped once CL/CD are stable
+    # and killed if it diverges. Returns the monitor (None without monitoring).
+    # Define path to executable
+    solver_exe = os.path.join(FLITE_DIR, 'Solver.exe')
     
-    # Run Solver.exe
-    with subprocess.Popen([solver_exe], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True) as process:
-        # Read inputs from input file and feed them sequentially
-        with open(inp_file, 'r') as f:
-            for line in f:
-                input_value = line.strip()  
-                process.stdin.write(input_value + '\n')
-                process.stdin.flush()  
+    # Check if the executable exists
+    if not os.path.exists(solver_exe):
+        raise FileNotFoundError(f"Solver.exe not found at {solver_exe}")
 
-        process.stdin.close()
+    write_solver_input(mach, aoa, workdir)
+
+    if restart is not None:
+        shutil.copy(restart, os.path.join(workdir, RESTART_FILE))
+    inputs = solver_inputs(RESTART_FILE if restart is not None else None)
+
+    if monitor is None:
+        # Run Solver.exe in workdir, holding one of the scheduler's solver slots if given
+        with slot if slot is not None else nullcontext(), \
+                subprocess.Popen([solver_exe], cwd=workdir, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True) as process:
+            # Feed the inputs in one go; communicate closes stdin afterwards
+            stdout, stderr = process.communicate(inputs)
 
-        stdout, stderr = process.communicate()
+            # Check if process exited successfully
+            if process.returncode != 0:
+                print(f"Solver.exe terminated with error: {stderr}") 
+            else:
+                print("Solver.exe execution completed successfully.")
+                print("Output:\n", stdout) 
+        return None
+
+    if not isinstance(monitor, ConvergenceMonitor):
+        monitor = ConvergenceMonitor(aoa, **monitor)
+
+    # A solverout.rsd left from an earlier run would be read as this run's history
+    rsd_file = os.path.join(workdir, 'solverout.rsd')
+    if os.path.exists(rsd_file):
+        os.remove(rsd_file)
+
+    # Solver output goes to a log file rather than a pipe, so nothing blocks while the residuals are tailed
+    log_file = os.path.join(workdir, 'solver.log')
+    with slot if slot is not None else nullcontext(), open(log_file, 'w') as log, \
+            subprocess.Popen([solver_exe], cwd=workdir, stdin=subprocess.PIPE, stdout=log, stderr=subprocess.STDOUT, text=True) as process:
+        process.stdin.write(inputs)
+        process.stdin.close()
 
-        # Check if process exited successfully
-        if process.returncode != 0:
-            print(f"Solver.exe terminated with error: {stderr}") 
-        else:
-            print("Solver.exe execution completed successfully.")
-            print("Output:\n", stdout) 
+        for _ in watch_solver(process, workdir, monitor, poll_interval):
+            pass
+        process.wait()
 
+    iterations = monitor.history['iteration'][-1] if monitor.history['iteration'] else 0
+    if monitor.status == 'diverged':
+        raise RuntimeError(f"Solver.exe diverged at iteration {iterations} (log residual "
+                           f"{monitor.history['residual'][-1]:.3f}) and was stopped.")
+    if monitor.status == 'converged':
+        print(f"Solver.exe stopped at iteration {iterations}: CL/CD stable to {monitor.tolerance}.")
+    elif process.returncode != 0:
+        with open(log_file, 'r') as f:
+            print(f"Solver.exe terminated with error: {f.read()}")
+    else:
+        print(f"Solver.exe execution completed successfully after {iterations} iterations.")
+    return monitor
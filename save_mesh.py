@@ -1,57 +1,81 @@
 import numpy as np
 import os
 
-def save_mesh(mesh, filename, bound_data):
+# Row formats of the three tables, as np.savetxt wrote them before
+CONNEC_FORMAT = '\t'.join(['%11d'] * 5) + '\n'
+COORD_FORMAT = '%11d %11.6f %11.6f\n'
+
+def write_rows(f, row_format, n, columns, chunk_rows=65536):
+    """
+    Writes a table in blocks of chunk_rows rows, each formatted with a single %-operation, so no
+    per-row Python work is done and memory use is bounded by the block size.
+
+    Parameters:
+    f (file): Text file object.
+    row_format (str): %-format of one row, ending in a newline.
+    n (int): Number of rows.
+    columns (list): Callables taking a slice of rows and returning the values of one column.
+    chunk_rows (int): Rows formatted per block.
+    """
+    for lo in range(0, n, chunk_rows):
+        rows = slice(lo, min(lo + chunk_rows, n))
+        block = np.column_stack([column(rows) for column in columns])
+        f.write((row_format * len(block)) % tuple(block.ravel().tolist()))
+
+def write_mesh(f, mesh, bound_data, chunk_rows=65536):
+    """
+    Writes a mesh in the FLITE preprocessor format to an open text file object.
+    """
+    connec = mesh['connec']
+    xy = mesh['xy']
+    bound_data = np.asarray(bound_data)
+
+    ne = len(connec)
+    np_ = len(xy)
+    nb = len(bound_data)
+
+    # Header
+    f.write(f"1\ntitle\nne\tnp\tnb\n{ne}\t{np_}\t{nb}\nconnectivities\n")
+
+    # Connectivities
+    write_rows(f, CONNEC_FORMAT, ne,
+               [lambda rows: np.arange(rows.start + 1, rows.stop + 1),
+                lambda rows: connec[rows, 0], lambda rows: connec[rows, 1], lambda rows: connec[rows, 2],
+                lambda rows: np.ones(rows.stop - rows.start, dtype=int)], chunk_rows)
+
+    f.write("coordinates\n")
+
+    # Coordinates, all as floats like the (np, 3) array np.savetxt used to receive
+    write_rows(f, COORD_FORMAT, np_,
+               [lambda rows: np.arange(rows.start + 1, rows.stop + 1, dtype=float),
+                lambda rows: xy[rows, 0].astype(float), lambda rows: xy[rows, 1].astype(float)], chunk_rows)
+
+    f.write("boundaries\n")
+
+    # Boundaries
+    if bound_data.ndim == 1:
+        bound_data = bound_data[:, None]
+    bound_format = '\t'.join(['%11d'] * bound_data.shape[1]) + '\n'
+    write_rows(f, bound_format, nb, [lambda rows: bound_data[rows]], chunk_rows)
+
+def save_mesh(mesh, filename, bound_data, chunk_rows=65536):
     """
     Save mesh data to a file in a format compatible with the FLITE preprocessor.
 
     Parameters:
     mesh (dict): Dictionary containing 'connec' and 'xy' arrays.
-    filename (str): Path to the output file.
+    filename (str or file): Path to the output file, or an open text file object (e.g. a FIFO).
     bound_data (numpy.ndarray): Array containing the boundary data.
+    chunk_rows (int): Rows formatted per block; bounds the memory used for very large meshes.
     """
+    if hasattr(filename, 'write'):
+        write_mesh(filename, mesh, bound_data, chunk_rows)
+        return
+
     # Delete the file if it exists
     if os.path.exists(filename):
         os.remove(filename)
 
     # Open file for writing
-    with open(filename, 'w') as f:
-        # Header
-        H = 1
-        f.write(f"{H}\n")
-
-        hdr = 'title'
-        f.write(f"{hdr}\n")
-
-        ne = len(mesh['connec'])
-        np_ = len(mesh['xy'])
-        nb = len(bound_data)
-
-        hdr = 'ne\tnp\tnb'
-        f.write(f"{hdr}\n")
-        f.write(f"{ne}\t{np_}\t{nb}\n")
-
-        hdr = 'connectivities'
-        f.write(f"{hdr}\n")
-
-        # Connectivities
-        H = np.zeros((ne, 5), dtype=int)
-        H[:, 0] = np.arange(1, ne + 1)
-        H[:, 1:4] = mesh['connec'][:, :3]
-        H[:, 4] = 1
-        np.savetxt(f, H, fmt='%11d', delimiter='\t')
-
-        hdr = 'coordinates'
-        f.write(f"{hdr}\n")
-
-        # Coordinates
-        I = np.zeros((np_, 3), dtype=float)
-        I[:, 0] = np.arange(1, np_ + 1)
-        I[:, 1:3] = mesh['xy'][:, :2]
-        np.savetxt(f, I, fmt='%11d %11.6f %11.6f', delimiter='\t')
-
-        hdr = 'boundaries'
-        f.write(f"{hdr}\n")
-
-        # Boundaries
-        np.savetxt(f, bound_data, fmt='%11d', delimiter='\t')
+    with open(filename, 'w', buffering=1 << 20) as f:
+        write_mesh(f, mesh, bound_data, chunk_rows)
@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import Manager
+
+from FLITE2DPY import FLITE2DPY
+
+def _run_case(airfoil, mach, aoa, solver_slot, kwargs):
+    start = time.time()
+    try:
+        cl, cd = FLITE2DPY(airfoil, mach, aoa, solver_slot=solver_slot, **kwargs)
+        error = None
+    except Exception as exc:
+        cl, cd = float('nan'), float('nan')
+        error = f'{type(exc).__name__}: {exc}'
+    return {'airfoil': airfoil, 'mach': mach, 'aoa': aoa, 'cl': cl, 'cd': cd,
+            'elapsed': time.time() - start, 'error': error}
+
+def run_cases(cases, workers=None, solver_slots=None, render='off', **kwargs):
+    """
+    Runs (airfoil, Mach, AoA) cases concurrently, each in its own scratch directory.
+
+    Meshing and post-processing run in up to `workers` processes at once, while at most `solver_slots`
+    Solver.exe runs are allowed at any time.
+
+    Parameters:
+    cases (iterable): (airfoil, mach, aoa) tuples.
+    workers (int): Number of worker processes. None uses os.cpu_count().
+    solver_slots (int): Maximum number of concurrent solver runs. None allows one per worker.
+    render (str): Render policy passed to FLITE2DPY; 'show' is not allowed in worker processes.
+    **kwargs: Further keyword arguments for FLITE2DPY.
+
+    Returns:
+    list: One dict per case, in the order given, with airfoil, mach, aoa, cl, cd, elapsed and error
+        (None on success).
+    """
+    if render == 'show':
+        raise ValueError("render='show' blocks in plt.show(); use 'off', 'deferred' or 'background'")
+
+    cases = list(cases)
+    workers = os.cpu_count() if workers is None else max(int(workers), 1)
+    solver_slots = workers if solver_slots is None else max(int(solver_slots), 1)
+    kwargs['render'] = render
+
+    results = [None] * len(cases)
+    with Manager() as manager, ProcessPoolExecutor(max_workers=workers) as pool:
+        slot = manager.BoundedSemaphore(solver_slots) if solver_slots < workers else None
+        futures = {pool.submit(_run_case, airfoil, mach, aoa, slot, kwargs): i
+                   for i, (airfoil, mach, aoa) in enumerate(cases)}
+        for done, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            results[futures[future]] = record
+            status = 'failed: ' + record['error'] if record['error'] else f"CL {record['cl']:.4f}, CD {record['cd']:.4f}"
+            print(f"[{done}/{len(cases)}] {record['airfoil']} M={record['mach']:.2f} "
+                  f"AoA={record['aoa']:.2f} {status} ({record['elapsed']:.1f} s)")
+    return results
+
+if __name__ == '__main__':
+    # python scheduler.py <airfoils> <machs> <aoas> [workers] [solver_slots]
+    # e.g. python scheduler.py 1000,1001 0.5,0.6 0,2,4 8 4
+    airfoils, machs, aoas = ([float(v) for v in arg.split(',')] for arg in sys.argv[1:4])
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+    solver_slots = int(sys.argv[5]) if len(sys.argv) > 5 else None
+    run_cases(itertools.product([int(a) for a in airfoils], machs, aoas), workers, solver_slots)
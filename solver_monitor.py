@@ -0,0 +1,180 @@
+import os
+import time
+import math
+import subprocess
+
+def forces_to_cl_cd(CY, CX, alpha):
+    """
+    Converts the solver's force coefficients into lift and drag.
+
+    Solver.exe writes CY and CX in wind axes with both signs flipped, so no rotation by the angle of
+    attack is needed. For airfoil 1000 at M 0.5 and AoA 4 the rsd gives CY -0.5356 and CX -0.0026, and the
+    integrated surface pressure gives CL 0.5355 and CD 0.0016.
+
+    Parameters:
+    CY (float): Force coefficient normal to the freestream, as written to solverout.rsd.
+    CX (float): Force coefficient along the freestream, as written to solverout.rsd.
+    alpha (float): Angle of attack in degrees (kept for the callers; the forces are already in wind axes).
+
+    Returns:
+    tuple: CL, CD.
+    """
+    return -CY, -CX
+
+class RsdTail:
+    """
+    Follows a solverout.rsd file while Solver.exe is writing it, returning only the complete lines
+    added since the last read. A file that does not exist yet reads as empty.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.partial = b''
+
+    def read(self):
+        """
+        Returns:
+        list: (iteration, residual, CY, CX) of every new complete line.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self.offset)
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        self.offset += len(data)
+
+        lines = (self.partial + data).split(b'\n')
+        self.partial = lines.pop()
+        rows = []
+        for line in lines:
+            parts = line.split()
+            if len(parts) < 4:
+                continue
+            try:
+                rows.append((int(parts[0]), float(parts[1]), float(parts[2]), float(parts[3])))
+            except ValueError:
+                continue
+        return rows
+
+class ConvergenceMonitor:
+    """
+    Keeps the residual and CL/CD history of a solver run and decides when to stop it.
+
+    A run is converged once CL and CD have each varied by less than `tolerance` over the last `window`
+    iterations, and diverged once the residual or the forces are not finite or the log residual has
+    grown more than `divergence` orders above its first value.
+
+    Parameters:
+    alpha (float): Angle of attack in degrees, used to turn CY/CX into CL/CD.
+    tolerance (float): Absolute CL/CD tolerance for convergence; None never stops a run early.
+    window (int): Number of iterations the forces must stay within tolerance.
+    min_iterations (int): Iterations before convergence is tested at all.
+    divergence (float): Orders of magnitude the residual may grow before the run is killed; None
+        disables the check.
+    callback (callable): Called with each new record (a dict with iteration, residual, cl and cd);
+        returning True stops the run as if it had converged.
+    """
+
+    def __init__(self, alpha, tolerance=None, window=50, min_iterations=100, divergence=2.0, callback=None):
+        self.alpha = float(alpha)
+        self.tolerance = tolerance
+        self.window = int(window)
+        self.min_iterations = int(min_iterations)
+        self.divergence = divergence
+        self.callback = callback
+        self.history = {'iteration': [], 'residual': [], 'cl': [], 'cd': []}
+        self.status = 'running'
+
+    def update(self, row):
+        """
+        Adds one (iteration, residual, CY, CX) row.
+
+        Returns:
+        str: 'running', 'converged' or 'diverged'.
+        """
+        iteration, residual, CY, CX = row
+        cl, cd = forces_to_cl_cd(CY, CX, self.alpha)
+        record = {'iteration': iteration, 'residual': residual, 'cl': cl, 'cd': cd}
+        for key, value in record.items():
+            self.history[key].append(value)
+
+        if self.status != 'running':
+            return self.status
+
+        history = self.history
+        if not all(math.isfinite(v) for v in (residual, cl, cd)):
+            self.status = 'diverged'
+        elif self.divergence is not None and residual - history['residual'][0] > self.divergence:
+            self.status = 'diverged'
+        elif self.callback is not None and self.callback(record):
+            self.status = 'converged'
+        elif (self.tolerance is not None and iteration >= self.min_iterations
+              and len(history['cl']) >= self.window):
+            cl_window = history['cl'][-self.window:]
+            cd_window = history['cd'][-self.window:]
+            if (max(cl_window) - min(cl_window) < self.tolerance
+                    and max(cd_window) - min(cd_window) < self.tolerance):
+                self.status = 'converged'
+        return self.status
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def _stop(process, timeout=10):
+    process.terminate()
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+def watch_solver(process, workdir, monitor, poll_interval=0.5):
+    """
+    Tails workdir/solverout.rsd while Solver.exe runs, yielding each new record of the monitor's history,
+    and stops the process once the monitor reports convergence or divergence.
+
+    Solver.exe only writes solverout.res every writeToFileInterval iterations (solver.inp), so a converged
+    run is stopped just after the next write, once the solver has moved on to a new iteration; the
+    results left in workdir then belong to a converged iteration. A diverged run is killed at once.
+
+    Parameters:
+    process (subprocess.Popen): The running Solver.exe.
+    workdir (str): Working directory of the run.
+    monitor (ConvergenceMonitor): Receives every new residual line.
+    poll_interval (float): Seconds between reads of solverout.rsd.
+
+    Yields:
+    dict: iteration, residual, cl and cd of each new line.
+    """
+    tail = RsdTail(os.path.join(workdir, 'solverout.rsd'))
+    res_file = os.path.join(workdir, 'solverout.res')
+    converged_mtime = None
+    written = False
+
+    while True:
+        finished = process.poll() is not None
+        rows = tail.read()
+        for row in rows:
+            monitor.update(row)
+            yield {key: values[-1] for key, values in monitor.history.items()}
+
+        if not finished and monitor.status == 'diverged':
+            _stop(process)
+            return
+        if not finished and monitor.status == 'converged':
+            mtime = _mtime(res_file)
+            if converged_mtime is None:
+                converged_mtime = mtime or 0
+            elif written and rows:
+                _stop(process)
+                return
+            elif mtime is not None and mtime != converged_mtime:
+                written = True
+        if finished:
+            return
+        time.sleep(poll_interval)
@@ -0,0 +1,174 @@
+import os
+import sys
+import csv
+import time
+import shutil
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import Manager
+
+from FLITE2DPY import prepare_mesh, solve_case
+from warm_start import order_for_reuse
+from profiling import profile_run
+
+TABLE_COLUMNS = ('airfoil', 'mach', 'aoa', 'cl', 'cd', 'elapsed', 'error')
+
+# Fields of prepare_mesh's result that solve_case reads
+SOLVE_FIELDS = ('airfoil', 'coordinates_filename', 'xy', 'bound_data', 'mesh_dir')
+
+def _profiled(profile, cprofile, name, **meta):
+    # One profiling record per prepare_mesh / solve_case call when a profile folder is given
+    return profile_run(name, profile, cprofile, **meta) if profile else nullcontext()
+
+def _prepare(airfoil, coordinates_path, scratch_path, cache, mesh_controls, profile=None, cprofile=False,
+             show=False):
+    with _profiled(profile, cprofile, 'prepare_mesh', airfoil=int(airfoil)):
+        prepared = prepare_mesh(airfoil, coordinates_path, show=show, scratch_path=scratch_path, cache=cache,
+                                controls=mesh_controls)
+    # Only what solve_case needs is sent back and pickled into every solve task; the element data conelem
+    # adds to the mesh (iside, adjacency) is several times the size of the coordinates and connectivity
+    mesh = prepared['mesh']
+    return {**{field: prepared[field] for field in SOLVE_FIELDS},
+            'mesh': {'xy': mesh['xy'], 'connec': mesh['connec']}}
+
+def _solve(prepared, mach, aoa, render, scratch_path, solver_slot, store, monitor, warm_start, profile=None,
+           cprofile=False):
+    start = time.time()
+    try:
+        with _profiled(profile, cprofile, 'solve_case', airfoil=int(prepared['airfoil']), mach=float(mach),
+                       aoa=float(aoa)):
+            cl, cd = solve_case(prepared, mach, aoa, render, scratch_path, solver_slot, store, monitor,
+                                warm_start)
+        error = None
+    except Exception as exc:
+        cl, cd = float('nan'), float('nan')
+        error = f'{type(exc).__name__}: {exc}'
+    return {'airfoil': prepared['airfoil'], 'mach': mach, 'aoa': aoa, 'cl': cl, 'cd': cd,
+            'elapsed': time.time() - start, 'error': error}
+
+def _failed(airfoil, mach, aoa, error):
+    return {'airfoil': airfoil, 'mach': mach, 'aoa': aoa, 'cl': float('nan'), 'cd': float('nan'),
+            'elapsed': 0.0, 'error': error}
+
+def write_table(records, path):
+    """
+    Writes sweep records to a CSV file with the columns of TABLE_COLUMNS.
+    """
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=TABLE_COLUMNS)
+        writer.writeheader()
+        writer.writerows(records)
+    return path
+
+def sweep(airfoils, machs, aoas, workers=1, solver_slots=None, render='off', table_path='sweep_results.csv',
+          coordinates_path=os.path.join('.', 'data_geometry'), scratch_path=os.path.join('.', 'scratch'),
+          cache=os.path.join('.', 'mesh_cache'), store=None, monitor=None, warm_start=False,
+          mesh_controls=None, profile=None, cprofile=False):
+    """
+    Runs every airfoil over a Mach/AoA grid, generating and preprocessing each mesh only once.
+
+    mesh.dat and mesh.sol depend only on the geometry and bound_data, so each airfoil is meshed and run
+    through PrePro.exe once and every (Mach, AoA) case is solved against that mesh.sol. With workers > 1
+    meshes and solver runs are spread over a process pool, and solver cases of an airfoil start as soon
+    as its mesh is ready.
+
+    Parameters:
+    airfoils (iterable): Airfoil numbers.
+    machs (iterable): Mach numbers.
+    aoas (iterable): Angles of attack in degrees.
+    workers (int): Number of worker processes. 1 runs everything in the calling process; None uses
+        os.cpu_count().
+    solver_slots (int): Maximum number of concurrent solver runs. None allows one per worker.
+    render (str): Render policy for each case; 'show' is only allowed with workers=1.
+    table_path (str): CSV file the results table is written to, or None.
+    cache (MeshCache or str): Mesh cache (or its directory), so a repeated or restarted sweep skips
+        meshing and preprocessing; None always regenerates.
+    store (str): Optional result_store root every case is also written to.
+    monitor (dict): Optional ConvergenceMonitor options (e.g. {'tolerance': 1e-4}) to stop each solver
+        run once CL/CD are stable and kill diverging runs; a callback must be picklable when workers > 1.
+    warm_start (bool): Restart each case from the nearest solved flight condition on the same mesh. The
+        grid is then run Mach by Mach, sweeping AoA outwards from zero (see warm_start.order_for_reuse),
+        so each case finds a neighbour one step away; with workers > 1 a case uses whatever neighbour
+        has finished by the time it starts.
+    mesh_controls (MeshControls, str or dict): Optional mesh controls for every airfoil, e.g. 'coarse' or
+        {'target_elements': 15000} (see mesh_controls.py).
+    profile (str): Optional folder every prepare_mesh and solve_case call writes a profiling record to
+        (see profiling.py); summarise the campaign with python profiling.py summary <folder>.
+    cprofile (bool): Also dump cProfile stats of each call into the profile folder.
+
+    Returns:
+    list: One dict per case with airfoil, mach, aoa, cl, cd, elapsed and error (None on success),
+        ordered by airfoil, Mach and AoA.
+    """
+    airfoils = [int(a) for a in airfoils]
+    machs, aoas = list(machs), list(aoas)
+    grid = order_for_reuse(machs, aoas) if warm_start else [(float(m), float(a)) for m in machs for a in aoas]
+    workers = os.cpu_count() if workers is None else max(int(workers), 1)
+    if render == 'show' and workers > 1:
+        raise ValueError("render='show' blocks in plt.show(); use 'off', 'deferred' or 'background'")
+
+    start = time.time()
+    records = {}
+
+    if workers == 1:
+        for airfoil in airfoils:
+            try:
+                prepared = _prepare(airfoil, coordinates_path, scratch_path, cache, mesh_controls, profile,
+                                    cprofile, show=render == 'show')
+            except Exception as exc:
+                for mach, aoa in grid:
+                    records[airfoil, mach, aoa] = _failed(airfoil, mach, aoa, f'{type(exc).__name__}: {exc}')
+                continue
+            for mach, aoa in grid:
+                records[airfoil, mach, aoa] = _solve(prepared, mach, aoa, render, scratch_path, None, store, monitor,
+                                                     warm_start, profile, cprofile)
+            shutil.rmtree(prepared['mesh_dir'], ignore_errors=True)
+    else:
+        solver_slots = workers if solver_slots is None else max(int(solver_slots), 1)
+        with Manager() as manager, ProcessPoolExecutor(max_workers=workers) as pool:
+            slot = manager.BoundedSemaphore(solver_slots) if solver_slots < workers else None
+            meshing = {pool.submit(_prepare, airfoil, coordinates_path, scratch_path, cache, mesh_controls, profile,
+                                   cprofile): airfoil
+                       for airfoil in airfoils}
+            solving = {}
+            for future in as_completed(meshing):
+                airfoil = meshing[future]
+                try:
+                    prepared = future.result()
+                except Exception as exc:
+                    for mach, aoa in grid:
+                        records[airfoil, mach, aoa] = _failed(airfoil, mach, aoa, f'{type(exc).__name__}: {exc}')
+                    continue
+                for mach, aoa in grid:
+                    solving[pool.submit(_solve, prepared, mach, aoa, render, scratch_path, slot, store, monitor,
+                                        warm_start, profile, cprofile)] = prepared
+
+            remaining = {}
+            for prepared in solving.values():
+                remaining[prepared['mesh_dir']] = remaining.get(prepared['mesh_dir'], 0) + 1
+            for future in as_completed(solving):
+                record = future.result()
+                records[record['airfoil'], record['mach'], record['aoa']] = record
+                # The shared mesh is no longer needed once all of its cases are done
+                mesh_dir = solving[future]['mesh_dir']
+                remaining[mesh_dir] -= 1
+                if remaining[mesh_dir] == 0:
+                    shutil.rmtree(mesh_dir, ignore_errors=True)
+
+    records = [records[key] for key in sorted(records)]
+    failed = sum(record['error'] is not None for record in records)
+    print(f'Sweep of {len(records)} cases finished in {time.time() - start:.2f} seconds ({failed} failed)')
+
+    if table_path is not None:
+        write_table(records, table_path)
+        print(f'Results table written to {table_path}')
+
+    return records
+
+if __name__ == '__main__':
+    # python sweep.py <airfoils> <machs> <aoas> [workers] [solver_slots]
+    # e.g. python sweep.py 1000,1001 0.5,0.6 0,2,4 8 4
+    airfoils, machs, aoas = ([float(v) for v in arg.split(',')] for arg in sys.argv[1:4])
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else 1
+    solver_slots = int(sys.argv[5]) if len(sys.argv) > 5 else None
+    sweep(airfoils, machs, aoas, workers, solver_slots)
@@ -0,0 +1,124 @@
+import os
+import json
+import filecmp
+
+from flite_io import read_last_line
+
+# Written next to the results of every case solved with warm_start enabled
+WARM_START_FILE = 'warm_start.json'
+
+def solved_cases(airfoil, raw_root=os.path.join('.', 'raw_data')):
+    """
+    Returns:
+    list: (mach, aoa, folder) of every case of the airfoil in raw_data that has a solverout.res.
+    """
+    airfoil_dir = os.path.join(raw_root, str(int(airfoil)))
+    if not os.path.isdir(airfoil_dir):
+        return []
+    cases = []
+    for mach in sorted(os.listdir(airfoil_dir)):
+        mach_dir = os.path.join(airfoil_dir, mach)
+        if not os.path.isdir(mach_dir):
+            continue
+        for aoa in sorted(os.listdir(mach_dir)):
+            folder = os.path.join(mach_dir, aoa)
+            try:
+                if os.path.exists(os.path.join(folder, 'solverout.res')):
+                    cases.append((float(mach), float(aoa), folder))
+            except ValueError:
+                continue
+    return cases
+
+def nearest_solution(airfoil, mach, aoa, mesh_sol=None, raw_root=os.path.join('.', 'raw_data'), mach_scale=0.1,
+                     aoa_scale=2.0, max_distance=None):
+    """
+    Finds the closest already solved flight condition of an airfoil, to restart the solver from.
+
+    Distances are measured as |dMach| / mach_scale + |dAoA| / aoa_scale, so by default a Mach step of 0.1
+    counts as much as 2 degrees of AoA.
+
+    Parameters:
+    airfoil (int): Airfoil number.
+    mach, aoa (float): Flight condition to be solved.
+    mesh_sol (str): mesh.sol the case will be solved on; solutions on any other mesh are skipped.
+    raw_root (str): Root of the raw_data tree.
+    mach_scale, aoa_scale (float): Steps in Mach and AoA (degrees) considered equally far apart.
+    max_distance (float): Solutions further away than this are not used; None accepts any.
+
+    Returns:
+    tuple: (mach, aoa, folder) of the nearest solution, or None.
+    """
+    candidates = sorted(solved_cases(airfoil, raw_root),
+                        key=lambda case: abs(case[0] - mach) / mach_scale + abs(case[1] - aoa) / aoa_scale)
+    for case in candidates:
+        distance = abs(case[0] - mach) / mach_scale + abs(case[1] - aoa) / aoa_scale
+        if max_distance is not None and distance > max_distance:
+            return None
+        source_sol = os.path.join(case[2], 'mesh.sol')
+        if mesh_sol is None or (os.path.exists(source_sol) and filecmp.cmp(mesh_sol, source_sol, shallow=False)):
+            return case
+    return None
+
+def count_iterations(rsd_path):
+    """
+    Returns:
+    int: Number of the last iteration in solverout.rsd (0 if there is none).
+    """
+    line = read_last_line(rsd_path)
+    return int(line.split()[0]) if line else 0
+
+def cold_iterations(folder):
+    """
+    Iterations a cold start took for the case in folder: its own count if it was solved from freestream,
+    otherwise the cold-start count recorded when it was warm started.
+    """
+    record_path = os.path.join(folder, WARM_START_FILE)
+    if os.path.exists(record_path):
+        with open(record_path, 'r') as f:
+            record = json.load(f)
+        if record.get('cold_iterations') is not None:
+            return record['cold_iterations']
+    return count_iterations(os.path.join(folder, 'solverout.rsd'))
+
+def write_record(workdir, source):
+    """
+    Writes warm_start.json into workdir after a solve, recording where the run was restarted from and how
+    many iterations it saved against the cold start of the chain of cases it derives from.
+
+    Parameters:
+    workdir (str): Working directory holding the new solverout.rsd.
+    source (tuple): (mach, aoa, folder) from nearest_solution, or None for a cold start.
+
+    Returns:
+    dict: The record.
+    """
+    iterations = count_iterations(os.path.join(workdir, 'solverout.rsd'))
+    if source is None:
+        record = {'restart_from': None, 'iterations': iterations, 'cold_iterations': iterations,
+                  'iterations_saved': 0}
+    else:
+        cold = cold_iterations(source[2])
+        record = {'restart_from': {'mach': source[0], 'aoa': source[1]}, 'iterations': iterations,
+                  'cold_iterations': cold, 'iterations_saved': cold - iterations}
+    with open(os.path.join(workdir, WARM_START_FILE), 'w') as f:
+        json.dump(record, f, indent=1)
+    return record
+
+def order_for_reuse(machs, aoas):
+    """
+    Orders a Mach/AoA grid so that every case after the first has an already solved neighbour one step away.
+
+    Machs are run in ascending order. Within each Mach the sweep starts at the AoA closest to zero (the
+    cheapest case to start from freestream), walks up to the largest AoA and then down from the start to
+    the smallest, so each case is one AoA step from a solved one; the first AoA of each following Mach
+    restarts from the same AoA at the previous Mach.
+
+    Returns:
+    list: (mach, aoa) tuples.
+    """
+    aoas = sorted(set(float(a) for a in aoas))
+    if not aoas:
+        return []
+    start = min(range(len(aoas)), key=lambda i: abs(aoas[i]))
+    order = aoas[start:] + aoas[:start][::-1]
+    return [(float(m), a) for m in sorted(set(float(m) for m in machs)) for a in order]